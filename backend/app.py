@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify, send_from_directory
 from flask_socketio import SocketIO
 from flask_cors import CORS
+import atexit
 import logging
 import os
 import asyncio
@@ -62,6 +63,8 @@ def create_app(config_name='default'):
 
     # 初始化自动化服务（传入IP服务避免重复初始化）
     automation_service = AutomationService(ip_service=ip_service)
+    # 🚀 进程退出时关闭共享浏览器
+    atexit.register(automation_service.shutdown_sync)
 
     # 设置TaskManager的自动化服务
     task_manager.set_automation_service(automation_service)
@@ -228,14 +231,13 @@ def create_app(config_name='default'):
                 apple_email = data.get('account_email', '')
                 apple_password = data.get('account_password', '')
                 account_config_data = data.get('account_config', {})  # 也获取account_config以备后用
-                logger.info(f"🧪 测试任务账号信息: email='{apple_email}', password='{apple_password}'")
+                logger.info("🧪 测试任务账号信息: email=%r, has_password=%s", apple_email, bool(apple_password))
             else:
                 # 正常任务从account_config获取
                 account_config_data = data.get('account_config', {})
-                logger.info(f"🔍 调试 - 接收到的account_config_data: {account_config_data}")
                 apple_email = account_config_data.get('email', '')
                 apple_password = account_config_data.get('password', '')
-                logger.info(f"🔍 调试 - 从前端获取: email='{apple_email}', password='{apple_password}'")
+                logger.debug("🔍 调试 - 从前端获取: email=%r, has_password=%s", apple_email, bool(apple_password))
 
             # 从数据库获取对应账号的完整信息（包括电话号码）
             phone_number = account_config_data.get('phone_number', '07700900000')  # 默认英国手机号码
@@ -251,7 +253,8 @@ def create_app(config_name='default'):
                         break
 
             # 创建账号配置对象（使用最终确定的信息）
-            logger.info(f"🔍 调试 - 最终账号信息: email='{apple_email}', password='{apple_password}', phone_number='{phone_number}'")
+            logger.debug("🔍 调试 - 最终账号信息: email=%r, has_password=%s, phone_number=%r",
+                         apple_email, bool(apple_password), phone_number)
             account_config = AccountConfig(
                 email=apple_email,
                 password=apple_password,
@@ -309,7 +312,9 @@ def create_app(config_name='default'):
                 apple_email=apple_email,
                 apple_password=apple_password,
                 phone_number=phone_number,
-                gift_card_code=gift_card_code
+                gift_card_code=gift_card_code,
+                blocked_resource_types=data.get('blocked_resource_types'),
+                verify_cart=data.get('verify_cart', False)
             )
             
             # 创建任务
@@ -963,6 +968,16 @@ def create_app(config_name='default'):
             logger.error(f"获取礼品卡失败: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/gift-cards/export', methods=['GET'])
+    def export_gift_cards():
+        """按列导出礼品卡"""
+        try:
+            db_manager = DatabaseManager()
+            return jsonify(db_manager.export_gift_cards_columnar())
+        except Exception as e:
+            logger.error(f"导出礼品卡失败: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
     @app.route('/api/gift-cards', methods=['POST'])
     def add_gift_card():
         """添加新礼品卡"""
@@ -1038,6 +1053,16 @@ def create_app(config_name='default'):
             logger.error(f"获取账号失败: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/accounts/export', methods=['GET'])
+    def export_accounts():
+        """按列导出账号"""
+        try:
+            db_manager = DatabaseManager()
+            return jsonify(db_manager.export_accounts_columnar())
+        except Exception as e:
+            logger.error(f"导出账号失败: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
     @app.route('/api/accounts', methods=['POST'])
     def add_account():
         """添加新账号"""
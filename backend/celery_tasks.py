@@ -2,7 +2,7 @@
 Celery任务定义
 处理Apple Bot的异步任务执行
 """
-import asyncio
+import atexit
 import logging
 from celery import current_task
 from celery_config import celery_app
@@ -29,6 +29,8 @@ def get_automation_service():
         Task, TaskStatus, AutomationService, IPService, socketio = get_task_dependencies()
         ip_service = IPService(rotation_enabled=True)
         automation_service = AutomationService(ip_service=ip_service)
+        # 🚀 worker进程退出时关闭共享浏览器
+        atexit.register(automation_service.shutdown_sync)
     return automation_service
 
 def get_websocket_client():
@@ -181,7 +183,7 @@ def execute_apple_task(self, task_data):
         
         # 🚀 使用try-catch包装任务执行，避免异常传播到Celery
         try:
-            result = asyncio.run(automation.execute_task(task))
+            result = automation.run_sync(automation.execute_task(task))
 
             if result:
                 # 任务成功完成
@@ -271,7 +273,7 @@ def cleanup_task(task_id):
         automation = get_automation_service()
         if automation:
             # 异步清理资源
-            asyncio.run(automation.cleanup_task(task_id, force_close=True))
+            automation.run_sync(automation.cleanup_task(task_id, force_close=True))
             logger.info(f"✅ Celery任务资源清理完成: {task_id}")
 
         return {'status': 'success', 'task_id': task_id, 'message': '资源清理完成'}
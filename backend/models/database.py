@@ -2,14 +2,309 @@ import sqlite3
 import logging
 import json
 import threading
-from typing import List, Dict, Optional, Any
-from dataclasses import dataclass
+import time
+import queue
+import pathlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Dict, Iterator, Optional, Any
+from dataclasses import dataclass, replace
 from enum import Enum
 from datetime import datetime
 import os
+import sys
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
+# 🚀 任务config/logs的JSON编解码优先使用orjson，未安装时回退到标准库
+try:
+    import orjson
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+
+def _convert_json(value: bytes):
+    """SQLite转换器：JSON列在C扩展取值时直接解码"""
+    try:
+        return _json_loads(value) if value else None
+    except ValueError as e:
+        logger.warning("JSON列解码失败: %s", e)
+        return None
+
+
+# 🚀 注册类型转换器：BOOLEAN按声明类型转换，JSON通过列别名 "col [JSON]" 转换
+sqlite3.register_converter('BOOLEAN', lambda value: value == b'1')
+sqlite3.register_converter('JSON', _convert_json)
+
+# 默认英国电话号码
+DEFAULT_PHONE_NUMBER = '+447700900000'
+
+# 等待写锁的超时时间（毫秒）
+BUSY_TIMEOUT_MS = 5000
+
+# 🚀 数据库文件级设置（WAL持久化在文件上，初始化时执行一次）
+_DATABASE_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA mmap_size = 268435456',
+)
+
+# 每个连接都需要的设置
+_CONNECTION_PRAGMAS = (
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA foreign_keys = ON',
+    'PRAGMA temp_store = MEMORY',
+)
+
+# 批量导出的列
+ACCOUNT_EXPORT_COLUMNS = ('id', 'email', 'phone_number', 'created_at')
+GIFT_CARD_EXPORT_COLUMNS = ('id', 'gift_card_number', 'status', 'notes', 'created_at')
+
+# 按ID读取缓存的最大条目数
+READ_CACHE_MAX_SIZE = 1024
+
+# 🚀 Python 3.10+ 使用slots数据类，去掉每行对象的 __dict__
+_DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# 🚀 热路径SQL固定为模块级常量，配合长连接命中SQLite语句缓存
+STATEMENT_CACHE_SIZE = 256
+
+# SQLite 3.35+ 支持 RETURNING，插入时直接取回新行
+_SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# 🚀 显式列清单，顺序与 Account / GiftCard 字段顺序一致，行工厂按位置直接构造对象
+_ACCOUNT_COLUMNS = 'id, email, password, phone_number, created_at, updated_at, is_active, status, notes'
+_GIFT_CARD_COLUMNS = 'id, gift_card_number, status, created_at, updated_at, is_active, notes'
+
+_SQL_INSERT_ACCOUNT = 'INSERT INTO accounts (email, password, phone_number) VALUES (?, ?, ?)'
+_SQL_INSERT_ACCOUNT_RETURNING = _SQL_INSERT_ACCOUNT + ' RETURNING ' + _ACCOUNT_COLUMNS
+_SQL_GET_ACCOUNT_BY_ID = 'SELECT ' + _ACCOUNT_COLUMNS + ' FROM accounts WHERE id = ?'
+# 参数为None的字段保持原值，所有调用共用同一条语句
+_SQL_UPDATE_ACCOUNT = '''
+    UPDATE accounts
+    SET email = COALESCE(?, email),
+        password = COALESCE(?, password),
+        phone_number = COALESCE(?, phone_number),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+'''
+_SQL_UPDATE_ACCOUNT_STATUS_BY_EMAIL = '''
+    UPDATE accounts
+    SET status = ?,
+        notes = COALESCE(?, notes),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE email = ? AND is_active = 1
+'''
+_SQL_INSERT_GIFT_CARD = 'INSERT INTO gift_cards (gift_card_number, status, notes) VALUES (?, ?, ?)'
+_SQL_INSERT_GIFT_CARD_RETURNING = _SQL_INSERT_GIFT_CARD + ' RETURNING ' + _GIFT_CARD_COLUMNS
+_SQL_GET_GIFT_CARD_BY_ID = 'SELECT ' + _GIFT_CARD_COLUMNS + ' FROM gift_cards WHERE id = ?'
+_SQL_GET_GIFT_CARD_BY_NUMBER = 'SELECT ' + _GIFT_CARD_COLUMNS + ' FROM gift_cards WHERE gift_card_number = ?'
+_SQL_UPDATE_GIFT_CARD = '''
+    UPDATE gift_cards
+    SET gift_card_number = COALESCE(?, gift_card_number),
+        status = COALESCE(?, status),
+        notes = COALESCE(?, notes),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+'''
+_SQL_UPDATE_GIFT_CARD_STATUS = (
+    'UPDATE gift_cards SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE gift_card_number = ?'
+)
+# 任务已存在时原地更新（不删除旧行），created_at 保持首次写入的值
+_SQL_SAVE_TASK = '''
+    INSERT INTO tasks (
+        id, config, status, current_step, progress,
+        created_at, started_at, completed_at, error_message,
+        logs, celery_task_id, last_updated
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        config = excluded.config,
+        status = excluded.status,
+        current_step = excluded.current_step,
+        progress = excluded.progress,
+        started_at = excluded.started_at,
+        completed_at = excluded.completed_at,
+        error_message = excluded.error_message,
+        logs = excluded.logs,
+        celery_task_id = excluded.celery_task_id,
+        last_updated = excluded.last_updated
+'''
+# 只更新进度相关字段，不重新序列化 config/logs
+_SQL_SAVE_TASK_PROGRESS = '''
+    UPDATE tasks
+    SET status = ?, current_step = ?, progress = ?, last_updated = ?
+    WHERE id = ?
+'''
+# 账号数和礼品卡分状态统计合并为一条语句
+_SQL_STATISTICS = '''
+    SELECT 'accounts', NULL, COUNT(*) FROM accounts WHERE is_active = 1
+    UNION ALL
+    SELECT 'gift_cards', status, COUNT(*) FROM gift_cards WHERE is_active = 1 GROUP BY status
+'''
+
+# 任务表的列顺序（与 _TASK_SELECT 一致，用于按位置构造字典）
+_TASK_FIELDS = (
+    'id', 'config', 'status', 'current_step', 'progress',
+    'created_at', 'started_at', 'completed_at', 'error_message',
+    'logs', 'celery_task_id', 'last_updated'
+)
+_TASK_SELECT = '''
+    SELECT id, config AS "config [JSON]", status, current_step, progress,
+           created_at, started_at, completed_at, error_message,
+           logs AS "logs [JSON]", celery_task_id, last_updated
+    FROM tasks
+'''
+_SQL_GET_TASK = _TASK_SELECT + ' WHERE id = ?'
+_SQL_DELETE_TASK = 'DELETE FROM tasks WHERE id = ?'
+# 🚀 任务统计一次扫描透视为单行，列顺序与 _TASK_STATS_FIELDS 一致
+_TASK_STATS_FIELDS = ('total', 'pending', 'running', 'completed', 'failed', 'cancelled')
+_SQL_TASK_STATS = '''
+    SELECT COUNT(*),
+           COUNT(CASE WHEN status = 'pending' THEN 1 END),
+           COUNT(CASE WHEN status = 'running' THEN 1 END),
+           COUNT(CASE WHEN status = 'completed' THEN 1 END),
+           COUNT(CASE WHEN status = 'failed' THEN 1 END),
+           COUNT(CASE WHEN status = 'cancelled' THEN 1 END)
+    FROM tasks
+'''
+
+# 数据库表结构（账号表、礼品卡表、任务表及索引）
+_SCHEMA_DDL = '''
+    CREATE TABLE IF NOT EXISTS accounts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        phone_number TEXT NOT NULL DEFAULT '+447700900000',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1,
+        status TEXT NOT NULL DEFAULT '可用',
+        notes TEXT DEFAULT ''
+    );
+
+    CREATE TABLE IF NOT EXISTS gift_cards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        gift_card_number TEXT UNIQUE NOT NULL,
+        status TEXT NOT NULL DEFAULT '有额度',
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1,
+        notes TEXT DEFAULT ''
+    );
+
+    CREATE TABLE IF NOT EXISTS tasks (
+        id TEXT PRIMARY KEY,
+        config TEXT NOT NULL,
+        status TEXT NOT NULL,
+        current_step TEXT,
+        progress REAL DEFAULT 0.0,
+        created_at TEXT NOT NULL,
+        started_at TEXT,
+        completed_at TEXT,
+        error_message TEXT,
+        logs TEXT,
+        celery_task_id TEXT,
+        last_updated INTEGER NOT NULL
+    );
+
+    -- email / gift_card_number 的UNIQUE约束已自带索引，tasks(status) 被复合索引覆盖
+    DROP INDEX IF EXISTS idx_accounts_email;
+    DROP INDEX IF EXISTS idx_gift_cards_number;
+    DROP INDEX IF EXISTS idx_tasks_status;
+    -- gift_cards 只按 is_active = 1 的记录查状态，由下面的部分索引代替
+    DROP INDEX IF EXISTS idx_gift_cards_status;
+    DROP INDEX IF EXISTS idx_gift_cards_active_status;
+
+    CREATE INDEX IF NOT EXISTS idx_gift_cards_status_active ON gift_cards(status) WHERE is_active = 1;
+    CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks(status, created_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at);
+    CREATE INDEX IF NOT EXISTS idx_tasks_last_updated ON tasks(last_updated);
+'''
+
+# ==================== 数据库迁移 ====================
+
+def _migrate_add_phone_number(cursor):
+    """v1: 旧版accounts表补充phone_number字段"""
+    try:
+        cursor.execute('ALTER TABLE accounts ADD COLUMN phone_number TEXT NOT NULL DEFAULT "+447700900000"')
+        logger.info("已添加phone_number字段到accounts表")
+    except sqlite3.OperationalError:
+        pass  # 新建的表已包含此字段
+
+
+def _migrate_add_account_status(cursor):
+    """v2: accounts表补充status和notes字段"""
+    for ddl in (
+        "ALTER TABLE accounts ADD COLUMN status TEXT NOT NULL DEFAULT '可用'",
+        "ALTER TABLE accounts ADD COLUMN notes TEXT DEFAULT ''",
+    ):
+        try:
+            cursor.execute(ddl)
+        except sqlite3.OperationalError:
+            pass  # 新建的表已包含此字段
+    logger.info("已添加status/notes字段到accounts表")
+
+
+def _migrate_task_last_updated_epoch(cursor):
+    """v3: tasks.last_updated 由ISO文本改为Unix时间戳（INTEGER），需要重建表"""
+    columns = {row[1]: row[2] for row in cursor.execute('PRAGMA table_info(tasks)').fetchall()}
+    if columns.get('last_updated', '').upper() == 'INTEGER':
+        return  # 新建的表已是INTEGER
+
+    cursor.execute('''
+        CREATE TABLE tasks_new (
+            id TEXT PRIMARY KEY,
+            config TEXT NOT NULL,
+            status TEXT NOT NULL,
+            current_step TEXT,
+            progress REAL DEFAULT 0.0,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            completed_at TEXT,
+            error_message TEXT,
+            logs TEXT,
+            celery_task_id TEXT,
+            last_updated INTEGER NOT NULL
+        )
+    ''')
+    # 旧值是本地时间的ISO字符串，转换为UTC时间戳
+    cursor.execute('''
+        INSERT INTO tasks_new
+        SELECT id, config, status, current_step, progress, created_at, started_at,
+               completed_at, error_message, logs, celery_task_id,
+               COALESCE(CAST(strftime('%s', last_updated, 'utc') AS INTEGER),
+                        CAST(strftime('%s', 'now') AS INTEGER))
+        FROM tasks
+    ''')
+    cursor.execute('DROP TABLE tasks')
+    cursor.execute('ALTER TABLE tasks_new RENAME TO tasks')
+    for ddl in (
+        'CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks(status, created_at DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_tasks_last_updated ON tasks(last_updated)',
+    ):
+        cursor.execute(ddl)
+    logger.info("tasks.last_updated 已迁移为Unix时间戳")
+
+
+# 按版本顺序排列，第N项把数据库从版本N-1迁移到版本N
+_MIGRATIONS = (
+    _migrate_add_phone_number,
+    _migrate_add_account_status,
+    _migrate_task_last_updated_epoch,
+)
+
+
 class GiftCardStatus(Enum):
     """礼品卡状态枚举"""
     HAS_BALANCE = "有额度"
@@ -17,7 +312,10 @@ class GiftCardStatus(Enum):
     NON_LOCAL_CARD = "非本国卡"
     RECHARGED = "被充值"
 
-@dataclass
+# 合法的礼品卡状态值
+_VALID_GIFT_CARD_STATUSES = frozenset(s.value for s in GiftCardStatus)
+
+@dataclass(**_DATACLASS_OPTIONS)
 class Account:
     """账号模型"""
     id: Optional[int] = None
@@ -27,8 +325,10 @@ class Account:
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
     is_active: bool = True
+    status: str = "可用"
+    notes: str = ""  # 备注信息
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class GiftCard:
     """礼品卡模型"""
     id: Optional[int] = None
@@ -39,11 +339,181 @@ class GiftCard:
     is_active: bool = True
     notes: str = ""  # 备注信息
 
+
+def _account_factory(cursor, row) -> Account:
+    """行工厂：按 _ACCOUNT_COLUMNS 的位置直接构造Account"""
+    return Account(*row)
+
+
+def _gift_card_factory(cursor, row) -> GiftCard:
+    """行工厂：按 _GIFT_CARD_COLUMNS 的位置直接构造GiftCard"""
+    return GiftCard(*row)
+
+
+# ==================== 连接与单写线程 ====================
+
+def _connect(db_path: str, read_only: bool = False) -> sqlite3.Connection:
+    """打开数据库连接（自动提交模式，事务由调用方显式管理）
+
+    read_only=True 时以 mode=ro 打开，WAL模式下多个只读连接可与写线程并发读取
+    """
+    database = db_path
+    if read_only:
+        database = pathlib.Path(db_path).resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(
+        database,
+        uri=read_only,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
+    )
+    conn.row_factory = sqlite3.Row  # 使结果可以通过列名访问
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _execute_write(cursor, sql: str, params) -> tuple:
+    """写线程内执行单条语句，返回 (rowcount, lastrowid)"""
+    cursor.execute(sql, params)
+    return cursor.rowcount, cursor.lastrowid
+
+
+def _executemany_write(cursor, sql: str, seq_of_params) -> int:
+    """写线程内批量执行同一语句，返回影响的行数"""
+    cursor.executemany(sql, seq_of_params)
+    return cursor.rowcount
+
+
+def _fetch_write(cursor, sql: str, params, row_factory) -> list:
+    """写线程内执行带 RETURNING 的语句并取回全部结果行"""
+    cursor.row_factory = row_factory
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+class _ReadCache:
+    """按ID读取的LRU缓存，同一数据库文件的所有 DatabaseManager 实例共享
+
+    存取都复制对象，调用方修改返回值不会影响缓存；
+    每次失效递增 generation，读取开始后发生过失效的结果不再写入缓存
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        """读取缓存副本，命中时刷新LRU顺序"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                return None
+            self._entries.move_to_end(key)
+        return replace(value)
+
+    def put(self, key, value, generation: int):
+        """写入副本；generation 与读取开始时不同说明期间有写入，放弃写入"""
+        if self.max_size <= 0:
+            return
+        value = replace(value)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        """使单个缓存条目失效"""
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def pop_where(self, attr: str, value):
+        """按字段值使缓存条目失效（用于按邮箱/卡号更新的场景）"""
+        with self._lock:
+            self.generation += 1
+            for key in [k for k, v in self._entries.items() if getattr(v, attr) == value]:
+                del self._entries[key]
+
+
+class _WriterThread:
+    """单写线程：同一数据库文件的写事务全部排队，在一个连接上串行执行"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # 🚀 读取缓存随写线程按数据库文件共享，任一实例的写入都会使其失效
+        self.account_cache = _ReadCache(READ_CACHE_MAX_SIZE)
+        self.gift_card_cache = _ReadCache(READ_CACHE_MAX_SIZE)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name=f"sqlite-writer:{os.path.basename(db_path)}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, fn, args: tuple):
+        """投递 fn(cursor, *args) 并阻塞等待结果，异常原样抛回调用线程"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("写线程内不能再次投递写操作")
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future.result()
+
+    def _run(self):
+        conn = None
+        while True:
+            fn, args, future = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if conn is None:
+                    conn = _connect(self.db_path)
+                # 🚀 只有本线程写入，BEGIN IMMEDIATE 不会与进程内其他写者争锁
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    result = fn(conn.cursor(), *args)
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+
+# 按数据库文件绝对路径共享写线程（DatabaseManager 可能按请求创建多个实例）
+_writers: Dict[str, _WriterThread] = {}
+_writers_lock = threading.Lock()
+
+
+def _get_writer(db_path: str) -> _WriterThread:
+    """获取数据库文件对应的写线程，首次使用时启动"""
+    key = os.path.abspath(db_path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = _WriterThread(key)
+        return writer
+
+
 class DatabaseManager:
     """数据库管理器"""
     
-    def __init__(self, db_path: str = "apple_bot.db"):
+    def __init__(self, db_path: str = "apple_bot.db", cache_max_size: int = READ_CACHE_MAX_SIZE):
         self.db_path = db_path
+        # 🚀 按ID读取的进程内缓存按数据库文件共享，写操作时失效；cache_max_size<=0 时本实例不读写缓存
+        self._use_cache = cache_max_size > 0
+        writer = _get_writer(db_path)
+        self._acct_cache = writer.account_cache
+        self._gc_cache = writer.gift_card_cache
+        # 🚀 每个线程复用一个只读长连接，写操作统一投递给单写线程
+        self._local = threading.local()
         self.init_database()
     
     def init_database(self):
@@ -51,244 +521,236 @@ class DatabaseManager:
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
-                
-                # 创建账号表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS accounts (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        email TEXT UNIQUE NOT NULL,
-                        password TEXT NOT NULL,
-                        phone_number TEXT NOT NULL DEFAULT '+447700900000',
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        is_active BOOLEAN DEFAULT 1
-                    )
-                ''')
-
-                # 检查并添加phone_number字段（如果表已存在但没有此字段）
-                cursor.execute("PRAGMA table_info(accounts)")
-                columns = [column[1] for column in cursor.fetchall()]
-                if 'phone_number' not in columns:
-                    cursor.execute('ALTER TABLE accounts ADD COLUMN phone_number TEXT NOT NULL DEFAULT "+447700900000"')
-                    logger.info("已添加phone_number字段到accounts表")
-                
-                # 创建礼品卡表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS gift_cards (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        gift_card_number TEXT UNIQUE NOT NULL,
-                        status TEXT NOT NULL DEFAULT '有额度',
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        is_active BOOLEAN DEFAULT 1,
-                        notes TEXT DEFAULT ''
-                    )
-                ''')
-                
-                # 🚀 创建任务表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS tasks (
-                        id TEXT PRIMARY KEY,
-                        config TEXT NOT NULL,
-                        status TEXT NOT NULL,
-                        current_step TEXT,
-                        progress REAL DEFAULT 0.0,
-                        created_at TEXT NOT NULL,
-                        started_at TEXT,
-                        completed_at TEXT,
-                        error_message TEXT,
-                        logs TEXT,
-                        celery_task_id TEXT,
-                        last_updated TEXT NOT NULL
-                    )
-                ''')
-
-                # 创建索引
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_accounts_email ON accounts(email)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_gift_cards_number ON gift_cards(gift_card_number)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_gift_cards_status ON gift_cards(status)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_last_updated ON tasks(last_updated)')
+
+                # 🚀 启用WAL：写入不再每条语句fsync，读写互不阻塞
+                for pragma in _DATABASE_PRAGMAS:
+                    cursor.execute(pragma)
+
+                # 🚀 建表和索引一次性执行
+                cursor.executescript(_SCHEMA_DDL)
+
+                # 🚀 按 user_version 执行尚未应用的迁移，已是最新版本时不做任何检查
+                cursor.execute('PRAGMA user_version')
+                version = cursor.fetchone()[0]
+                for target_version, migrate in enumerate(_MIGRATIONS[version:], start=version + 1):
+                    migrate(cursor)
+                    cursor.execute(f'PRAGMA user_version = {target_version}')
+                    logger.info("数据库已迁移到版本 %s", target_version)
 
                 conn.commit()
                 logger.info("数据库初始化成功")
                 
         except Exception as e:
-            logger.error(f"数据库初始化失败: {str(e)}")
+            logger.error("数据库初始化失败: %s", e)
             raise
     
     def get_connection(self):
         """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # 使结果可以通过列名访问
+        return _connect(self.db_path)
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """获取当前线程的只读长连接（首次调用时创建）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = _connect(self.db_path, read_only=True)
+            self._local.conn = conn
         return conn
+
+    def close(self):
+        """关闭当前线程的只读长连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    @contextmanager
+    def _read_connection(self):
+        """读操作使用当前线程的长连接，不提交也不关闭"""
+        yield self._get_conn()
+
+    def _write(self, fn, *args):
+        """把写事务 fn(cursor, *args) 投递给单写线程执行，返回其结果"""
+        return _get_writer(self.db_path).submit(fn, args)
+
+    def _write_execute(self, sql: str, params=()) -> tuple:
+        """执行单条写语句，返回 (rowcount, lastrowid)"""
+        return self._write(_execute_write, sql, params)
     
+    # ==================== 读取缓存 ====================
+
+    def _cache_get(self, cache: _ReadCache, key):
+        """从共享缓存读取副本，本实例禁用缓存时总是未命中"""
+        return cache.get(key) if self._use_cache else None
+
+    def _cache_put(self, cache: _ReadCache, key, value, generation: int):
+        """写入共享缓存（读取开始后发生过失效则放弃）"""
+        if self._use_cache:
+            cache.put(key, value, generation)
+
+    def _cache_pop(self, cache: _ReadCache, key):
+        """使单个缓存条目失效"""
+        cache.pop(key)
+
+    def _cache_pop_where(self, cache: _ReadCache, attr: str, value):
+        """按字段值使缓存条目失效（用于按邮箱/卡号更新的场景）"""
+        cache.pop_where(attr, value)
+
     # ==================== 账号管理 ====================
     
     def create_account(self, email: str, password: str, phone_number: str = "+447700900000") -> Account:
         """创建账号"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO accounts (email, password, phone_number)
-                    VALUES (?, ?, ?)
-                ''', (email, password, phone_number))
+            if _SUPPORTS_RETURNING:
+                generation = self._acct_cache.generation
+                account = self._write(
+                    _fetch_write, _SQL_INSERT_ACCOUNT_RETURNING, (email, password, phone_number), _account_factory
+                )[0]
 
-                account_id = cursor.lastrowid
-                conn.commit()
+                self._cache_put(self._acct_cache, account.id, account, generation)
+                return account
+
+            _, account_id = self._write_execute(_SQL_INSERT_ACCOUNT, (email, password, phone_number))
 
-                # 返回创建的账号
-                return self.get_account_by_id(account_id)
+            # 事务提交后再读取，返回创建的账号
+            self._cache_pop(self._acct_cache, account_id)
+            return self.get_account_by_id(account_id)
 
         except sqlite3.IntegrityError:
             raise ValueError(f"邮箱 {email} 已存在")
         except Exception as e:
-            logger.error(f"创建账号失败: {str(e)}")
+            logger.error("创建账号失败: %s", e)
             raise
 
     def add_account(self, email: str, password: str, phone_number: str = "+447700900000", status: str = "可用", notes: str = "") -> int:
         """添加账号（API兼容方法）"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                # 使用实际的表结构（没有status和notes字段）
-                cursor.execute('''
-                    INSERT INTO accounts (email, password, phone_number, created_at, updated_at, is_active)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1)
-                ''', (email, password, phone_number))
-                conn.commit()
-                account_id = cursor.lastrowid
-                logger.info(f"账号添加成功: {email} (ID: {account_id})")
-                return account_id
+            _, account_id = self._write_execute('''
+                INSERT INTO accounts (email, password, phone_number, status, notes, created_at, updated_at, is_active)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1)
+            ''', (email, password, phone_number, status, notes))
+            logger.info("账号添加成功: %s (ID: %s)", email, account_id)
+            return account_id
         except Exception as e:
-            logger.error(f"添加账号失败: {str(e)}")
+            logger.error("添加账号失败: %s", e)
+            raise
+
+    def add_accounts(self, rows: List[tuple]) -> int:
+        """批量添加账号（单个事务 + executemany）
+
+        rows: (email, password) 或 (email, password, phone_number) 元组列表
+        返回插入的行数；任一邮箱重复时整批回滚
+        """
+        params = [
+            (row[0], row[1], row[2] if len(row) > 2 and row[2] else DEFAULT_PHONE_NUMBER)
+            for row in rows
+        ]
+        if not params:
+            return 0
+
+        try:
+            inserted = self._write(_executemany_write, _SQL_INSERT_ACCOUNT, params)
+
+            logger.info("批量添加账号成功: %s 个", inserted)
+            return inserted
+
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"批量添加账号失败，存在重复邮箱: {str(e)}")
+        except Exception as e:
+            logger.error("批量添加账号失败: %s", e)
             raise
 
     def get_all_accounts(self, active_only: bool = True) -> List[Account]:
         """获取所有账号"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
+                cursor.row_factory = _account_factory
                 
                 if active_only:
-                    cursor.execute('SELECT * FROM accounts WHERE is_active = 1 ORDER BY created_at DESC')
+                    cursor.execute('SELECT ' + _ACCOUNT_COLUMNS + ' FROM accounts WHERE is_active = 1 ORDER BY created_at DESC')
                 else:
-                    cursor.execute('SELECT * FROM accounts ORDER BY created_at DESC')
+                    cursor.execute('SELECT ' + _ACCOUNT_COLUMNS + ' FROM accounts ORDER BY created_at DESC')
                 
-                rows = cursor.fetchall()
-                return [self._row_to_account(row) for row in rows]
+                return cursor.fetchall()
                 
         except Exception as e:
-            logger.error(f"获取账号列表失败: {str(e)}")
+            logger.error("获取账号列表失败: %s", e)
             return []
     
     def get_account_by_id(self, account_id: int) -> Optional[Account]:
         """根据ID获取账号"""
+        cached = self._cache_get(self._acct_cache, account_id)
+        if cached is not None:
+            return cached
+
+        generation = self._acct_cache.generation
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('SELECT * FROM accounts WHERE id = ?', (account_id,))
-                row = cursor.fetchone()
-                
-                return self._row_to_account(row) if row else None
+                cursor.row_factory = _account_factory
+                cursor.execute(_SQL_GET_ACCOUNT_BY_ID, (account_id,))
+                account = cursor.fetchone()
+
+                if account is None:
+                    return None
+                self._cache_put(self._acct_cache, account_id, account, generation)
+                return account
                 
         except Exception as e:
-            logger.error(f"获取账号失败: {str(e)}")
+            logger.error("获取账号失败: %s", e)
             return None
     
     def update_account(self, account_id: int, email: str = None, password: str = None, phone_number: str = None) -> bool:
         """更新账号"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-
-                updates = []
-                params = []
-
-                if email is not None:
-                    updates.append("email = ?")
-                    params.append(email)
-
-                if password is not None:
-                    updates.append("password = ?")
-                    params.append(password)
-
-                if phone_number is not None:
-                    updates.append("phone_number = ?")
-                    params.append(phone_number)
-
-                if not updates:
-                    return True
-
-                updates.append("updated_at = CURRENT_TIMESTAMP")
-                params.append(account_id)
+            if email is None and password is None and phone_number is None:
+                return True
 
-                query = f"UPDATE accounts SET {', '.join(updates)} WHERE id = ?"
-                cursor.execute(query, params)
-                conn.commit()
+            rowcount, _ = self._write_execute(_SQL_UPDATE_ACCOUNT, (email, password, phone_number, account_id))
+            updated = rowcount > 0
 
-                return cursor.rowcount > 0
+            self._cache_pop(self._acct_cache, account_id)
+            return updated
 
         except Exception as e:
-            logger.error(f"更新账号失败: {str(e)}")
+            logger.error("更新账号失败: %s", e)
             return False
 
     def update_account_status_by_email(self, email: str, status: str, notes: str = None) -> bool:
         """根据邮箱更新账号状态"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-
-                # 构建更新语句
-                update_fields = ['status = ?']
-                params = [status]
-
-                if notes is not None:
-                    update_fields.append('notes = ?')
-                    params.append(notes)
+            # 🚀 email走UNIQUE索引单点查找，notes为None时保持原值
+            rowcount, _ = self._write_execute(_SQL_UPDATE_ACCOUNT_STATUS_BY_EMAIL, (status, notes, email))
+            updated = rowcount > 0
 
-                # 添加更新时间
-                update_fields.append('updated_at = CURRENT_TIMESTAMP')
-                params.append(email)  # WHERE条件的参数
+            self._cache_pop_where(self._acct_cache, 'email', email)
 
-                query = f'''
-                    UPDATE accounts
-                    SET {', '.join(update_fields)}
-                    WHERE email = ? AND deleted_at IS NULL
-                '''
-
-                cursor.execute(query, params)
-                conn.commit()
-
-                if cursor.rowcount > 0:
-                    logger.info(f"账号状态更新成功: {email} -> {status}")
-                    return True
-                else:
-                    logger.warning(f"未找到邮箱为 {email} 的账号")
-                    return False
+            if updated:
+                logger.info("账号状态更新成功: %s -> %s", email, status)
+                return True
+            else:
+                logger.warning("未找到邮箱为 %s 的账号", email)
+                return False
 
         except Exception as e:
-            logger.error(f"更新账号状态失败: {str(e)}")
+            logger.error("更新账号状态失败: %s", e)
             return False
 
     def delete_account(self, account_id: int) -> bool:
         """删除账号（软删除）"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE accounts 
-                    SET is_active = 0, updated_at = CURRENT_TIMESTAMP 
-                    WHERE id = ?
-                ''', (account_id,))
-                conn.commit()
-                
-                return cursor.rowcount > 0
+            rowcount, _ = self._write_execute('''
+                UPDATE accounts 
+                SET is_active = 0, updated_at = CURRENT_TIMESTAMP 
+                WHERE id = ?
+            ''', (account_id,))
+            deleted = rowcount > 0
+
+            self._cache_pop(self._acct_cache, account_id)
+            return deleted
                 
         except Exception as e:
-            logger.error(f"删除账号失败: {str(e)}")
+            logger.error("删除账号失败: %s", e)
             return False
     
     # ==================== 礼品卡管理 ====================
@@ -297,36 +759,67 @@ class DatabaseManager:
         """创建礼品卡"""
         try:
             # 验证状态
-            valid_statuses = [status.value for status in GiftCardStatus]
-            if status not in valid_statuses:
+            if status not in _VALID_GIFT_CARD_STATUSES:
                 raise ValueError(f"无效的礼品卡状态: {status}")
             
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO gift_cards (gift_card_number, status, notes)
-                    VALUES (?, ?, ?)
-                ''', (gift_card_number, status, notes))
-                
-                card_id = cursor.lastrowid
-                conn.commit()
-                
-                # 返回创建的礼品卡
-                return self.get_gift_card_by_id(card_id)
+            if _SUPPORTS_RETURNING:
+                generation = self._gc_cache.generation
+                gift_card = self._write(
+                    _fetch_write, _SQL_INSERT_GIFT_CARD_RETURNING, (gift_card_number, status, notes), _gift_card_factory
+                )[0]
+
+                self._cache_put(self._gc_cache, gift_card.id, gift_card, generation)
+                return gift_card
+
+            _, card_id = self._write_execute(_SQL_INSERT_GIFT_CARD, (gift_card_number, status, notes))
+
+            # 事务提交后再读取，返回创建的礼品卡
+            self._cache_pop(self._gc_cache, card_id)
+            return self.get_gift_card_by_id(card_id)
                 
         except sqlite3.IntegrityError:
             raise ValueError(f"礼品卡号 {gift_card_number} 已存在")
         except Exception as e:
-            logger.error(f"创建礼品卡失败: {str(e)}")
+            logger.error("创建礼品卡失败: %s", e)
             raise
     
+    def create_gift_cards(self, rows: List[tuple]) -> int:
+        """批量创建礼品卡（单个事务 + executemany）
+
+        rows: (gift_card_number,)、(gift_card_number, status) 或
+              (gift_card_number, status, notes) 元组列表
+        返回插入的行数；任一卡号重复时整批回滚
+        """
+        params = []
+        for row in rows:
+            status = row[1] if len(row) > 1 and row[1] else GiftCardStatus.HAS_BALANCE.value
+            if status not in _VALID_GIFT_CARD_STATUSES:
+                raise ValueError(f"无效的礼品卡状态: {status}")
+            notes = row[2] if len(row) > 2 and row[2] is not None else ""
+            params.append((row[0], status, notes))
+        if not params:
+            return 0
+
+        try:
+            inserted = self._write(_executemany_write, _SQL_INSERT_GIFT_CARD, params)
+
+            logger.info("批量创建礼品卡成功: %s 张", inserted)
+            return inserted
+
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"批量创建礼品卡失败，存在重复卡号: {str(e)}")
+        except Exception as e:
+            logger.error("批量创建礼品卡失败: %s", e)
+            raise
+
     def get_all_gift_cards(self, active_only: bool = True, status_filter: str = None) -> List[GiftCard]:
         """获取所有礼品卡"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
+                cursor.row_factory = _gift_card_factory
                 
-                query = "SELECT * FROM gift_cards"
+                query = "SELECT " + _GIFT_CARD_COLUMNS + " FROM gift_cards"
                 params = []
                 conditions = []
                 
@@ -343,172 +836,122 @@ class DatabaseManager:
                 query += " ORDER BY created_at DESC"
                 
                 cursor.execute(query, params)
-                rows = cursor.fetchall()
-                return [self._row_to_gift_card(row) for row in rows]
+                return cursor.fetchall()
                 
         except Exception as e:
-            logger.error(f"获取礼品卡列表失败: {str(e)}")
+            logger.error("获取礼品卡列表失败: %s", e)
             return []
     
     def get_gift_card_by_id(self, card_id: int) -> Optional[GiftCard]:
         """根据ID获取礼品卡"""
+        cached = self._cache_get(self._gc_cache, card_id)
+        if cached is not None:
+            return cached
+
+        generation = self._gc_cache.generation
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('SELECT * FROM gift_cards WHERE id = ?', (card_id,))
-                row = cursor.fetchone()
-                
-                return self._row_to_gift_card(row) if row else None
+                cursor.row_factory = _gift_card_factory
+                cursor.execute(_SQL_GET_GIFT_CARD_BY_ID, (card_id,))
+                gift_card = cursor.fetchone()
+
+                if gift_card is None:
+                    return None
+                self._cache_put(self._gc_cache, card_id, gift_card, generation)
+                return gift_card
                 
         except Exception as e:
-            logger.error(f"获取礼品卡失败: {str(e)}")
+            logger.error("获取礼品卡失败: %s", e)
             return None
 
     def get_gift_card_by_number(self, gift_card_number: str) -> Optional[GiftCard]:
         """根据礼品卡号码获取礼品卡"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('SELECT * FROM gift_cards WHERE gift_card_number = ?', (gift_card_number,))
-                row = cursor.fetchone()
-
-                return self._row_to_gift_card(row) if row else None
+                cursor.row_factory = _gift_card_factory
+                cursor.execute(_SQL_GET_GIFT_CARD_BY_NUMBER, (gift_card_number,))
+                return cursor.fetchone()
 
         except Exception as e:
-            logger.error(f"根据号码获取礼品卡失败: {str(e)}")
+            logger.error("根据号码获取礼品卡失败: %s", e)
             return None
 
     def update_gift_card_status(self, gift_card_number: str, status: str) -> bool:
         """根据礼品卡号码更新状态"""
         try:
             # 验证状态
-            valid_statuses = [status.value for status in GiftCardStatus]
-            if status not in valid_statuses:
+            if status not in _VALID_GIFT_CARD_STATUSES:
                 raise ValueError(f"无效的礼品卡状态: {status}")
 
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE gift_cards
-                    SET status = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE gift_card_number = ?
-                ''', (status, gift_card_number))
+            rowcount, _ = self._write_execute(_SQL_UPDATE_GIFT_CARD_STATUS, (status, gift_card_number))
+            updated = rowcount > 0
 
-                conn.commit()
-                return cursor.rowcount > 0
+            self._cache_pop_where(self._gc_cache, 'gift_card_number', gift_card_number)
+            return updated
 
         except Exception as e:
-            logger.error(f"更新礼品卡状态失败: {str(e)}")
+            logger.error("更新礼品卡状态失败: %s", e)
             return False
 
     def update_gift_card(self, card_id: int, gift_card_number: str = None, status: str = None, notes: str = None) -> bool:
         """更新礼品卡"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                updates = []
-                params = []
-                
-                if gift_card_number is not None:
-                    updates.append("gift_card_number = ?")
-                    params.append(gift_card_number)
-                
-                if status is not None:
-                    # 验证状态
-                    valid_statuses = [s.value for s in GiftCardStatus]
-                    if status not in valid_statuses:
-                        raise ValueError(f"无效的礼品卡状态: {status}")
-                    updates.append("status = ?")
-                    params.append(status)
-                
-                if notes is not None:
-                    updates.append("notes = ?")
-                    params.append(notes)
-                
-                if not updates:
-                    return True
-                
-                updates.append("updated_at = CURRENT_TIMESTAMP")
-                params.append(card_id)
-                
-                query = f"UPDATE gift_cards SET {', '.join(updates)} WHERE id = ?"
-                cursor.execute(query, params)
-                conn.commit()
-                
-                return cursor.rowcount > 0
+            if gift_card_number is None and status is None and notes is None:
+                return True
+
+            if status is not None:
+                # 验证状态
+                if status not in _VALID_GIFT_CARD_STATUSES:
+                    raise ValueError(f"无效的礼品卡状态: {status}")
+
+            rowcount, _ = self._write_execute(_SQL_UPDATE_GIFT_CARD, (gift_card_number, status, notes, card_id))
+            updated = rowcount > 0
+
+            self._cache_pop(self._gc_cache, card_id)
+            return updated
                 
         except Exception as e:
-            logger.error(f"更新礼品卡失败: {str(e)}")
+            logger.error("更新礼品卡失败: %s", e)
             return False
     
     def delete_gift_card(self, card_id: int) -> bool:
         """删除礼品卡（软删除）"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE gift_cards 
-                    SET is_active = 0, updated_at = CURRENT_TIMESTAMP 
-                    WHERE id = ?
-                ''', (card_id,))
-                conn.commit()
-                
-                return cursor.rowcount > 0
+            rowcount, _ = self._write_execute('''
+                UPDATE gift_cards 
+                SET is_active = 0, updated_at = CURRENT_TIMESTAMP 
+                WHERE id = ?
+            ''', (card_id,))
+            deleted = rowcount > 0
+
+            self._cache_pop(self._gc_cache, card_id)
+            return deleted
                 
         except Exception as e:
-            logger.error(f"删除礼品卡失败: {str(e)}")
+            logger.error("删除礼品卡失败: %s", e)
             return False
     
     # ==================== 辅助方法 ====================
     
-    def _row_to_account(self, row) -> Account:
-        """将数据库行转换为Account对象"""
-        # 处理可能不存在的phone_number字段
-        try:
-            phone_number = row['phone_number']
-        except (KeyError, IndexError):
-            phone_number = '+447700900000'  # 默认英国号码
-
-        return Account(
-            id=row['id'],
-            email=row['email'],
-            password=row['password'],
-            phone_number=phone_number,
-            created_at=row['created_at'],
-            updated_at=row['updated_at'],
-            is_active=bool(row['is_active'])
-        )
-    
-    def _row_to_gift_card(self, row) -> GiftCard:
-        """将数据库行转换为GiftCard对象"""
-        return GiftCard(
-            id=row['id'],
-            gift_card_number=row['gift_card_number'],
-            status=row['status'],
-            created_at=row['created_at'],
-            updated_at=row['updated_at'],
-            is_active=bool(row['is_active']),
-            notes=row['notes']
-        )
-    
     def get_statistics(self) -> Dict:
         """获取统计信息"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
-                
-                # 账号统计
-                cursor.execute('SELECT COUNT(*) FROM accounts WHERE is_active = 1')
-                active_accounts = cursor.fetchone()[0]
-                
-                # 礼品卡统计
-                cursor.execute('SELECT status, COUNT(*) FROM gift_cards WHERE is_active = 1 GROUP BY status')
-                gift_card_stats = dict(cursor.fetchall())
-                
-                cursor.execute('SELECT COUNT(*) FROM gift_cards WHERE is_active = 1')
-                total_gift_cards = cursor.fetchone()[0]
-                
+                cursor.execute(_SQL_STATISTICS)
+
+                # 第一行是账号总数，其余为各状态的礼品卡数量
+                active_accounts = 0
+                gift_card_stats = {}
+                for source, status, count in cursor.fetchall():
+                    if source == 'accounts':
+                        active_accounts = count
+                    else:
+                        gift_card_stats[status] = count
+                total_gift_cards = sum(gift_card_stats.values())
+
                 return {
                     'accounts': {
                         'total': active_accounts
@@ -520,62 +963,100 @@ class DatabaseManager:
                 }
                 
         except Exception as e:
-            logger.error(f"获取统计信息失败: {str(e)}")
+            logger.error("获取统计信息失败: %s", e)
             return {}
 
+    # ==================== 批量导出 ====================
+
+    def _export_columnar(self, table: str, columns: tuple, active_only: bool) -> Dict[str, list]:
+        """按列导出表数据（列式结构，每列一个列表）"""
+        try:
+            with self._read_connection() as conn:
+                # 直接取元组，不构造Row和数据类对象
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                query = f"SELECT {', '.join(columns)} FROM {table}"
+                if active_only:
+                    query += " WHERE is_active = 1"
+                query += " ORDER BY created_at DESC"
+                rows = cursor.execute(query).fetchall()
+
+            if not rows:
+                return {column: [] for column in columns}
+            return {column: list(values) for column, values in zip(columns, zip(*rows))}
+
+        except Exception as e:
+            logger.error("导出%s失败: %s", table, e)
+            return {column: [] for column in columns}
+
+    def export_accounts_columnar(self, active_only: bool = True) -> Dict[str, list]:
+        """导出账号（列式结构，不含密码）"""
+        return self._export_columnar('accounts', ACCOUNT_EXPORT_COLUMNS, active_only)
+
+    def export_gift_cards_columnar(self, active_only: bool = True) -> Dict[str, list]:
+        """导出礼品卡（列式结构）"""
+        return self._export_columnar('gift_cards', GIFT_CARD_EXPORT_COLUMNS, active_only)
+
     # ==================== 任务管理 ====================
 
     def save_task(self, task_dict: Dict[str, Any]) -> bool:
         """保存或更新任务"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
+            # 准备数据
+            task_data = {
+                'id': task_dict['id'],
+                'config': _json_dumps(task_dict['config']),
+                'status': task_dict['status'],
+                'current_step': task_dict.get('current_step'),
+                'progress': task_dict.get('progress', 0.0),
+                'created_at': task_dict['created_at'],
+                'started_at': task_dict.get('started_at'),
+                'completed_at': task_dict.get('completed_at'),
+                'error_message': task_dict.get('error_message'),
+                'logs': _json_dumps(task_dict.get('logs', [])),
+                'celery_task_id': task_dict.get('celery_task_id'),
+                # 🚀 存Unix时间戳，展示用的ISO字符串在读取时再生成
+                'last_updated': int(time.time())
+            }
 
-                # 准备数据
-                task_data = {
-                    'id': task_dict['id'],
-                    'config': json.dumps(task_dict['config']),
-                    'status': task_dict['status'],
-                    'current_step': task_dict.get('current_step'),
-                    'progress': task_dict.get('progress', 0.0),
-                    'created_at': task_dict['created_at'],
-                    'started_at': task_dict.get('started_at'),
-                    'completed_at': task_dict.get('completed_at'),
-                    'error_message': task_dict.get('error_message'),
-                    'logs': json.dumps(task_dict.get('logs', [])),
-                    'celery_task_id': task_dict.get('celery_task_id'),
-                    'last_updated': datetime.now().isoformat()
-                }
+            # 使用UPSERT进行插入或更新
+            self._write_execute(_SQL_SAVE_TASK, (
+                task_data['id'], task_data['config'], task_data['status'],
+                task_data['current_step'], task_data['progress'],
+                task_data['created_at'], task_data['started_at'],
+                task_data['completed_at'], task_data['error_message'],
+                task_data['logs'], task_data['celery_task_id'],
+                task_data['last_updated']
+            ))
 
-                # 使用REPLACE INTO进行插入或更新
-                cursor.execute('''
-                    REPLACE INTO tasks (
-                        id, config, status, current_step, progress,
-                        created_at, started_at, completed_at, error_message,
-                        logs, celery_task_id, last_updated
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    task_data['id'], task_data['config'], task_data['status'],
-                    task_data['current_step'], task_data['progress'],
-                    task_data['created_at'], task_data['started_at'],
-                    task_data['completed_at'], task_data['error_message'],
-                    task_data['logs'], task_data['celery_task_id'],
-                    task_data['last_updated']
-                ))
+            return True
 
-                conn.commit()
-                return True
+        except Exception as e:
+            logger.error("❌ 保存任务失败: %s - %s", task_dict.get('id', 'unknown'), e)
+            return False
+
+    def save_task_progress(self, task_id: str, status: str, current_step: Optional[str], progress: float) -> bool:
+        """只更新任务的状态/步骤/进度（高频进度更新使用，不序列化config和logs）
+
+        返回False表示任务行不存在或更新失败，调用方应回退到 save_task
+        """
+        try:
+            rowcount, _ = self._write_execute(_SQL_SAVE_TASK_PROGRESS, (
+                status, current_step, progress or 0.0,
+                int(time.time()), task_id
+            ))
+            return rowcount > 0
 
         except Exception as e:
-            logger.error(f"❌ 保存任务失败: {task_dict.get('id', 'unknown')} - {e}")
+            logger.error("❌ 更新任务进度失败: %s - %s", task_id, e)
             return False
 
     def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
         """获取单个任务"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
+                cursor.execute(_SQL_GET_TASK, (task_id,))
                 row = cursor.fetchone()
 
                 if row:
@@ -583,16 +1064,16 @@ class DatabaseManager:
                 return None
 
         except Exception as e:
-            logger.error(f"❌ 获取任务失败: {task_id} - {e}")
+            logger.error("❌ 获取任务失败: %s - %s", task_id, e)
             return None
 
-    def get_all_tasks(self, limit: int = None, offset: int = 0) -> List[Dict[str, Any]]:
-        """获取所有任务"""
+    def iter_tasks(self, limit: int = None, offset: int = 0) -> Iterator[Dict[str, Any]]:
+        """逐行迭代任务（按创建时间倒序），不一次性物化全部行"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
 
-                query = 'SELECT * FROM tasks ORDER BY created_at DESC'
+                query = _TASK_SELECT + ' ORDER BY created_at DESC'
                 params = []
 
                 if limit:
@@ -600,42 +1081,39 @@ class DatabaseManager:
                     params.extend([limit, offset])
 
                 cursor.execute(query, params)
-                rows = cursor.fetchall()
-
-                return [self._row_to_task_dict(row) for row in rows]
+                for row in cursor:
+                    yield self._row_to_task_dict(row)
 
         except Exception as e:
-            logger.error(f"❌ 获取所有任务失败: {e}")
-            return []
+            logger.error("❌ 迭代任务失败: %s", e)
+
+    def get_all_tasks(self, limit: int = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """获取所有任务"""
+        return list(self.iter_tasks(limit, offset))
 
     def delete_task(self, task_id: str) -> bool:
         """从数据库中删除任务"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-                conn.commit()
-
-                deleted_count = cursor.rowcount
-                if deleted_count > 0:
-                    logger.info(f"✅ 任务已从数据库删除: {task_id}")
-                    return True
-                else:
-                    logger.warning(f"⚠️ 数据库中未找到任务: {task_id}")
-                    return False
+            deleted_count, _ = self._write_execute(_SQL_DELETE_TASK, (task_id,))
+            if deleted_count > 0:
+                logger.info("✅ 任务已从数据库删除: %s", task_id)
+                return True
+            else:
+                logger.warning("⚠️ 数据库中未找到任务: %s", task_id)
+                return False
 
         except Exception as e:
-            logger.error(f"❌ 从数据库删除任务失败: {task_id} - {e}")
+            logger.error("❌ 从数据库删除任务失败: %s - %s", task_id, e)
             return False
 
     def get_tasks_by_status(self, status: str) -> List[Dict[str, Any]]:
         """根据状态获取任务"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
 
                 cursor.execute(
-                    'SELECT * FROM tasks WHERE status = ? ORDER BY created_at DESC',
+                    _TASK_SELECT + ' WHERE status = ? ORDER BY created_at DESC',
                     (status,)
                 )
                 rows = cursor.fetchall()
@@ -643,56 +1121,37 @@ class DatabaseManager:
                 return [self._row_to_task_dict(row) for row in rows]
 
         except Exception as e:
-            logger.error(f"❌ 根据状态获取任务失败: {status} - {e}")
+            logger.error("❌ 根据状态获取任务失败: %s - %s", status, e)
             return []
 
     def get_task_stats(self) -> Dict[str, int]:
         """获取任务统计信息"""
         try:
-            with self.get_connection() as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
-
-                cursor.execute('''
-                    SELECT
-                        status,
-                        COUNT(*) as count
-                    FROM tasks
-                    GROUP BY status
-                ''')
-
-                stats = {'total': 0, 'pending': 0, 'running': 0, 'completed': 0, 'failed': 0, 'cancelled': 0}
-
-                for row in cursor.fetchall():
-                    status, count = row
-                    if status in stats:
-                        stats[status] = count
-                    stats['total'] += count
-
-                return stats
+                cursor.execute(_SQL_TASK_STATS)
+                return dict(zip(_TASK_STATS_FIELDS, cursor.fetchone()))
 
         except Exception as e:
-            logger.error(f"❌ 获取任务统计失败: {e}")
-            return {'total': 0, 'pending': 0, 'running': 0, 'completed': 0, 'failed': 0, 'cancelled': 0}
+            logger.error("❌ 获取任务统计失败: %s", e)
+            return dict.fromkeys(_TASK_STATS_FIELDS, 0)
 
     def _row_to_task_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
         """将数据库行转换为任务字典"""
         try:
-            task_dict = {
-                'id': row['id'],
-                'config': json.loads(row['config']) if row['config'] else {},
-                'status': row['status'],
-                'current_step': row['current_step'],
-                'progress': row['progress'] or 0.0,
-                'created_at': row['created_at'],
-                'started_at': row['started_at'],
-                'completed_at': row['completed_at'],
-                'error_message': row['error_message'],
-                'logs': json.loads(row['logs']) if row['logs'] else [],
-                'celery_task_id': row['celery_task_id'],
-                'last_updated': row['last_updated']
-            }
+            # config/logs 已由 JSON 转换器解码，这里按位置取值
+            task_dict = dict(zip(_TASK_FIELDS, row))
+            if task_dict['config'] is None:
+                task_dict['config'] = {}
+            if task_dict['logs'] is None:
+                task_dict['logs'] = []
+            if not task_dict['progress']:
+                task_dict['progress'] = 0.0
+            last_updated = task_dict['last_updated']
+            if isinstance(last_updated, int):
+                task_dict['last_updated'] = datetime.fromtimestamp(last_updated).isoformat()
             return task_dict
 
         except Exception as e:
-            logger.error(f"❌ 转换数据库行失败: {e}")
+            logger.error("❌ 转换数据库行失败: %s", e)
             return {}
@@ -1,10 +1,19 @@
-from dataclasses import dataclass, asdict
+from collections import deque
+from dataclasses import dataclass, field
 from enum import Enum
 from typing import Dict, Any, Optional, List
 from datetime import datetime
-import uuid
+import os
+import sys
+import time
 
-class TaskStatus(Enum):
+# 🚀 Python 3.10+ 使用slots数据类，去掉每个实例的 __dict__
+_DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# 每个任务保留的最大日志条数，超出后自动丢弃最早的条目
+MAX_TASK_LOGS = 2048
+
+class TaskStatus(str, Enum):
     PENDING = "pending"
     RUNNING = "running"
     COMPLETED = "completed"
@@ -20,7 +29,7 @@ class TaskStatus(Enum):
     # 特殊状态
     WAITING_GIFT_CARD_INPUT = "waiting_gift_card_input"  # 等待用户输入礼品卡
 
-class TaskStep(Enum):
+class TaskStep(str, Enum):
     # 🚀 四大阶段流程
     STAGE_1_PRODUCT_CONFIG = "stage_1_product_config"      # 阶段1：产品配置
     STAGE_2_ACCOUNT_LOGIN = "stage_2_account_login"        # 阶段2：账号登录
@@ -36,7 +45,11 @@ class TaskStep(Enum):
     APPLYING_GIFT_CARD = "applying_gift_card"
     FINALIZING = "finalizing"
 
-@dataclass
+# 🚀 值到枚举成员的映射表，按值查找时直接查字典，绕过 EnumMeta.__call__
+_STATUS_BY_VALUE = TaskStatus._value2member_map_
+_STEP_BY_VALUE = TaskStep._value2member_map_
+
+@dataclass(**_DATACLASS_OPTIONS)
 class GiftCard:
     """礼品卡数据类"""
     number: str
@@ -45,7 +58,7 @@ class GiftCard:
     applied_amount: Optional[float] = None  # 实际应用金额
     error_message: Optional[str] = None  # 错误信息
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class ProductConfig:
     model: str
     finish: str
@@ -54,13 +67,13 @@ class ProductConfig:
     payment: str = "Buy"
     apple_care: str = "No AppleCare+ Coverage"
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class AccountConfig:
     email: str
-    password: str
+    password: str = field(repr=False)  # 不出现在repr/调试日志中
     phone_number: str = '07700900000'
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class TaskConfig:
     name: str
     url: str
@@ -71,15 +84,87 @@ class TaskConfig:
     gift_cards: List[GiftCard] = None  # 支持多张礼品卡
     use_proxy: bool = False
     apple_email: Optional[str] = None
-    apple_password: Optional[str] = None
+    apple_password: Optional[str] = field(default=None, repr=False)
     phone_number: Optional[str] = None
     gift_card_code: Optional[str] = None  # 保持向后兼容
+    blocked_resource_types: Optional[List[str]] = None  # 拦截的资源类型，None使用默认值，空列表不拦截
+    verify_cart: bool = False  # 点击Check Out前是否验证购物车商品（仅诊断用）
     
     def __post_init__(self):
         if self.gift_cards is None:
             self.gift_cards = []
 
-@dataclass
+# 🚀 手写序列化，替代 asdict 的递归深拷贝
+
+def _serialize_gift_card(gc) -> Dict[str, Any]:
+    if isinstance(gc, dict):
+        return dict(gc)  # 兼容从字典恢复、尚未重建为GiftCard的条目
+    return {
+        'number': gc.number,
+        'expected_status': gc.expected_status,
+        'applied': gc.applied,
+        'applied_amount': gc.applied_amount,
+        'error_message': gc.error_message,
+    }
+
+def _serialize_config(c: TaskConfig) -> Dict[str, Any]:
+    pc = c.product_config
+    ac = c.account_config
+    return {
+        'name': c.name,
+        'url': c.url,
+        'product_config': {
+            'model': pc.model,
+            'finish': pc.finish,
+            'storage': pc.storage,
+            'trade_in': pc.trade_in,
+            'payment': pc.payment,
+            'apple_care': pc.apple_care,
+        },
+        'account_config': {
+            'email': ac.email,
+            'password': ac.password,
+            'phone_number': ac.phone_number,
+        },
+        'enabled': c.enabled,
+        'priority': c.priority,
+        'gift_cards': [_serialize_gift_card(gc) for gc in c.gift_cards] if c.gift_cards is not None else None,
+        'use_proxy': c.use_proxy,
+        'apple_email': c.apple_email,
+        'apple_password': c.apple_password,
+        'phone_number': c.phone_number,
+        'gift_card_code': c.gift_card_code,
+        'blocked_resource_types': c.blocked_resource_types,
+        'verify_cart': c.verify_cart,
+    }
+
+def _serialize_log(entry: Dict[str, Any]) -> Dict[str, Any]:
+    # add_log 只记录 time.time()，这里才格式化为ISO字符串；从字典恢复的条目已是ISO格式
+    ts = entry.get('ts')
+    if ts is None:
+        return entry
+    return {
+        'timestamp': datetime.fromtimestamp(ts).isoformat(),
+        'level': entry['level'],
+        'message': entry['message'],
+    }
+
+def _serialize_task(t: 'Task') -> Dict[str, Any]:
+    return {
+        'id': t.id,
+        'config': _serialize_config(t.config),
+        # 🚀 TaskStatus/TaskStep 成员本身就是 str，无需取 .value
+        'status': t.status,
+        'current_step': t.current_step or None,
+        'progress': t.progress,
+        'created_at': t.created_at.isoformat(),  # __post_init__ / from_dict 保证已设置
+        'started_at': s.isoformat() if (s := t.started_at) else None,
+        'completed_at': c.isoformat() if (c := t.completed_at) else None,
+        'error_message': t.error_message,
+        'logs': [_serialize_log(entry) for entry in t.logs] if t.logs is not None else None,
+    }
+
+@dataclass(**_DATACLASS_OPTIONS)
 class Task:
     id: str
     config: TaskConfig
@@ -90,45 +175,39 @@ class Task:
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
-    logs: list = None
+    logs: deque = None
+    # 自动化执行过程中的阶段标记（slots实例不能再动态添加属性，需在此声明）
+    stage_3_completed: bool = False
+    stage_4_completed: bool = False
+    gift_cards_applied: bool = False
     
     def __post_init__(self):
         if self.id is None:
-            self.id = str(uuid.uuid4())
+            # 🚀 128位随机ID，直接取 urandom 的十六进制，不经过UUID对象格式化
+            self.id = os.urandom(16).hex()
         if self.created_at is None:
             self.created_at = datetime.now()
         if self.logs is None:
-            self.logs = []
+            self.logs = deque(maxlen=MAX_TASK_LOGS)
+        elif not isinstance(self.logs, deque):
+            self.logs = deque(self.logs, maxlen=MAX_TASK_LOGS)
     
     def to_dict(self) -> Dict[str, Any]:
-        result = asdict(self)
-        # 安全地获取status值
-        result['status'] = self.status.value if hasattr(self.status, 'value') else str(self.status)
-        # 安全地获取current_step值
-        if self.current_step:
-            result['current_step'] = self.current_step.value if hasattr(self.current_step, 'value') else str(self.current_step)
-        else:
-            result['current_step'] = None
-        result['created_at'] = self.created_at.isoformat() if self.created_at else None
-        result['started_at'] = self.started_at.isoformat() if self.started_at else None
-        result['completed_at'] = self.completed_at.isoformat() if self.completed_at else None
-        return result
+        return _serialize_task(self)
     
     def add_log(self, message: str, level: str = "info"):
+        # 🚀 只记录 time.time()，ISO时间戳在 to_dict 时再生成
         log_entry = {
-            'timestamp': datetime.now().isoformat(),
+            'ts': time.time(),
             'level': level,
             'message': message
         }
         self.logs.append(log_entry)
         
     def update_progress(self, step: TaskStep, progress: float):
-        # 确保step是TaskStep枚举，如果是字符串则转换
+        # 确保step是TaskStep枚举，如果是字符串则转换（无法识别的值保持原值）
         if isinstance(step, str):
-            try:
-                self.current_step = TaskStep(step)
-            except ValueError:
-                self.current_step = step  # 如果转换失败，保持原值
+            self.current_step = _STEP_BY_VALUE.get(step, step)
         else:
             self.current_step = step
         self.progress = progress
@@ -136,72 +215,84 @@ class Task:
     @classmethod
     def from_dict(cls, data: Dict) -> 'Task':
         """从字典创建Task对象"""
-        # 重建配置对象
+        # 🚀 用 object.__new__ 构造并直接赋值，跳过 __init__ 参数绑定和 __post_init__；
+        # 各层字典的 .get 只解析一次
+        _get = data.get
         config_data = data['config']
+        _cget = config_data.get
+        account_data = config_data['account_config']
+        _acget = account_data.get
+        product_data = config_data['product_config']
+        _pcget = product_data.get
+        _new = object.__new__
+        _fromiso = datetime.fromisoformat
 
-        account_config = AccountConfig(
-            email=config_data['account_config']['email'],
-            password=config_data['account_config']['password'],
-            phone_number=config_data['account_config'].get('phone_number', '07700900000')
-        )
-
-        product_config = ProductConfig(
-            model=config_data['product_config']['model'],
-            finish=config_data['product_config']['finish'],
-            storage=config_data['product_config']['storage'],
-            trade_in=config_data['product_config'].get('trade_in', 'No trade-in'),
-            payment=config_data['product_config'].get('payment', 'Buy'),
-            apple_care=config_data['product_config'].get('apple_care', 'No AppleCare+ Coverage')
-        )
-
-        task_config = TaskConfig(
-            name=config_data['name'],
-            url=config_data['url'],
-            account_config=account_config,
-            product_config=product_config,
-            enabled=config_data.get('enabled', True),
-            priority=config_data.get('priority', 1),
-            gift_cards=config_data.get('gift_cards'),
-            gift_card_code=config_data.get('gift_card_code'),
-            use_proxy=config_data.get('use_proxy', False)
-        )
-
-        # 创建Task对象
-        task = cls(
-            id=data['id'],
-            config=task_config
-        )
-
-        # 设置状态和时间
-        # 处理status - 可能是字符串或枚举
-        status_value = data['status']
-        if isinstance(status_value, str):
-            task.status = TaskStatus(status_value)
-        else:
-            task.status = status_value
+        account_config = _new(AccountConfig)
+        account_config.email = account_data['email']
+        account_config.password = account_data['password']
+        account_config.phone_number = _acget('phone_number', '07700900000')
 
-        task.progress = data.get('progress', 0)
+        product_config = _new(ProductConfig)
+        product_config.model = product_data['model']
+        product_config.finish = product_data['finish']
+        product_config.storage = product_data['storage']
+        product_config.trade_in = _pcget('trade_in', 'No trade-in')
+        product_config.payment = _pcget('payment', 'Buy')
+        product_config.apple_care = _pcget('apple_care', 'No AppleCare+ Coverage')
 
-        # 处理current_step - 可能是字符串或枚举
-        current_step_value = data.get('current_step')
-        if current_step_value:
-            if isinstance(current_step_value, str):
-                task.current_step = TaskStep(current_step_value)
-            else:
-                task.current_step = current_step_value
-        else:
-            task.current_step = None
-        task.error_message = data.get('error_message')
-
-        # 解析时间
-        if data.get('created_at'):
-            task.created_at = datetime.fromisoformat(data['created_at'])
-        if data.get('started_at'):
-            task.started_at = datetime.fromisoformat(data['started_at'])
-        if data.get('completed_at'):
-            task.completed_at = datetime.fromisoformat(data['completed_at'])
-
-        # 重建日志
-        task.logs = data.get('logs', [])
+        # 礼品卡重建为GiftCard对象（调用方按 gc.number 访问），代替 __post_init__ 的默认值
+        gift_cards = []
+        for g in _cget('gift_cards') or ():
+            if not isinstance(g, dict):
+                gift_cards.append(g)
+                continue
+            _gget = g.get
+            gc = _new(GiftCard)
+            gc.number = g['number']
+            gc.expected_status = _gget('expected_status', 'has_balance')
+            gc.applied = _gget('applied', False)
+            gc.applied_amount = _gget('applied_amount')
+            gc.error_message = _gget('error_message')
+            gift_cards.append(gc)
+
+        task_config = _new(TaskConfig)
+        task_config.name = config_data['name']
+        task_config.url = config_data['url']
+        task_config.product_config = product_config
+        task_config.account_config = account_config
+        task_config.enabled = _cget('enabled', True)
+        task_config.priority = _cget('priority', 1)
+        task_config.gift_cards = gift_cards
+        task_config.use_proxy = _cget('use_proxy', False)
+        task_config.apple_email = None
+        task_config.apple_password = None
+        task_config.phone_number = None
+        task_config.gift_card_code = _cget('gift_card_code')
+        task_config.blocked_resource_types = _cget('blocked_resource_types')
+        task_config.verify_cart = _cget('verify_cart', False)
+
+        task = _new(cls)
+        task.id = data['id']
+        task.config = task_config
+        # status/current_step 可能是字符串或枚举，无法识别的字符串保持原值
+        v = data['status']
+        task.status = _STATUS_BY_VALUE.get(v, v)
+        v = _get('current_step')
+        task.current_step = _STEP_BY_VALUE.get(v, v) if v else None
+        task.progress = _get('progress', 0)
+
+        # 解析时间（🚀 C实现的 fromisoformat；3.11 之前不识别结尾的 Z，先替换为 +00:00）
+        v = _get('created_at')
+        task.created_at = _fromiso(v[:-1] + '+00:00' if v.endswith('Z') else v) if v else datetime.now()
+        v = _get('started_at')
+        task.started_at = _fromiso(v[:-1] + '+00:00' if v.endswith('Z') else v) if v else None
+        v = _get('completed_at')
+        task.completed_at = _fromiso(v[:-1] + '+00:00' if v.endswith('Z') else v) if v else None
+
+        task.error_message = _get('error_message')
+        task.logs = deque(_get('logs') or (), maxlen=MAX_TASK_LOGS)
+        task.stage_3_completed = False
+        task.stage_4_completed = False
+        task.gift_cards_applied = False
 
         return task
\ No newline at end of file
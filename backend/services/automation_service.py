@@ -1,9 +1,17 @@
 import asyncio
+import hashlib
+import json
 import logging
+import os
+import re
+import time
 import threading
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+from playwright.async_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
 from models.task import Task, TaskStatus, TaskStep
 from .ip_service import IPService
 from .message_service import get_message_service
@@ -11,15 +19,593 @@ from .message_service_sota import get_sota_message_service
 
 logger = logging.getLogger(__name__)
 
+# 🚀 WebSocket消息合并窗口（秒）与单批最大条数，超过条数立即发送
+WS_BATCH_INTERVAL = 0.05
+WS_BATCH_MAX_MESSAGES = 140
+
+# 🚀 预热的浏览器上下文数量：新任务（不使用代理时）直接取用，取走后在后台补充
+CONTEXT_POOL_SIZE = 2
+_CONTEXT_OPTIONS = {'locale': "en-GB"}
+
+# 🚀 登录成功后按账号保存cookie，24小时内的新任务直接恢复，Apple会跳过登录页
+AUTH_STATE_MAX_AGE = 24 * 3600
+# 登录状态文件目录（文件含Apple会话cookie，目录已在.gitignore中忽略）
+AUTH_STATE_DIR = os.environ.get('APPLE_BOT_AUTH_STATE_DIR', 'auth_state')
+
+# 🚀 出错截图和页面HTML只在设置APPLE_BOT_DEBUG_DUMP环境变量时在后台保存，不阻塞后续操作
+DEBUG_DUMP = bool(os.environ.get('APPLE_BOT_DEBUG_DUMP'))
+# 🚀 调试HTML只转储结账内容容器（按main、#checkout、#root、body的优先级选取），避免page.content()序列化整个DOM
+_JS_DEBUG_DUMP_CONTAINER_HTML = """() => (document.querySelector('main') || document.querySelector('#checkout')
+    || document.querySelector('#root') || document.body).innerHTML"""
+
+
+def _write_text_file(path: str, content: str):
+    """写入文本文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def _auth_state_path(email: str) -> str:
+    """账号登录状态文件路径（文件名只含邮箱哈希）"""
+    return os.path.join(AUTH_STATE_DIR, f"{hashlib.sha256(email.lower().encode()).hexdigest()[:16]}.json")
+
+
+def _discard_auth_state(email: str):
+    """删除账号保存的登录状态（账号被锁定或登录失败时，不再恢复该会话）"""
+    if not email:
+        return
+    try:
+        os.unlink(_auth_state_path(email))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"删除登录状态失败: {e}")
+
+# 🚀 自定义选择器引擎 apple=<目标>：每个目标的规则按优先级排列，页面内一次遍历，
+# 返回第一条有可见可用匹配的规则命中的元素；text 为忽略大小写的文本包含匹配，skip 为需跳过的按钮文本
+_APPLE_SELECTOR_TARGETS = {
+    # Add to Bag按钮 - 避免点击"Check Out with Apple Pay"按钮
+    'addToBag': {
+        'skip': ['apple pay', 'check out'],
+        'rules': [
+            {'css': 'button[data-autom*="add-to-cart"]:not([data-autom*="apple-pay"])'},
+            {'css': 'button[data-autom*="addToCart"]:not([data-autom*="apple-pay"])'},
+            {'css': '[data-autom="add-to-cart"]:not([data-autom*="apple-pay"])'},
+            {'css': '[data-autom*="add-to-bag"]'},
+            {'css': 'button', 'text': 'add to bag'},
+            {'css': 'button', 'text': 'add to cart'},
+            {'css': 'button', 'text': '添加到购物袋'},
+            {'css': '.as-buttongroup-item button'},
+            {'css': 'button[aria-label*="Add"]:not([aria-label*="Apple Pay"])'},
+            {'css': 'button[aria-label*="add"]:not([aria-label*="Apple Pay"])'},
+            {'css': 'button', 'text': 'add'},
+            {'css': '[role="button"]', 'text': 'add to bag'},
+            {'css': '.rs-bag-button'},
+            {'css': '.add-to-bag-button'},
+            {'css': 'button[class*="add-to-bag"]'},
+        ],
+    },
+    # Review Bag按钮（加入购物袋后的弹层）
+    'reviewBag': {
+        'skip': [],
+        'rules': [
+            {'css': 'button, [role="button"]', 'text': 'review bag'},
+            {'css': 'a, [role="link"]', 'text': 'review bag'},
+        ],
+    },
+    # 购物袋页面的Check Out按钮 - 避免点击Apple Pay按钮
+    'checkout': {
+        'skip': ['apple pay'],
+        'rules': [
+            {'css': '[data-autom="checkout"]'},
+            {'css': 'button[data-autom*="checkout"], a[data-autom*="checkout"]'},
+            {'css': 'button, [role="button"]', 'text': 'check out'},
+            {'css': 'button, [role="button"]', 'text': 'checkout'},
+            {'css': 'a, [role="link"]', 'text': 'check out'},
+            {'css': 'a, [role="link"]', 'text': 'checkout'},
+            {'css': '.checkout-button'},
+            {'css': '.checkout-btn'},
+            {'css': '#checkout'},
+            {'css': '#checkoutButton'},
+            {'css': 'button[class*="checkout"]'},
+        ],
+    },
+    # 登录后的Continue to Shipping Address按钮
+    'shippingContinue': {
+        'skip': [],
+        'rules': [
+            {'css': 'button', 'text': 'continue to shipping address'},
+            {'css': 'button', 'text': 'continue'},
+            {'css': 'button[type="submit"]'},
+            {'css': '[data-testid*="continue"]'},
+            {'css': '[data-autom*="continue"]'},
+        ],
+    },
+    # 地址确认卡片的Use Existing Address按钮
+    'useExistingAddress': {
+        'skip': [],
+        'rules': [
+            {'css': 'button', 'text': 'use existing address'},
+            {'css': 'button', 'text': 'use existing'},
+            {'css': '[data-autom*="use-existing"], [data-autom*="existing-address"]'},
+            {'css': 'button', 'text': 'use this address!'},
+        ],
+    },
+    # 无法判断页面状态时的通用Continue/Next按钮
+    'genericContinue': {
+        'skip': [],
+        'rules': [
+            {'css': 'button', 'text': 'continue'},
+            {'css': 'button', 'text': 'next'},
+            {'css': 'button[type="submit"]'},
+            {'css': 'input[type="submit"]'},
+            {'css': '[data-autom*="continue"]'},
+            {'css': '[data-autom*="next"]'},
+            {'css': '.continue-button'},
+            {'css': '.next-button'},
+        ],
+    },
+    # 页面上的Sign In登录链接
+    'signinLink': {
+        'skip': [],
+        'rules': [
+            {'css': 'a', 'text': 'sign in'},
+            {'css': 'a', 'text': '登录'},
+            {'css': 'button', 'text': 'sign in'},
+            {'css': '[data-testid*="signin"]'},
+            {'css': '[data-autom*="signin"]'},
+        ],
+    },
+    # 付款页面的"Enter your gift card number"礼品卡链接
+    'giftCardLink': {
+        'skip': [],
+        'rules': [
+            {'css': 'button[data-autom="enter-giftcard-number"]'},
+            {'css': '[data-autom*="gift"]'},
+            {'css': 'a, button, [role="button"], [role="link"]', 'text': 'enter your gift card number'},
+            {'css': 'a, button, [role="button"], [role="link"]', 'text': 'do you have an apple gift card?'},
+        ],
+    },
+    # 礼品卡号码输入框
+    'giftCardInput': {
+        'skip': [],
+        'rules': [
+            {'css': 'input[id="checkout.billing.billingOptions.selectedBillingOptions.giftCard.giftCardInput.giftCard"]'},
+            {'css': 'input[data-autom="gift-card-pin"]'},
+            {'css': 'input[id*="giftCard"]'},
+            {'css': 'input[id*="gift_card"]'},
+            {'css': 'input[type="text"][class*="form-textbox-input"]'},
+            {'css': 'input[type="text"]'},
+        ],
+    },
+}
+# 礼品卡专用输入框（不含宽泛的文本输入框），用于等待点击链接后输入框出现
+_GIFT_CARD_INPUT_SELECTOR = 'input[id*="giftCard"], input[id*="gift_card"], input[data-autom="gift-card-pin"]'
+_APPLE_SELECTOR_ENGINE = """(() => {
+    const targets = %s;
+    const isClickable = el => {
+        const rect = el.getBoundingClientRect();
+        const style = getComputedStyle(el);
+        return rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden'
+            && style.display !== 'none' && !el.disabled;
+    };
+    const textOf = el => ((el.textContent || '') + ' ' + (el.getAttribute('aria-label') || '')).toLowerCase();
+    const queryAll = (root, name) => {
+        const target = targets[name];
+        if (!target) throw new Error('Unknown apple selector: ' + name);
+        for (const rule of target.rules) {
+            const found = Array.from(root.querySelectorAll(rule.css)).filter(el => {
+                if (!isClickable(el)) return false;
+                const text = textOf(el);
+                return (!rule.text || text.includes(rule.text)) && !target.skip.some(t => text.includes(t));
+            });
+            if (found.length) return found;
+        }
+        return [];
+    };
+    return {query: (root, name) => queryAll(root, name)[0] || null, queryAll};
+})()""" % json.dumps(_APPLE_SELECTOR_TARGETS, ensure_ascii=False)
+
+# 购物车商品元素；验证时一次evaluate返回 {items: 商品元素数, empty: 页面是否有空购物车提示}
+_CART_ITEM_SELECTORS = ('.bag-item', '.cart-item', '[data-autom*="item"]', '.product-item', '.checkout-item')
+_CART_ITEM_UNION = ','.join(_CART_ITEM_SELECTORS)
+_JS_CART_STATE = """(itemSelector) => ({
+    items: document.querySelectorAll(itemSelector).length,
+    empty: /empty|no items/i.test(document.body ? document.body.innerText.slice(0, 2000) : ''),
+})"""
+
+# 🚀 点击Add to Bag后出现的购物袋确认元素，以及点击Check Out后的目标URL、购物袋页面URL
+_BAG_CONFIRMATION_SELECTOR = '[data-autom*="bag"], [data-autom*="mini-cart-badge"]'
+_CHECKOUT_URL_RE = re.compile(r'checkout|billing|signin|login', re.IGNORECASE)
+_BAG_URL_RE = re.compile(r'bag|cart', re.IGNORECASE)
+# 🚀 填写电话号码后点击Continue：等待地址确认卡片出现或跳转到付款页面
+_ADDRESS_CARD_SELECTOR = 'button:has-text("Use Existing Address"), button:has-text("Use this address!")'
+_PAYMENT_URL_RE = re.compile(r'payment|billing', re.IGNORECASE)
+# Apple登录接口（idmsa signin）；409表示需要双重认证，不算登录错误
+_AUTH_SIGNIN_URL_RE = re.compile(r'idmsa\.apple\.com/.*signin', re.IGNORECASE)
+
+
+def _is_auth_error_response(response) -> bool:
+    """是否为Apple登录接口的错误响应"""
+    return response.status >= 400 and response.status != 409 and _AUTH_SIGNIN_URL_RE.search(response.url) is not None
+
+
+# 提交登录后出现的错误提示（排除页面上常驻的空提示区域）
+_LOGIN_ERROR_SELECTOR = '.error-dialog, [role="alert"]:not(:empty), [aria-live="assertive"]:not(:empty)'
+# 付款页面的卡号输入框
+_CARD_FIELD_SELECTOR = 'input[name*="card"], input[autocomplete="cc-number"]'
+# 🚀 付款/配送页面判断：URL、标题与可见的卡号输入框在一次evaluate中检查
+_PAYMENT_INDICATORS = ('payment', 'billing', 'card')
+_SHIPPING_EXCLUSIONS = ('shipping-init', 'shipping', 'address')  # 排除仍在配送阶段的URL
+_SHIPPING_INDICATORS = ('shipping', 'address', 'delivery')
+_JS_CHECKOUT_PAGE_STATE = """([payInd, shipExc, shipInd]) => {
+    const u = location.href.toLowerCase(), t = document.title.toLowerCase();
+    const card = document.querySelector('input[name*="card"], input[autocomplete="cc-number"]');
+    const hasCardField = !!card && card.getBoundingClientRect().width > 0;
+    const urlPayment = payInd.some(i => u.includes(i) || t.includes(i)) && !shipExc.some(i => u.includes(i));
+    return {
+        url: location.href,
+        title: document.title,
+        isPayment: urlPayment || hasCardField,
+        isShipping: shipInd.some(i => u.includes(i) || t.includes(i)),
+        hasCardField,
+    };
+}"""
+
+# 🚀 等价的输入框选择器合并为CSS并集，一次等待第一个可见元素
+_LOGIN_EMAIL_SELECTOR = ', '.join((
+    'input[type="email"]', 'input[name="accountName"]', '#account_name_text_field', '[placeholder*="email"]',
+))
+# 🚀 页面内用MutationObserver等待可见元素（可按文本过滤），DOM变化时立即判断，不按固定间隔轮询
+_JS_WAIT_FOR_VISIBLE = """([selector, texts, timeout]) => new Promise(resolve => {
+    const lowered = texts.map(t => t.toLowerCase());
+    const found = () => Array.from(document.querySelectorAll(selector)).some(el => {
+        const rect = el.getBoundingClientRect();
+        if (!(rect.width > 0 && rect.height > 0)) return false;
+        const style = getComputedStyle(el);
+        if (style.visibility === 'hidden' || style.display === 'none') return false;
+        if (!lowered.length) return true;
+        const text = (el.textContent || '').toLowerCase();
+        return lowered.some(t => text.includes(t));
+    });
+    if (found()) return resolve(true);
+    const observer = new MutationObserver(() => {
+        if (found()) { observer.disconnect(); clearTimeout(timer); resolve(true); }
+    });
+    const timer = setTimeout(() => { observer.disconnect(); resolve(false); }, timeout);
+    observer.observe(document.documentElement, {subtree: true, childList: true, attributes: true, characterData: true});
+})"""
+# 输入元素的类型与可编辑性；contenteditable元素一次设置文本并触发input/change事件
+_JS_ELEMENT_EDIT_META = "el => ({tag: el.tagName.toLowerCase(), editable: el.isContentEditable})"
+_JS_SET_EDITABLE_TEXT = """(el, value) => {
+    el.focus();
+    el.textContent = value;
+    el.dispatchEvent(new InputEvent('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+}"""
+_PHONE_INPUT_SELECTOR = ', '.join((
+    'input[name="mobilePhone"]',
+    'input[name="phoneNumber"]',
+    'input[name="phone"]',
+    'input[placeholder*="phone"]',
+    'input[placeholder*="Phone"]',
+    'input[placeholder*="mobile"]',
+    'input[placeholder*="Mobile"]',
+    'input[type="tel"]',
+    '#mobilePhone',
+    '#phoneNumber',
+    '#phone',
+    '[data-autom*="phone"]',
+    '[data-autom*="mobile"]',
+))
+
+# 🚀 固定的选择器列表在模块加载时构建一次，不再每次调用重新分配
+_LOGIN_IFRAME_SELECTORS = (
+    '#aid-auth-widget-iFrame',
+    'iframe[name="aid-auth-widget"]',
+    'iframe[title*="Sign In"]',
+    'iframe[src*="idmsa.apple.com"]',
+    'iframe[src*="appleid.apple.com"]',
+)
+_CONTINUE_BUTTON_SELECTORS = (
+    'button[data-autom="continueButton"]',
+    'button:has-text("Continue")',
+    'button:has-text("Proceed")',
+    'button:has-text("Next")',
+    '.rs-continue-button',
+    '[data-autom="checkout-continue-button"]',
+)
+_TERMS_CHECKBOX_SELECTORS = (
+    'input[type="checkbox"][data-autom="terms-checkbox"]',
+    'input[type="checkbox"]:near(:text("Terms and Conditions"))',
+    'input[type="checkbox"]:near(:text("I have read, understand and agree"))',
+    '.rs-terms-checkbox input[type="checkbox"]',
+    '[data-autom="terms-and-conditions-checkbox"]',
+)
+_PLACE_ORDER_SELECTORS = (
+    'button:has-text("Place your order")',
+    'button[data-autom="place-order-button"]',
+    'button[data-autom="placeOrderButton"]',
+    '.rs-place-order-button',
+    'button:has-text("Place Order")',
+)
+
+# 🚀 页面状态检测：URL关键词预编译为正则，页面元素计数合并为一次evaluate
+_CHECKOUT_PAGE_URL_RE = re.compile(r'checkout|billing|payment|fulfillment|shipping', re.IGNORECASE)
+_SIGNIN_URL_RE = re.compile(r'signin|login', re.IGNORECASE)
+_LOGIN_URL_RE = re.compile(r'signin|login|auth|appleid', re.IGNORECASE)
+_IDMSA_URL_RE = re.compile(r'appleid|idmsa', re.IGNORECASE)
+_LOGIN_SUCCESS_URL_RE = re.compile(
+    r'checkout|fulfillment|billing|payment|shipping|secure8\.store\.apple\.com', re.IGNORECASE
+)
+_CHECKOUT_TITLE_RE = re.compile(r'checkout|bag|cart|billing|payment', re.IGNORECASE)
+# 账号锁定关键词与错误消息元素
+_ACCOUNT_LOCK_INDICATORS = (
+    "This Apple Account has been locked for security reasons",
+    "You must unlock your account before signing in",
+    "account has been locked",
+    "account is locked",
+    "security reasons",
+    "unlock your account",
+    "locked for security",
+    "account locked",
+    "temporarily locked",
+    "suspended",
+    "disabled",
+)
+_ACCOUNT_ERROR_SELECTORS = ', '.join((
+    '.error-message', '.alert-error', '[role="alert"]', '.notification-error', '.security-message', '.account-locked',
+))
+
+# 返回 {indicator: 页面文本命中的关键词, alert: 错误元素中命中的文本, preview: 页面文本预览}
+_JS_FIND_LOCK_MESSAGE = """([indicators, selectors]) => {
+    const lowered = indicators.map(i => i.toLowerCase());
+    const text = document.body ? document.body.innerText : '';
+    const textLower = text.toLowerCase();
+    const index = lowered.findIndex(i => textLower.includes(i));
+    let alert = null;
+    if (index < 0) {
+        for (const el of document.querySelectorAll(selectors)) {
+            const t = (el.textContent || '').trim();
+            if (t && lowered.some(i => t.toLowerCase().includes(i))) { alert = t; break; }
+        }
+    }
+    return {indicator: index < 0 ? null : indicators[index], alert, preview: text.slice(0, 1000)};
+}"""
+# 页面上是否存在错误/安全提示元素（账号锁定检查的前置判断）
+_JS_HAS_ERROR_BANNER = """() => !!document.querySelector(
+    '.error, [role=alert], .form-message--error, [data-autom*=error], .error-message, .alert-error, .security-message, .account-locked'
+)"""
+# 登录重试：页面上没有错误提示时返回true
+_JS_NO_ERROR_VISIBLE = """() => !document.querySelector('.error-dialog, [role=alert], [aria-live="assertive"]')"""
+_JS_PAGE_STATE_COUNTS = """() => ({
+    login: document.querySelectorAll('iframe[src*="idmsa.apple.com"], iframe[src*="appleid.apple.com"]').length,
+    checkout: document.querySelectorAll('[data-testid*="checkout"], [data-testid*="billing"], .checkout, .billing, [data-testid*="fulfillment"]').length,
+})"""
+
+# 🚀 默认拦截的资源类型与统计/广告域名（流程只点击按钮，不需要这些资源）
+DEFAULT_BLOCKED_RESOURCE_TYPES = frozenset({'image', 'font', 'media'})
+_ANALYTICS_HOST_RE = re.compile(
+    r'^https?://([^/]*\.)?(doubleclick\.net|google-analytics\.com|googletagmanager\.com'
+    r'|facebook\.net|scorecardresearch\.com|hotjar\.com'
+    r'|omtrdc\.net|demdex\.net|adobedtm\.com|metrics\.apple\.com|securemetrics\.apple\.com)(:\d+)?/',
+    re.IGNORECASE,
+)
+
+# 🚀 关键词匹配预编译为正则（忽略大小写），页面内匹配时复用同一模式
+_ADD_RE = re.compile(r"add to bag|add to cart|add", re.I)
+_REVIEW_RE = re.compile(r"review bag|view bag|go to bag|checkout|\bbag\b|\bcart\b|continue|proceed", re.I)
+_SECURITY_RE = re.compile(
+    r"无法识别|can't verify|verification failed|验证失败|too many attempts|暂时锁定"
+    r"|temporarily locked|请稍后再试|try again later|security|安全",
+    re.I,
+)
+
+# 🚀 备用策略：在页面内一次性找出第一个文本匹配正则且可见可用的元素，返回[索引, 文本]
+_JS_FIRST_KEYWORD_MATCH = """(elements, pattern) => {
+    const re = new RegExp(pattern, 'i');
+    for (let i = 0; i < elements.length; i++) {
+        const el = elements[i];
+        if (!re.test(el.innerText || '')) continue;
+        if (el.disabled || !el.getClientRects().length) continue;
+        return [i, el.innerText.trim()];
+    }
+    return null;
+}"""
+
+# Apple网站上可能的"添加另一张卡"选项，按优先级排列
+_ADD_CARD_SELECTORS = (
+    # 最常见的Apple官网样式
+    'button:has-text("Add Another Card")',
+    'a:has-text("Add Another Card")',
+    'button:has-text("Add another card")',
+    'a:has-text("Add another card")',
+    # 可能的变体
+    'button:has-text("Add Gift Card")',
+    'a:has-text("Add Gift Card")',
+    'button:has-text("Add another gift card")',
+    'a:has-text("Add another gift card")',
+    # 通过data属性查找
+    '[data-autom*="add-gift-card"]',
+    '[data-autom*="add-another-card"]',
+    '[data-autom*="additional-gift-card"]',
+    # 可能包含加号的按钮
+    'button:has-text("+")',
+    '[aria-label*="Add"]',
+    '[aria-label*="add"]',
+    # 通用的添加按钮
+    'button:has-text("Add")',
+    'a:has-text("Add")',
+    # 如果是链接形式的
+    'text="Enter another gift card number"',
+    'text="Add another gift card number"',
+    'text="Use another gift card"',
+)
+_EMPTY_GIFT_CARD_INPUT_SELECTORS = (
+    'input[placeholder*="gift card"]',
+    'input[placeholder*="Gift Card"]',
+    'input[id*="giftCard"]',
+    'input[data-autom*="gift-card"]',
+)
+
+# 单张礼品卡应用结果检查使用的选择器（多张检查在此基础上补充data-testid）
+_GIFT_CARD_SUCCESS_MESSAGE_SELECTORS = (
+    '.success', '.alert-success', '.notification-success', '.message-success', '.gift-card-success',
+    'text="Gift card applied"', 'text="Applied successfully"', 'text="礼品卡已应用"',
+)
+_GIFT_CARD_ERROR_MESSAGE_SELECTORS = (
+    '.error', '.alert-error', '.notification-error', '.message-error', '.gift-card-error',
+    'text="Invalid gift card"', 'text="Gift card not found"', 'text="礼品卡无效"',
+)
+_ORDER_TOTAL_PRICE_SELECTORS = ('.total-price', '.order-total', '.grand-total', '[data-testid*="total"]')
+
+# 多张礼品卡应用结果检查使用的选择器
+_GIFT_CARD_SUCCESS_SELECTORS = _GIFT_CARD_SUCCESS_MESSAGE_SELECTORS + ('[data-testid*="success"]',)
+_GIFT_CARD_ERROR_SELECTORS = _GIFT_CARD_ERROR_MESSAGE_SELECTORS + ('[data-testid*="error"]',)
+_ORDER_TOTAL_SELECTORS = _ORDER_TOTAL_PRICE_SELECTORS + ('[data-testid*="price"]',)
+_APPLIED_GIFT_CARD_SELECTORS = (
+    '.applied-gift-card', '.gift-card-applied', '[data-testid*="applied-gift-card"]',
+    '.payment-method[data-type="gift-card"]',
+)
+# _click_gift_card_link按顺序尝试的礼品卡链接选择器（严格按照apple_automator.py的礼品卡触发策略）
+_GIFT_CARD_LINK_SELECTORS = (
+    # 策略1: 通过具体文本匹配（Apple官网常见的礼品卡文本）
+    'text="Do you have an Apple Gift Card?"',
+    'text="Apply an Apple Gift Card"',
+    'text="Enter your gift card number"',  # 关键！这是最重要的链接
+    'text="Add gift card"',
+    'text="Use gift card"',
+    'text="Gift card"',
+    # 策略2: 通过角色和文本查找（更精确的选择器）
+    'button:has-text("Do you have an Apple Gift Card?")',
+    'button:has-text("Enter your gift card number")',
+    'a:has-text("Do you have an Apple Gift Card?")',
+    'a:has-text("Apply an Apple Gift Card")',
+    'a:has-text("Enter your gift card number")',  # 重要的a标签
+    # 策略3: 通过data属性查找
+    '[data-autom*="gift"]',
+    '[data-autom*="giftcard"]',
+    '[data-analytics*="gift"]',
+    # 策略4: 通过类名查找
+    '.gift-card',
+    '.giftcard',
+    '.apple-gift-card',
+)
+# 🚀 调试快照：一次evaluate取回包含gift文本的元素及页面上的链接和按钮，不再逐个元素往返
+_JS_DEBUG_SNAPSHOT = """({giftLimit, controlLimit}) => {
+    const textOf = el => (el.textContent || '').trim();
+    const gifts = Array.from(document.querySelectorAll('*')).filter(el => /gift/i.test(el.textContent || ''));
+    const links = Array.from(document.querySelectorAll('a'));
+    const buttons = Array.from(document.querySelectorAll('button'));
+    return {
+        giftCount: gifts.length,
+        gifts: gifts.slice(0, giftLimit).map(el => ({tag: el.tagName.toLowerCase(), text: textOf(el).slice(0, 100)})),
+        linkCount: links.length,
+        links: links.slice(0, controlLimit).map(el => ({text: textOf(el).slice(0, 50), href: el.getAttribute('href')})),
+        buttonCount: buttons.length,
+        buttons: buttons.slice(0, controlLimit).map(el => textOf(el).slice(0, 50)),
+    };
+}"""
+
+_GIFT_CARD_RESULT_GROUPS = {
+    'success': _GIFT_CARD_SUCCESS_SELECTORS,
+    'error': _GIFT_CARD_ERROR_SELECTORS,
+    'total': _ORDER_TOTAL_SELECTORS,
+    'applied': _APPLIED_GIFT_CARD_SELECTORS,
+}
+# 🚀 一次evaluate按分组返回所有可见匹配元素的非空文本；text="..."按最内层元素的完整文本精确匹配
+_JS_GROUP_VISIBLE_TEXTS = """groups => {
+    const isVisible = el => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+    };
+    const textOf = el => (el.textContent || '').trim();
+    let allElements = null;
+    const byText = text => {
+        allElements = allElements || Array.from(document.querySelectorAll('body *'));
+        return allElements.filter(el => textOf(el) === text && !Array.from(el.children).some(c => textOf(c) === text));
+    };
+    const result = {};
+    for (const [name, selectors] of Object.entries(groups)) {
+        const seen = new Set();
+        const texts = [];
+        for (const selector of selectors) {
+            const m = /^text="(.*)"$/.exec(selector);
+            for (const el of (m ? byText(m[1]) : document.querySelectorAll(selector))) {
+                if (seen.has(el) || !isVisible(el)) continue;
+                seen.add(el);
+                const text = textOf(el);
+                if (text) texts.push(text);
+            }
+        }
+        result[name] = texts;
+    }
+    return result;
+}"""
+
+# 🚀 产品配置选项（Trade In -> Payment -> AppleCare），依次在页面内完成选择
+# 后一区域在前一区域选中后才启用，因此在页面内按顺序等待启用再点击
+_PRODUCT_OPTIONS = [
+    {'key': 'tradein', 'section': '[data-analytics-section="tradein"]',
+     'input': '#noTradeIn', 'text': 'No trade in'},
+    {'key': 'payment', 'section': '[data-analytics-section="paymentOptions"]',
+     'input': '[data-analytics-section="paymentOptions"] input[value="fullprice"]', 'text': 'Buy'},
+    {'key': 'applecare', 'section': '[data-analytics-section="applecare"]',
+     'input': '[data-autom="noapplecare"]', 'text': 'No AppleCare+ Coverage'},
+]
+_PRODUCT_OPTION_TIMEOUT_MS = 15000
+
+# 返回 {tradein: bool, payment: bool, applecare: bool}，遇到第一个失败的区域即停止
+_JS_CONFIGURE_OPTIONS = """async ([options, timeoutMs]) => {
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+    const isChecked = el => el.checked === true || el.getAttribute('aria-checked') === 'true';
+    const find = opt => {
+        const el = document.querySelector(opt.input);
+        if (el) return el;
+        const section = document.querySelector(opt.section);
+        if (!section) return null;
+        return [...section.querySelectorAll('label, [role=radio], button')]
+            .find(e => (e.innerText || '').trim().includes(opt.text)) || null;
+    };
+    const results = {};
+    for (const opt of options) results[opt.key] = false;
+    for (const opt of options) {
+        const deadline = Date.now() + timeoutMs;
+        while (Date.now() < deadline) {
+            const el = find(opt);
+            if (el && !el.disabled && !el.closest('fieldset[disabled]')) {
+                el.scrollIntoView({block: 'center'});
+                el.click();
+                await sleep(100);
+                const input = el.matches('input') ? el : (el.control || el.querySelector('input') || el);
+                results[opt.key] = isChecked(input);
+                break;
+            }
+            await sleep(100);
+        }
+        if (!results[opt.key]) break;
+    }
+    return results;
+}"""
+
 class AutomationService:
     """基于apple_automator.py的自动化服务 - 完全重写版本"""
     
     def __init__(self, ip_service=None):
-        # 移除共享的playwright和browser实例，改为任务级别的实例
-        self.task_playwrights: Dict[str, any] = {}  # 每个任务的playwright实例
-        self.task_browsers: Dict[str, Browser] = {}  # 每个任务的browser实例
+        # 🚀 所有任务共享一个playwright和browser实例，每个任务使用独立的上下文
+        self.playwright = None
+        self.browser: Optional[Browser] = None
+        self._init_lock: Optional[asyncio.Lock] = None
+        self.task_browsers: Dict[str, Browser] = {}  # 每个任务使用的browser实例
         self.contexts: Dict[str, BrowserContext] = {}
         self.pages: Dict[str, Page] = {}
+        self._context_pool: List[BrowserContext] = []
+        self._pool_warmers: set = set()
+        self._debug_dump_tasks: set = set()
+        # 🚀 按(域名, 操作)记住上次成功的选择器，后续礼品卡优先尝试
+        self._selector_cache: Dict[Tuple[str, str], str] = {}
+        # 🚀 Apple登录接口返回的错误状态码（由response事件推送记录），按任务ID存放
+        self._login_error_codes: Dict[str, int] = {}
         self.websocket_handler = None
         # 🚀 优化：使用传入的IP服务或延迟初始化
         self.ip_service = ip_service
@@ -30,12 +616,62 @@ class AutomationService:
         self.message_service = get_message_service()
         # 🚀 初始化SOTA消息服务
         self.sota_message_service = get_sota_message_service()
-        # 线程本地存储，每个线程有自己的事件循环
-        self._thread_local = threading.local()
+        # 🚀 专用事件循环线程：playwright对象绑定创建时的事件循环，所有自动化协程都在此循环中执行
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        # 🚀 按任务缓冲待发送的WebSocket消息，定时合并发送
+        self._msg_lock = threading.Lock()
+        self._msg_buffers: Dict[str, list] = {}
+        self._flush_handles: Dict[str, asyncio.TimerHandle] = {}
+        self._pending_snapshots: Dict[str, Task] = {}
 
     def set_websocket_handler(self, handler):
         """设置WebSocket处理器用于实时反馈"""
         self.websocket_handler = handler
+
+    def _queue_ws_message(self, task: Task, event: str, data: Optional[dict]):
+        """缓冲一条WebSocket消息，WS_BATCH_INTERVAL 内的消息合并为一次 task_batch 发送
+
+        event 为 'task_update' 时只记录任务，发送时取最新快照（窗口内多次更新只序列化一次）
+        没有运行中的事件循环时立即发送
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        task_id = task.id
+        with self._msg_lock:
+            buffer = self._msg_buffers.setdefault(task_id, [])
+            if event == 'task_update':
+                self._pending_snapshots[task_id] = task
+            else:
+                buffer.append({'event': event, 'data': data})
+            flush_now = loop is None or len(buffer) >= WS_BATCH_MAX_MESSAGES
+            if not flush_now and task_id not in self._flush_handles:
+                self._flush_handles[task_id] = loop.call_later(
+                    WS_BATCH_INTERVAL, self._flush_ws_messages, task_id
+                )
+
+        if flush_now:
+            self._flush_ws_messages(task_id)
+
+    def _flush_ws_messages(self, task_id: str):
+        """立即发送任务缓冲的WebSocket消息"""
+        with self._msg_lock:
+            messages = self._msg_buffers.pop(task_id, None) or []
+            snapshot_task = self._pending_snapshots.pop(task_id, None)
+            handle = self._flush_handles.pop(task_id, None)
+
+        if handle is not None:
+            handle.cancel()
+        if snapshot_task is not None:
+            messages.append({'event': 'task_update', 'data': snapshot_task.to_dict()})
+        if messages and self.websocket_handler:
+            try:
+                self.websocket_handler.send_batch(task_id, messages)
+            except Exception as e:
+                logger.error(f"❌ 批量发送WebSocket消息失败: {e}")
     
     def _send_step_update(self, task: Task, step: str, status: str, progress: float = None, message: str = ""):
         """发送步骤更新到前端 - 确保任务状态正确更新 - 高频率同步版本"""
@@ -83,12 +719,15 @@ class AutomationService:
             except Exception as e:
                 logger.warning(f"⚠️ SOTA同步失败: {e}")
             
-            # 2. 立即WebSocket广播
+            # 2. WebSocket广播（🚀 合并到批量帧中发送）
             if self.websocket_handler:
-                self.websocket_handler.broadcast('task_update', task.to_dict())
+                self._queue_ws_message(task, 'task_update', None)
                 if progress is None:
                     progress = task.progress
-                self.websocket_handler.send_step_update(task.id, step, status, progress, message)
+                self._queue_ws_message(
+                    task, 'step_update',
+                    self.websocket_handler.step_update_payload(task.id, step, status, progress, message)
+                )
             
             # 3. 立即Redis同步
             if hasattr(self, 'message_service') and self.message_service:
@@ -141,38 +780,43 @@ class AutomationService:
 
             logger.info(f"✅ 日志已同步: {task.id} - [{level}] {message}")
 
-            # 保持向后兼容
+            # 保持向后兼容（🚀 合并到批量帧中发送）
             if self.websocket_handler:
-                self.websocket_handler.send_task_log(task.id, level, message)
+                self._queue_ws_message(
+                    task, 'task_log', self.websocket_handler.task_log_payload(task.id, level, message)
+                )
 
         except Exception as e:
             logger.error(f"❌ 发送日志失败: {e}")
 
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """获取（必要时启动）自动化专用事件循环"""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="automation-loop", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def run_sync(self, coro):
+        """在自动化专用事件循环中执行协程并阻塞等待结果（供同步线程调用）"""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
+
+    def shutdown_sync(self):
+        """同步关闭共享浏览器，供进程退出时调用"""
+        if self._loop is not None and (self.browser is not None or self.playwright is not None):
+            self.run_sync(self.shutdown())
+
     def execute_task_threadsafe(self, task: Task) -> bool:
         """线程安全的任务执行包装方法"""
         try:
-            # 为当前线程创建新的事件循环
-            if not hasattr(self._thread_local, 'loop'):
-                self._thread_local.loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(self._thread_local.loop)
-
-            loop = self._thread_local.loop
-
-            # 在线程专用的事件循环中执行任务
-            return loop.run_until_complete(self.execute_task(task))
+            # 在共享的自动化事件循环中执行任务
+            return self.run_sync(self.execute_task(task))
 
         except Exception as e:
             logger.error(f"❌ 线程安全任务执行失败: {e}")
             task.add_log(f"❌ 任务执行失败: {str(e)}", "error")
             return False
-        finally:
-            # 清理资源
-            try:
-                if hasattr(self._thread_local, 'loop'):
-                    # 不关闭循环，保持复用
-                    pass
-            except Exception as e:
-                logger.error(f"❌ 清理事件循环失败: {e}")
 
     async def execute_task(self, task: Task) -> bool:
         """🚀 执行四阶段任务流程 - 主入口方法"""
@@ -219,7 +863,8 @@ class AutomationService:
             return False
         finally:
             # 注意：不要在这里清理资源，因为用户可能还需要在浏览器中操作
-            pass
+            # 事件循环结束后定时器不会再触发，发送剩余的缓冲消息
+            self._flush_ws_messages(task.id)
 
     # 🚀 四阶段执行方法
     async def _execute_stage_1_product_config(self, task: Task) -> bool:
@@ -300,7 +945,7 @@ class AutomationService:
             task.add_log(f"阶段2检查 - 页面标题: {page_title}", "info")
 
             # 检测页面状态
-            page_state = await self._detect_page_state(page)
+            page_state = await self._detect_page_state(page, current_url)
             task.add_log(f"阶段2检查 - 页面状态: {page_state}", "info")
 
             if page_state == "checkout_page" or "checkout" in current_url.lower() or "billing" in current_url.lower():
@@ -499,48 +1144,52 @@ class AutomationService:
             return False
 
     async def initialize(self, task: Task) -> bool:
-        """初始化Playwright"""
+        """初始化Playwright - 首次调用时启动共享浏览器，之后直接复用"""
         try:
             self._send_step_update(task, "initializing", "started", message="正在启动浏览器...")
             self._send_log(task, "info", "🚀 正在初始化浏览器...")
 
-            # 为每个任务创建独立的playwright实例
-            task_playwright = await async_playwright().start()
-            self.task_playwrights[task.id] = task_playwright
-            self._send_step_update(task, "initializing", "progress", 30, "Playwright已启动")
+            if self._init_lock is None:
+                self._init_lock = asyncio.Lock()
 
-            # 为每个任务创建独立的browser实例
-            task_browser = await task_playwright.chromium.launch(
-                headless=False,
-                args=['--no-sandbox', '--disable-setuid-sandbox']
-            )
-            self.task_browsers[task.id] = task_browser
-            self._send_step_update(task, "initializing", "progress", 80, "浏览器已启动")
+            async with self._init_lock:
+                if self.browser is not None and self.browser.is_connected():
+                    self._send_log(task, "info", "♻️ 复用已启动的浏览器")
+                else:
+                    if self.playwright is None:
+                        self.playwright = await async_playwright().start()
+                        # 🚀 自定义选择器引擎需在创建上下文前注册，每个Playwright实例只注册一次
+                        await self.playwright.selectors.register('apple', script=_APPLE_SELECTOR_ENGINE)
+                    self._send_step_update(task, "initializing", "progress", 30, "Playwright已启动")
+
+                    self.browser = await self.playwright.chromium.launch(
+                        headless=False,
+                        args=['--no-sandbox', '--disable-setuid-sandbox']
+                    )
+                    self._send_step_update(task, "initializing", "progress", 80, "浏览器已启动")
+                    logger.info("Playwright初始化成功")
+                    self._context_pool.clear()  # 旧browser的预热上下文已随其关闭
+                    self._schedule_context_pool_refill()
 
+            self.task_browsers[task.id] = self.browser
             self._send_log(task, "success", "✅ Playwright初始化成功")
             self._send_step_update(task, "initializing", "completed", 100, "初始化完成")
-            logger.info("Playwright初始化成功")
             return True
         except Exception as e:
             self._send_log(task, "error", f"❌ Playwright初始化失败: {str(e)}")
             self._send_step_update(task, "initializing", "failed", message=f"初始化失败: {str(e)}")
             logger.error(f"Playwright初始化失败: {str(e)}")
             return False
-    
+
     async def navigate_to_product(self, task: Task) -> bool:
         """导航到产品URL"""
         try:
-            # 获取任务特定的browser实例
-            task_browser = self.task_browsers.get(task.id)
-            if not task_browser:
-                raise Exception(f"任务 {task.id[:8]} 的browser实例不存在")
-
-            # 创建新的浏览器上下文和页面
-            context = await task_browser.new_context(locale="en-GB")
-            page = await context.new_page()
-            
-            self.contexts[task.id] = context
-            self.pages[task.id] = page
+            # 获取浏览器上下文和页面（重试时复用任务已有的上下文和页面）
+            context = await self._acquire_context(task)
+            page = self.pages.get(task.id)
+            if page is None or page.is_closed():
+                page = await context.new_page()
+                self.pages[task.id] = page
             
             task.add_log(f"🌐 正在导航到: {task.config.url}", "info")
             await page.goto(task.config.url, wait_until='domcontentloaded', timeout=60000)
@@ -564,9 +1213,7 @@ class AutomationService:
 
             if is_test_product:
                 task.add_log("🧪 检测到简单产品，只执行Add to Bag操作", "info")
-                # 等待页面加载完成
-                await page.wait_for_load_state('domcontentloaded', timeout=30000)
-                await page.wait_for_timeout(3000)
+                # navigate_to_product 的 goto 已等待 domcontentloaded，按钮出现由_click_add_to_bag_button等待
 
                 # 只执行Add to Bag操作，不包括checkout和登录
                 task.add_log("🛒 添加商品到购物袋...", "info")
@@ -580,36 +1227,31 @@ class AutomationService:
 
             task.add_log("🔧 开始配置产品选项（跳过尺寸/颜色/内存）...", "info")
 
-            # 等待页面加载完成
-            await page.wait_for_load_state('domcontentloaded', timeout=30000)
-            await page.wait_for_timeout(3000)
-
-            # 1. 配置Apple Trade In - 必须选择 "No trade in"
-            task.add_log("🔄 正在选择Apple Trade In: No trade in", "info")
-            success = await self._apple_select_trade_in(page, "No trade in", task)
-            if not success:
-                task.add_log("❌ Apple Trade In选择失败", "error")
-                return False
-            task.add_log("✅ Apple Trade In选择完成", "success")
-            await page.wait_for_timeout(1000)
-
-            # 2. 配置Payment - 必须选择 "Buy"
-            task.add_log("💳 正在选择Payment: Buy", "info")
-            success = await self._apple_select_payment(page, "Buy", task)
-            if not success:
-                task.add_log("❌ Payment选择失败", "error")
-                return False
-            task.add_log("✅ Payment选择完成", "success")
-            await page.wait_for_timeout(1000)
+            # navigate_to_product 的 goto 已等待 domcontentloaded，各选项区域的启用状态由各选择方法等待
 
-            # 3. 配置AppleCare+ Coverage - 必须选择 "No AppleCare+ Coverage"
-            task.add_log("🛡️ 正在选择AppleCare+ Coverage: No AppleCare+ Coverage", "info")
-            success = await self._apple_select_applecare(page, "No AppleCare+ Coverage", task)
-            if not success:
-                task.add_log("❌ AppleCare+ Coverage选择失败", "error")
-                return False
-            task.add_log("✅ AppleCare+ Coverage选择完成", "success")
-            await page.wait_for_timeout(1000)
+            # 🚀 一次页面内调用完成三个选项：Trade In "No trade in"、Payment "Buy"、AppleCare "No AppleCare+ Coverage"
+            task.add_log("🔧 正在选择Trade In / Payment / AppleCare+ 选项...", "info")
+            try:
+                results = await page.evaluate(
+                    _JS_CONFIGURE_OPTIONS, [_PRODUCT_OPTIONS, _PRODUCT_OPTION_TIMEOUT_MS]
+                )
+            except Exception as e:
+                task.add_log(f"⚠️ 页面内配置选项失败，改用逐项选择: {e}", "warning")
+                results = {}
+
+            # 未确认选中的选项逐项回退到原有的选择策略
+            fallbacks = (
+                ('tradein', "Apple Trade In", "No trade in", self._apple_select_trade_in),
+                ('payment', "Payment", "Buy", self._apple_select_payment),
+                ('applecare', "AppleCare+ Coverage", "No AppleCare+ Coverage", self._apple_select_applecare),
+            )
+            for key, name, label, select in fallbacks:
+                if not results.get(key):
+                    task.add_log(f"🔄 正在选择{name}: {label}", "info")
+                    if not await select(page, label, task):
+                        task.add_log(f"❌ {name}选择失败", "error")
+                        return False
+                task.add_log(f"✅ {name}选择完成", "success")
 
             task.add_log("🎉 产品配置完成", "success")
             return True
@@ -674,9 +1316,7 @@ class AutomationService:
 
             task.add_log("🛒 正在将商品添加到购物袋...", "info")
 
-            # 等待页面稳定（基于apple_automator.py）
-            await page.wait_for_load_state('domcontentloaded', timeout=15000)
-            await page.wait_for_timeout(2000)
+            # 产品配置只点击选项，不发生导航，无需再次等待 domcontentloaded
 
             # 重试机制
             max_retries = 3
@@ -711,96 +1351,55 @@ class AutomationService:
         """查找并点击Add to Bag按钮 - 基于apple_automator.py"""
         # 滚动到页面底部寻找按钮
         await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-        await page.wait_for_timeout(2000)
 
-        # 尝试多种Add to Bag按钮选择器（来自apple_automator.py）
-        # 注意：避免点击"Check Out with Apple Pay"按钮
-        selectors = [
-            # 最常见的选择器 - 确保不是Apple Pay按钮
-            'button[data-autom*="add-to-cart"]:not([data-autom*="apple-pay"])',
-            'button[data-autom*="addToCart"]:not([data-autom*="apple-pay"])',
-            '[data-autom="add-to-cart"]:not([data-autom*="apple-pay"])',
-
-            # 文本匹配 - 精确匹配Add to Bag，避免Apple Pay
-            'button:has-text("Add to Bag"):not(:has-text("Apple Pay"))',
-            'button:has-text("Add to Cart"):not(:has-text("Apple Pay"))',
-            'button:has-text("添加到购物袋"):not(:has-text("Apple Pay"))',
-
-            # 通用按钮选择器 - 排除Apple Pay
-            '.as-buttongroup-item button:not(:has-text("Apple Pay"))',
-            'button[aria-label*="Add"]:not([aria-label*="Apple Pay"])',
-            'button[aria-label*="add"]:not([aria-label*="Apple Pay"])',
-
-            # 更广泛的搜索 - 排除Apple Pay
-            'button:has-text("Add"):not(:has-text("Apple Pay")):not(:has-text("Check Out"))',
-            '[role="button"]:has-text("Add to Bag"):not(:has-text("Apple Pay"))',
-
-            # 特定的Add to Bag按钮（通常在Apple Pay按钮下方）
-            '.rs-bag-button',
-            '.add-to-bag-button',
-            'button[class*="add-to-bag"]',
-        ]
-
-        for selector in selectors:
+        # 🚀 apple选择器引擎在页面内按优先级一次查找（避免Apple Pay按钮）
+        if await self._click_apple_target(page, 'addToBag', "Add to Bag", task, timeout=20000):
+            # 验证点击是否成功（等待购物袋确认元素出现）
             try:
-                task.add_log(f"尝试Add to Bag选择器: {selector}", "info")
-
-                element = page.locator(selector).first
-
-                # 等待元素可见 - 🚀 增加超时时间
-                await element.wait_for(state='visible', timeout=20000)
-
-                # 验证这不是Apple Pay按钮
-                element_text = await element.text_content()
-                if element_text and ("apple pay" in element_text.lower() or "check out" in element_text.lower()):
-                    task.add_log(f"跳过Apple Pay/Check Out按钮: {element_text}", "warning")
-                    continue
-
-                # 滚动到元素位置
-                await element.scroll_into_view_if_needed()
-                await page.wait_for_timeout(1000)
-
-                # 确保元素可点击
-                await element.wait_for(state='attached', timeout=5000)
-
-                # 点击按钮
-                await element.click()
-
-                # 验证点击是否成功（等待页面变化或弹窗出现）
+                await page.wait_for_selector(_BAG_CONFIRMATION_SELECTOR, timeout=5000)
+            except Exception:
                 await page.wait_for_timeout(2000)
-
-                task.add_log(f"✅ 成功使用选择器点击Add to Bag: {selector}", "success")
-                return
-
-            except Exception as e:
-                task.add_log(f"选择器 {selector} 失败: {e}", "warning")
-                continue
+            task.add_log("✅ 成功使用选择器点击Add to Bag", "success")
+            return
 
         # 如果所有选择器都失败，尝试最后的备用策略
         task.add_log("尝试备用策略...", "info")
         await self._try_fallback_add_to_bag(page, task)
 
+    async def _click_apple_target(self, page: Page, target: str, label: str, task: Task,
+                                  timeout: int = 5000, no_wait_after: bool = False) -> bool:
+        """通过apple选择器引擎点击目标按钮，未找到或点击失败返回False；调用方自行等待后续页面时可传no_wait_after"""
+        task.add_log(f"尝试{label}选择策略...", "info")
+        locator = page.locator(f'apple={target}').first
+        try:
+            await locator.wait_for(state='visible', timeout=timeout)
+            await locator.click(no_wait_after=no_wait_after)
+            return True
+        except Exception:
+            return False
+
+    async def _set_value(self, locator, value: str, is_input: bool = True):
+        """填写输入框：input/textarea用fill（会先清空），contenteditable元素在页面内一次设置文本"""
+        if is_input:
+            await locator.fill(value)
+        else:
+            await locator.evaluate(_JS_SET_EDITABLE_TEXT, value)
+
     async def _try_fallback_add_to_bag(self, page: Page, task: Task):
         """备用的Add to Bag策略 - 基于apple_automator.py"""
-        # 策略1: 查找所有按钮，筛选包含"Add"的
+        # 策略1: 查找所有按钮，筛选包含"Add"的 - 🚀 在页面内一次完成筛选
         all_buttons = page.locator('button')
-        button_count = await all_buttons.count()
-
-        for i in range(button_count):
+        match = await all_buttons.evaluate_all(_JS_FIRST_KEYWORD_MATCH, _ADD_RE.pattern)
+        if match:
+            index, text = match
+            task.add_log(f"找到可能的Add按钮: {text}", "info")
             try:
-                button = all_buttons.nth(i)
-                text = await button.inner_text()
-
-                if any(keyword in text.lower() for keyword in ['add to bag', 'add to cart', 'add']):
-                    task.add_log(f"找到可能的Add按钮: {text}", "info")
-                    await button.scroll_into_view_if_needed()
-                    await button.click()
-                    task.add_log(f"✅ 使用备用策略成功点击: {text}", "success")
-                    return
-
+                button = all_buttons.nth(index)
+                await button.click()
+                task.add_log(f"✅ 使用备用策略成功点击: {text}", "success")
+                return
             except Exception as e:
-                task.add_log(f"备用策略按钮 {i} 失败: {e}", "warning")
-                continue
+                task.add_log(f"备用策略按钮 {index} 失败: {e}", "warning")
 
         raise Exception("所有Add to Bag策略都失败了")
     
@@ -813,27 +1412,29 @@ class AutomationService:
 
             task.add_log("💳 正在进入购物袋页面...", "info")
 
-            # 等待页面稳定
-            await page.wait_for_timeout(3000)
-
-            # 直接使用有效的智能策略
-            task.add_log("🔍 使用智能Review Bag策略...", "info")
-            await self._try_fallback_review_bag(page, task)
+            # 🚀 先尝试Review Bag选择器，失败再使用智能扫描策略
+            if await self._click_apple_target(page, 'reviewBag', "Review Bag", task):
+                task.add_log("✅ 成功点击Review Bag按钮", "success")
+            else:
+                task.add_log("🔍 使用智能Review Bag策略...", "info")
+                await self._try_fallback_review_bag(page, task)
 
             # 等待进入购物袋页面 - 🚀 增加超时时间应对网络延迟
             try:
-                await page.wait_for_function(
-                    "document.title.includes('Bag') || document.title.includes('Cart') || window.location.href.includes('bag') || window.location.href.includes('cart')",
-                    timeout=30000  # 增加到30秒
-                )
+                # 🚀 基于导航事件等待URL匹配，不在页面内轮询（已在购物袋页面时立即返回）
+                await page.wait_for_url(_BAG_URL_RE, wait_until='commit', timeout=30000)
                 task.add_log(f"✅ 已成功进入购物袋页面，标题: {await page.title()}", "success")
 
                 # 智能处理Checkout按钮
                 await self._handle_checkout_button(page, task)
 
-                # 关键：等待页面导航完成后再处理登录
-                await page.wait_for_load_state('domcontentloaded', timeout=20000)
-                await page.wait_for_timeout(3000)
+                # 关键：等待离开购物袋页面并完成导航后再处理登录
+                try:
+                    await page.wait_for_url(
+                        lambda url: '/shop/bag' not in url, wait_until='domcontentloaded', timeout=20000
+                    )
+                except Exception:
+                    await page.wait_for_timeout(3000)
                 task.add_log("✅ 页面导航完成，开始处理登录...", "info")
 
                 # 等待并处理登录
@@ -851,31 +1452,19 @@ class AutomationService:
 
     async def _try_fallback_review_bag(self, page: Page, task: Task):
         """备用的Review Bag策略 - 基于apple_automator.py"""
-        # 查找所有按钮和链接，筛选包含相关关键词的
-        all_elements = await page.locator('button, a, [role="button"]').all()
-
-        for element in all_elements:
+        # 查找所有按钮和链接，筛选包含相关关键词的 - 🚀 在页面内一次完成筛选
+        all_elements = page.locator('button, a, [role="button"]')
+        match = await all_elements.evaluate_all(_JS_FIRST_KEYWORD_MATCH, _REVIEW_RE.pattern)
+        if match:
+            index, text = match
+            task.add_log(f"找到可能的Review Bag按钮: {text}", "info")
             try:
-                text = await element.inner_text()
-                text_lower = text.lower().strip()
-
-                # 检查是否包含相关关键词
-                if any(keyword in text_lower for keyword in [
-                    'review bag', 'view bag', 'go to bag', 'checkout',
-                    'bag', 'cart', 'continue', 'proceed'
-                ]):
-                    task.add_log(f"找到可能的Review Bag按钮: {text}", "info")
-
-                    # 检查元素是否可见和可点击
-                    if await element.is_visible() and await element.is_enabled():
-                        await element.scroll_into_view_if_needed()
-                        await element.click()
-                        task.add_log(f"✅ 使用备用策略成功点击: {text}", "success")
-                        return
-
+                element = all_elements.nth(index)
+                await element.click()
+                task.add_log(f"✅ 使用备用策略成功点击: {text}", "success")
+                return
             except Exception as e:
-                task.add_log(f"备用策略元素检查失败: {e}", "warning")
-                continue
+                task.add_log(f"备用策略元素点击失败: {e}", "warning")
 
         # 如果还是找不到，尝试直接导航到购物袋页面
         task.add_log("⚠️ 无法找到Review Bag按钮，尝试直接导航到购物袋页面...", "warning")
@@ -891,8 +1480,7 @@ class AutomationService:
                 bag_url = 'https://www.apple.com/shop/bag'
 
             task.add_log(f"直接导航到购物袋页面: {bag_url}", "info")
-            await page.goto(bag_url)
-            await page.wait_for_load_state('domcontentloaded', timeout=15000)
+            await page.goto(bag_url, wait_until='domcontentloaded', timeout=15000)
             return
 
         raise Exception("所有Review Bag策略都失败了")
@@ -901,69 +1489,16 @@ class AutomationService:
         """智能处理Checkout按钮 - 基于apple_automator.py"""
         task.add_log("🔍 智能检测和处理Checkout按钮...", "info")
 
-        # 等待页面稳定
-        await page.wait_for_timeout(3000)
-
-        # 首先检查购物车是否有商品
-        await self._verify_cart_has_items(page, task)
-
-        # 尝试多种Checkout按钮选择策略
-        checkout_strategies = [
-            # 策略1: 原始选择器
-            lambda: page.locator('[data-autom="checkout"]').first,
-            # 策略2: 通过文本匹配
-            lambda: page.get_by_role('button', name='Check Out'),
-            # 策略3: 通过包含文本的按钮
-            lambda: page.locator('button:has-text("Check Out")'),
-            # 策略4: 通过类名
-            lambda: page.locator('.checkout-button, .checkout-btn'),
-            # 策略5: 通过ID
-            lambda: page.locator('#checkout, #checkoutButton'),
-            # 策略6: 更宽泛的选择器
-            lambda: page.locator('button[class*="checkout"]'),
-        ]
-
-        checkout_success = False
-        for i, strategy in enumerate(checkout_strategies, 1):
+        # 🚀 购物车验证只用于诊断日志，默认跳过；开启时先等待商品渲染再检查
+        if task.config.verify_cart:
             try:
-                task.add_log(f"尝试Checkout按钮策略 {i}", "info")
-                checkout_button = strategy()
-
-                # 检查按钮是否存在
-                button_count = await checkout_button.count()
-                if button_count == 0:
-                    task.add_log(f"策略 {i}: 按钮不存在", "warning")
-                    continue
-
-                # 检查按钮是否可见
-                is_visible = await checkout_button.is_visible()
-                if not is_visible:
-                    task.add_log(f"策略 {i}: 按钮存在但不可见，尝试滚动到视图", "info")
-                    await checkout_button.scroll_into_view_if_needed()
-                    await page.wait_for_timeout(1000)
-                    is_visible = await checkout_button.is_visible()
-
-                if not is_visible:
-                    task.add_log(f"策略 {i}: 按钮仍然不可见", "warning")
-                    continue
-
-                # 检查按钮是否可点击
-                is_enabled = await checkout_button.is_enabled()
-                if not is_enabled:
-                    task.add_log(f"策略 {i}: 按钮不可点击", "warning")
-                    continue
-
-                # 尝试点击
-                await checkout_button.click()
-                task.add_log(f"✅ 成功点击Checkout按钮 (策略{i})", "success")
-                checkout_success = True
-                break
-
-            except Exception as e:
-                task.add_log(f"Checkout按钮策略 {i} 失败: {e}", "warning")
-                continue
+                await page.wait_for_selector(_CART_ITEM_UNION, state='attached', timeout=5000)
+            except Exception:
+                pass
+            await self._verify_cart_has_items(page, task)
 
-        if not checkout_success:
+        # 尝试多种Checkout按钮选择策略
+        if not await self._click_apple_target(page, 'checkout', "Checkout按钮", task):
             task.add_log("❌ 所有Checkout按钮策略都失败了，可能购物车为空或页面结构已变化", "error")
             raise Exception("无法找到或点击Checkout按钮")
 
@@ -973,43 +1508,19 @@ class AutomationService:
         """验证购物车是否有商品 - 基于apple_automator.py"""
         task.add_log("🔍 验证购物车商品...", "info")
 
-        # 检查购物车商品数量
-        item_selectors = [
-            '.bag-item',
-            '.cart-item',
-            '[data-autom*="item"]',
-            '.product-item',
-            '.checkout-item'
-        ]
-
-        total_items = 0
-        for selector in item_selectors:
-            try:
-                items = await page.locator(selector).count()
-                if items > 0:
-                    total_items = items
-                    task.add_log(f"✅ 购物车中有 {items} 个商品", "success")
-                    break
-            except:
-                continue
+        # 🚀 商品数量与空购物车提示合并为一次evaluate
+        try:
+            state = await page.evaluate(_JS_CART_STATE, _CART_ITEM_UNION)
+        except PlaywrightError:
+            state = {'items': 0, 'empty': False}
 
-        if total_items == 0:
-            task.add_log("⚠️ 购物车可能为空，这可能是Checkout按钮隐藏的原因", "warning")
-            # 尝试查找"购物车为空"的提示
-            empty_indicators = [
-                ':has-text("empty")',
-                ':has-text("Empty")',
-                ':has-text("no items")',
-                ':has-text("No items")'
-            ]
+        if state['items'] > 0:
+            task.add_log(f"✅ 购物车中有 {state['items']} 个商品元素", "success")
+            return
 
-            for indicator in empty_indicators:
-                try:
-                    empty_element = page.locator(indicator).first
-                    if await empty_element.is_visible():
-                        raise Exception("购物车为空，无法进行结账")
-                except:
-                    continue
+        task.add_log("⚠️ 购物车可能为空，这可能是Checkout按钮隐藏的原因", "warning")
+        if state['empty']:
+            task.add_log("⚠️ 页面显示购物车为空提示", "warning")
 
     async def _handle_apple_login(self, page: Page, task: Task):
         """处理Apple ID登录 - 基于apple_automator.py的完整实现"""
@@ -1021,13 +1532,14 @@ class AutomationService:
             task.add_log("⚠️ 未配置账号信息，请检查任务配置", "error")
             return
 
-        task.add_log(f"🔍 调试信息 - account_config: {account_config}", "info")
-
         email = account_config.email
         password = account_config.password
         phone_number = account_config.phone_number
 
-        task.add_log(f"🔍 调试信息 - email: '{email}', password: '{password}', phone_number: '{phone_number}'", "info")
+        # 🚀 调试信息不记录凭据，只在DEBUG级别启用时由logging延迟格式化
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("账号配置: email_len=%d, has_password=%s, phone_number=%s",
+                         len(email or ''), bool(password), phone_number)
 
         if not email or not password:
             task.add_log("⚠️ 账号信息不完整（缺少邮箱或密码），请检查账号配置", "error")
@@ -1059,11 +1571,22 @@ class AutomationService:
         # 增强的重试机制：最多尝试5次，针对高并发场景优化
         max_retries = 5
         for attempt in range(max_retries):
+            # 任务已被取消时不再重试，尽快释放浏览器资源
+            if task.status == TaskStatus.CANCELLED:
+                task.add_log("任务已取消，停止登录重试", "warning")
+                return
+
             try:
                 task.add_log(f"登录尝试 {attempt + 1}/{max_retries}", "info")
+                self._login_error_codes.pop(task.id, None)
 
                 login_attempt_result = await self._attempt_smart_login(page, task, email, password, phone_number)
 
+                # 🚀 登录接口已返回错误时直接进入重试，不再等待页面
+                error_status = self._login_error_codes.pop(task.id, None)
+                if error_status is not None:
+                    raise Exception(f"Apple登录接口返回错误状态: {error_status}")
+
                 # 登录尝试完成后，等待页面稳定并检测状态
                 await page.wait_for_timeout(5000)  # 增加等待时间，确保页面完全加载
                 current_url = page.url
@@ -1072,25 +1595,19 @@ class AutomationService:
                 task.add_log(f"登录尝试后当前URL: {current_url}", "info")
                 task.add_log(f"登录尝试后页面标题: {page_title}", "info")
 
-                # 更宽松的登录成功检测 - 优先检查URL
-                login_success_indicators = [
-                    'checkout', 'fulfillment', 'billing', 'payment', 'shipping',
-                    'secure8.store.apple.com', 'store.apple.com/uk/shop/checkout'
-                ]
-
-                # 检查URL是否包含登录成功的指示器
-                url_indicates_success = any(indicator in current_url.lower() for indicator in login_success_indicators)
-
-                # 检查页面标题是否包含结账相关信息
-                title_indicates_success = any(indicator in page_title.lower() for indicator in ['checkout', 'bag', 'cart', 'billing', 'payment'])
+                # 更宽松的登录成功检测 - 优先检查URL，其次检查页面标题是否包含结账相关信息
+                url_indicates_success = _LOGIN_SUCCESS_URL_RE.search(current_url) is not None
+                title_indicates_success = _CHECKOUT_TITLE_RE.search(page_title) is not None
 
                 # 如果URL或标题表明已经在结账流程中，认为登录成功
                 if url_indicates_success or title_indicates_success:
                     task.add_log("✅ 登录成功，已进入结账流程", "success")
+                    await self._save_auth_state(page, task)
                     return
                 elif login_attempt_result:
                     # 如果登录方法返回成功，但URL不明确，也认为成功
                     task.add_log("✅ 登录方法执行成功", "success")
+                    await self._save_auth_state(page, task)
                     return
                 else:
                     # 只有在明确失败的情况下才抛出异常
@@ -1099,6 +1616,8 @@ class AutomationService:
             except Exception as e:
                 error_msg = str(e)
                 task.add_log(f"第{attempt + 1}次登录失败: {error_msg}", "warning")
+                # 保存的会话可能已失效，不再恢复给后续任务
+                _discard_auth_state(email)
 
                 # 检查是否是安全相关错误
                 is_security_error = await self._is_security_related_error(page, error_msg)
@@ -1114,7 +1633,11 @@ class AutomationService:
                         wait_time = 2000 + (attempt * 1000)  # 2秒到5秒递增
                         task.add_log(f"等待 {wait_time/1000} 秒后重试...", "info")
 
-                    await page.wait_for_timeout(wait_time)
+                    # 🚀 退避时间作为上限，错误提示消失即提前结束等待
+                    try:
+                        await page.wait_for_function(_JS_NO_ERROR_VISIBLE, timeout=wait_time)
+                    except PlaywrightTimeoutError:
+                        pass
 
                     # 重新检测页面状态
                     page_state = await self._detect_page_state(page)
@@ -1130,61 +1653,53 @@ class AutomationService:
         """SOTA方法：等待页面完全稳定 - 基于apple_automator.py"""
         task.add_log("⏳ 等待页面稳定...", "info")
 
-        # 等待网络空闲 - 🚀 增加超时时间应对网络延迟
+        # 🚀 网络空闲与JavaScript执行完成同时等待，任一成功即视为稳定，取消另一个
+        waits = {
+            asyncio.create_task(page.wait_for_load_state('networkidle', timeout=20000)),
+            asyncio.create_task(page.wait_for_function("document.readyState === 'complete'", timeout=20000)),
+        }
         try:
-            await page.wait_for_load_state('networkidle', timeout=20000)
-        except:
-            await page.wait_for_load_state('domcontentloaded', timeout=20000)
-
-        # 等待JavaScript执行完成
-        await page.wait_for_function(
-            "document.readyState === 'complete'",
-            timeout=20000
-        )
+            while waits:
+                done, waits = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+                if any(t.exception() is None for t in done):
+                    break
+            else:
+                # 两者都超时，退回到等待DOM加载
+                await page.wait_for_load_state('domcontentloaded', timeout=20000)
+        finally:
+            for t in waits:
+                t.cancel()
 
-        # 额外等待确保动态内容加载
-        await page.wait_for_timeout(2000)
         task.add_log("✅ 页面已稳定", "success")
 
 
 
     async def _is_security_related_error(self, page: Page, error_msg: str) -> bool:
         """判断是否是安全相关错误"""
-        security_keywords = [
-            "无法识别",
-            "can't verify",
-            "verification failed",
-            "验证失败",
-            "too many attempts",
-            "暂时锁定",
-            "temporarily locked",
-            "请稍后再试",
-            "try again later",
-            "security",
-            "安全"
-        ]
-
-        error_msg_lower = error_msg.lower()
-        for keyword in security_keywords:
-            if keyword.lower() in error_msg_lower:
-                return True
-
-        return False
+        return _SECURITY_RE.search(error_msg) is not None
 
     async def _attempt_smart_login(self, page: Page, task: Task, email: str, password: str, phone_number: str):
         """智能登录尝试，支持多种登录方式 - 基于apple_automator.py"""
 
-        # 方法1: 检查iframe登录
-        iframe_result = await self._try_iframe_login(page, task, email, password)
-        if iframe_result:
-            task.add_log("✅ iframe登录方法执行完成", "success")
-            return True
-
-        # 方法2: 检查直接登录表单
-        direct_result = await self._try_direct_login(page, task, email, password)
-        if direct_result:
-            task.add_log("✅ 直接登录方法执行完成", "success")
-            return True
+        # 🚀 方法1/2: iframe登录与直接登录表单并行探测，先成功者胜出，另一路取消
+        form_lock = asyncio.Lock()
+        probes = {
+            asyncio.create_task(self._try_iframe_login(page, task, email, password, form_lock)): "iframe",
+            asyncio.create_task(self._try_direct_login(page, task, email, password, form_lock)): "直接",
+        }
+        pending = set(probes)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for probe in done:
+                    if probe.result():
+                        task.add_log(f"✅ {probes[probe]}登录方法执行完成", "success")
+                        return True
+        finally:
+            for probe in pending:
+                probe.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
 
         # 方法3: 检查是否需要点击登录链接
         signin_link_result = await self._try_signin_link(page, task)
@@ -1212,82 +1727,43 @@ class AutomationService:
         # 处理可能的地址确认卡片并继续到付款
         await self._handle_address_confirmation_and_continue(page, task)
 
-    async def _detect_page_state(self, page: Page) -> str:
-        """检测页面状态 - 修复版，避免误判产品配置页面"""
-        current_url = page.url
-        page_title = await page.title()
-
-        # 🔍 首先检查是否在产品配置页面 - 但只在特定上下文中返回
-        product_config_indicators = [
-            'step=attach',
-            'step=config',
-            'step=select',
-            'buy-iphone',
-            'buy-ipad',
-            'buy-mac',
-            'purchaseOption=fullPrice'
-        ]
+    async def _detect_page_state(self, page: Page, current_url: Optional[str] = None) -> str:
+        """检测页面状态 - 修复版，避免误判产品配置页面
 
-        # 检查是否在产品配置页面，但不在登录检测中返回这个状态
-        # 因为产品配置页面应该通过checkout流程处理，而不是登录流程
-        is_product_config = any(indicator in current_url.lower() for indicator in product_config_indicators)
-        if is_product_config and 'apple.com' in current_url and ('shop' in current_url or 'buy' in current_url):
-            # 在产品配置页面时，检查是否有登录相关的元素
-            # 如果没有，则返回unknown，让调用方决定如何处理
-            pass  # 继续检查其他状态
-
-        # 增强的结账页面检测 - 特别针对 secure8.store.apple.com 域名
-        checkout_indicators = [
-            'checkout',
-            'billing',
-            'payment',
-            'fulfillment',  # 新增：针对 Fulfillment-init 等
-            'shipping'
-        ]
+        current_url 由已读取过URL的调用方传入；产品配置页面与其他未识别页面一样返回unknown，由调用方处理
+        """
+        if current_url is None:
+            current_url = page.url
 
-        # 检查是否已登录并在结账流程中
-        if any(indicator in current_url.lower() for indicator in checkout_indicators):
-            # 排除仍在登录页面的情况
-            if 'signin' not in current_url.lower() and 'login' not in current_url.lower():
-                # 特别检查 secure8.store.apple.com 域名
-                if 'secure8.store.apple.com' in current_url or 'store.apple.com' in current_url:
-                    return "checkout_page"
-                # 其他Apple域名的结账页面
-                elif 'apple.com' in current_url:
-                    return "checkout_page"
+        # 检查是否已登录并在结账流程中（排除仍在登录页面的情况），特别针对 secure8.store.apple.com 域名
+        if (_CHECKOUT_PAGE_URL_RE.search(current_url) and not _SIGNIN_URL_RE.search(current_url)
+                and 'apple.com' in current_url):
+            return "checkout_page"
 
         # 检查是否在登录页面 - 更严格的检测
-        login_indicators = ['signin', 'login', 'auth', 'appleid']
-        if any(indicator in current_url.lower() for indicator in login_indicators):
+        if _LOGIN_URL_RE.search(current_url):
             return "login_page"
 
-        # 检查页面内容 - 更精确的检测
+        # 检查页面内容 - 🚀 登录iframe与结账元素在一次页面调用中计数
         try:
+            counts = await page.evaluate(_JS_PAGE_STATE_COUNTS)
             # 只有在明确的登录页面才检测登录表单
-            if 'appleid' in current_url.lower() or 'idmsa' in current_url.lower():
-                login_forms = await page.locator('iframe[src*="idmsa.apple.com"], iframe[src*="appleid.apple.com"]').count()
-                if login_forms > 0:
-                    return "login_page"
-
-            # 检查是否有结账相关元素
-            checkout_elements = await page.locator('[data-testid*="checkout"], [data-testid*="billing"], .checkout, .billing, [data-testid*="fulfillment"]').count()
-            if checkout_elements > 0:
+            if counts['login'] > 0 and _IDMSA_URL_RE.search(current_url):
+                return "login_page"
+            if counts['checkout'] > 0:
                 return "checkout_page"
-
-        except Exception as e:
+        except PlaywrightError as e:
             logger.debug(f"页面状态检测异常: {e}")
 
-        # 如果是产品配置页面，返回unknown让调用方处理
-        if is_product_config:
-            return "unknown"
-
         return "unknown"
 
-
-
     async def _check_account_locked(self, page: Page, task: Task) -> bool:
         """检查账号是否被锁定（仅用于记录状态，不阻止登录流程）"""
         try:
+            # 🚀 没有任何错误提示元素时直接返回，跳过等待和整页文本扫描
+            if not await page.evaluate(_JS_HAS_ERROR_BANNER):
+                return False
+
             current_url = page.url
             page_title = await page.title()
 
@@ -1297,67 +1773,23 @@ class AutomationService:
             # 等待页面稳定
             await page.wait_for_timeout(3000)
 
-            # 检查页面内容中是否包含账号锁定的关键信息
-            page_content = await page.content()
+            # 🚀 页面文本与错误元素在一次页面调用中检查，不再传输整页HTML并逐个元素读取文本
+            result = await page.evaluate(
+                _JS_FIND_LOCK_MESSAGE, [_ACCOUNT_LOCK_INDICATORS, _ACCOUNT_ERROR_SELECTORS]
+            )
 
-            # 检查多种可能的账号锁定提示
-            lock_indicators = [
-                "This Apple Account has been locked for security reasons",
-                "You must unlock your account before signing in",
-                "account has been locked",
-                "account is locked",
-                "security reasons",
-                "unlock your account",
-                "locked for security",
-                "account locked",
-                "temporarily locked",
-                "suspended",
-                "disabled"
-            ]
+            # 记录页面内容的一部分用于调试
+            task.add_log(f"🔍 页面内容预览: {result['preview']}", "debug")
 
             account_locked = False
             lock_message = ""
-
-            # 记录页面内容的一部分用于调试
-            content_preview = page_content[:1000] if len(page_content) > 1000 else page_content
-            task.add_log(f"🔍 页面内容预览: {content_preview}", "debug")
-
-            for indicator in lock_indicators:
-                if indicator.lower() in page_content.lower():
-                    account_locked = True
-                    lock_message = indicator
-                    task.add_log(f"🚨 检测到锁定关键词: {indicator}", "warning")
-                    break
-
-            # 也检查页面上是否有相关的错误元素
-            if not account_locked:
-                try:
-                    # 检查常见的错误消息选择器
-                    error_selectors = [
-                        '.error-message',
-                        '.alert-error',
-                        '[role="alert"]',
-                        '.notification-error',
-                        '.security-message',
-                        '.account-locked'
-                    ]
-
-                    for selector in error_selectors:
-                        error_elements = await page.locator(selector).all()
-                        for element in error_elements:
-                            try:
-                                error_text = await element.text_content()
-                                if error_text and any(indicator.lower() in error_text.lower() for indicator in lock_indicators):
-                                    account_locked = True
-                                    lock_message = error_text.strip()
-                                    break
-                            except:
-                                continue
-                        if account_locked:
-                            break
-
-                except Exception as e:
-                    logger.debug(f"检查错误元素失败: {e}")
+            if result['indicator']:
+                account_locked = True
+                lock_message = result['indicator']
+                task.add_log(f"🚨 检测到锁定关键词: {lock_message}", "warning")
+            elif result['alert']:
+                account_locked = True
+                lock_message = result['alert']
 
             if account_locked:
                 logger.warning(f"⚠️ 检测到账号可能被锁定: {lock_message}")
@@ -1471,12 +1903,15 @@ class AutomationService:
 
     async def _mark_account_as_abnormal(self, email: str, current_url: str, page_title: str):
         """标记账号为异常状态"""
+        _discard_auth_state(email)
         try:
             from models.database import DatabaseManager
-            db_manager = DatabaseManager()
+            # 🚀 同步SQLite调用放到线程池，避免阻塞共享的自动化事件循环
+            db_manager = await asyncio.to_thread(DatabaseManager)
 
             # 更新账号状态为异常
-            success = db_manager.update_account_status_by_email(email, "异常",
+            success = await asyncio.to_thread(
+                db_manager.update_account_status_by_email, email, "异常",
                 f"Secure Checkout问题: {page_title} | URL: {current_url}")
 
             if success:
@@ -1487,96 +1922,101 @@ class AutomationService:
         except Exception as e:
             logger.error(f"标记账号异常状态失败: {e}")
 
-    async def _try_iframe_login(self, page: Page, task: Task, email: str, password: str) -> bool:
+    @staticmethod
+    @asynccontextmanager
+    async def _claim_login_form(form_lock: Optional[asyncio.Lock]):
+        """独占登录表单输入：成功后保持占用，失败时释放给另一路登录"""
+        if form_lock is None:
+            yield
+            return
+        await form_lock.acquire()
+        try:
+            yield
+        except BaseException:
+            form_lock.release()
+            raise
+
+    async def _try_iframe_login(self, page: Page, task: Task, email: str, password: str,
+                                form_lock: Optional[asyncio.Lock] = None) -> bool:
         """尝试iframe登录 - 基于apple_automator.py"""
         task.add_log("🔍 尝试iframe登录...", "info")
 
-        # 检查多种iframe选择器
-        iframe_selectors = [
-            '#aid-auth-widget-iFrame',
-            'iframe[name="aid-auth-widget"]',
-            'iframe[title*="Sign In"]',
-            'iframe[src*="idmsa.apple.com"]',
-            'iframe[src*="appleid.apple.com"]'
-        ]
-
-        for selector in iframe_selectors:
-            try:
-                task.add_log(f"检查iframe选择器: {selector}", "info")
-                iframe_element = page.locator(selector)
+        # 🚀 并发count所有iframe候选，再并发等待存在的候选可见，取优先级最高的一个，不再逐个等待5秒
+        counts = await asyncio.gather(*(page.locator(sel).count() for sel in _LOGIN_IFRAME_SELECTORS),
+                                      return_exceptions=True)
+        candidates = [sel for sel, count in zip(_LOGIN_IFRAME_SELECTORS, counts) if isinstance(count, int) and count > 0]
+        if not candidates:
+            return False
 
-                if await iframe_element.count() == 0:
-                    continue
+        probes = {
+            asyncio.ensure_future(page.locator(sel).first.wait_for(state='visible', timeout=5000)): sel
+            for sel in candidates
+        }
+        pending = set(probes)
+        selector = None
+        try:
+            while pending and selector is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                visible = [probes[t] for t in done if t.exception() is None]
+                if visible:
+                    selector = min(visible, key=candidates.index)
+        finally:
+            for t in pending:
+                t.cancel()
 
-                # 等待iframe可见
-                await iframe_element.wait_for(state='visible', timeout=5000)
+        if selector is None:
+            task.add_log("未找到可见的登录iframe", "warning")
+            return False
 
-                # 获取frame对象
-                frame = page.frame_locator(selector)
+        try:
+            task.add_log(f"使用iframe选择器: {selector}", "info")
+            iframe_element = page.locator(selector)
 
-                # 等待iframe内容加载
-                await self._wait_for_iframe_content(frame, task)
+            # 获取frame对象
+            frame = page.frame_locator(selector)
 
-                # 执行登录
-                await self._perform_iframe_login(frame, task, email, password)
+            # 等待iframe内容加载（在iframe文档内等待，需要Frame对象）
+            iframe_handle = await iframe_element.first.element_handle()
+            content_frame = await iframe_handle.content_frame()
+            if content_frame is None:
+                raise Exception("无法获取iframe内容")
+            await self._wait_for_iframe_content(content_frame, task)
 
-                task.add_log("✅ iframe登录成功", "success")
-                return True
+            # 执行登录
+            async with self._claim_login_form(form_lock):
+                await self._perform_iframe_login(page, frame, task, email, password)
 
-            except Exception as e:
-                task.add_log(f"iframe选择器 {selector} 失败: {e}", "warning")
-                continue
+            task.add_log("✅ iframe登录成功", "success")
+            return True
 
-        return False
+        except Exception as e:
+            task.add_log(f"iframe选择器 {selector} 失败: {e}", "warning")
+            return False
 
     async def _wait_for_iframe_content(self, frame, task: Task):
         """等待iframe内容完全加载 - 基于apple_automator.py"""
         task.add_log("⏳ 等待iframe内容加载...", "info")
 
         # 等待iframe中的关键元素出现
-        email_selectors = [
-            'input[type="email"]',
-            'input[name="accountName"]',
-            '#account_name_text_field',
-            '[placeholder*="email"]',
-        ]
-
-        for selector in email_selectors:
-            try:
-                await frame.locator(selector).first.wait_for(state='visible', timeout=5000)
-                task.add_log(f"✅ iframe中找到邮箱输入框: {selector}", "success")
-                return
-            except:
-                continue
+        if await self._wait_for_selector_mo(frame, _LOGIN_EMAIL_SELECTOR, 5000):
+            task.add_log("✅ iframe中找到邮箱输入框", "success")
+            return
 
         # 如果没有找到邮箱输入框，等待一般性内容
-        await frame.locator('input, button').first.wait_for(state='visible', timeout=8000)
+        if not await self._wait_for_selector_mo(frame, 'input, button', 8000):
+            raise Exception("iframe内容加载超时")
 
-    async def _perform_iframe_login(self, frame, task: Task, email: str, password: str):
+    async def _perform_iframe_login(self, page: Page, frame, task: Task, email: str, password: str):
         """在iframe中执行登录 - 基于apple_automator.py"""
         task.add_log("📝 在iframe中执行登录...", "info")
 
         # 输入邮箱
-        email_selectors = [
-            'input[type="email"]',
-            'input[name="accountName"]',
-            '#account_name_text_field',
-            '[placeholder*="email"]'
-        ]
-
-        email_input = None
-        for selector in email_selectors:
-            try:
-                temp_input = frame.locator(selector).first
-                await temp_input.wait_for(state='visible', timeout=3000)
-                email_input = temp_input
-                task.add_log(f"✅ 找到邮箱输入框: {selector}", "success")
-                break
-            except:
-                continue
-
-        if not email_input:
+        email_input = frame.locator(f'{_LOGIN_EMAIL_SELECTOR} >> visible=true').first
+        try:
+            await email_input.wait_for(state='visible', timeout=3000)
+        except PlaywrightTimeoutError:
             raise Exception("无法找到邮箱输入框")
+        task.add_log("✅ 找到邮箱输入框", "success")
 
         await email_input.fill(email)
         task.add_log("✅ 邮箱已输入", "success")
@@ -1586,7 +2026,7 @@ class AutomationService:
             continue_btn = frame.locator('button[type="submit"], button:has-text("Continue")').first
             await continue_btn.click()
             task.add_log("✅ 已点击继续按钮", "success")
-        except:
+        except PlaywrightError:
             await email_input.press('Enter')
             task.add_log("✅ 已按Enter键", "success")
 
@@ -1599,23 +2039,22 @@ class AutomationService:
         task.add_log("✅ 密码已输入", "success")
 
         # 提交密码
+        prior_url = page.url
         try:
             submit_btn = frame.locator('button[type="submit"], button:has-text("Sign In")').first
             await submit_btn.click()
             task.add_log("✅ 已点击登录按钮", "success")
-        except:
+        except PlaywrightError:
             await password_input.press('Enter')
             task.add_log("✅ 已按Enter键提交", "success")
 
-        # 等待登录完成
-        await page.wait_for_load_state('domcontentloaded', timeout=15000)
-
-        # 等待页面稳定
-        await page.wait_for_timeout(2000)
+        # 🚀 等待页面跳转或iframe中出现错误提示，取代固定等待
+        await self._wait_for_url_change_or_error(page, prior_url, frame.locator(_LOGIN_ERROR_SELECTOR).first)
 
         task.add_log("✅ iframe登录流程完成", "success")
 
-    async def _try_direct_login(self, page: Page, task: Task, email: str, password: str) -> bool:
+    async def _try_direct_login(self, page: Page, task: Task, email: str, password: str,
+                                form_lock: Optional[asyncio.Lock] = None) -> bool:
         """尝试直接登录（非iframe）- 基于apple_automator.py"""
         task.add_log("🔍 尝试直接登录...", "info")
 
@@ -1626,45 +2065,44 @@ class AutomationService:
                 return False
 
             await email_input.wait_for(state='visible', timeout=5000)
-            await email_input.fill(email)
-            task.add_log("✅ 邮箱已输入", "success")
-
-            # 继续到密码
-            try:
-                continue_btn = page.locator('button[type="submit"], button:has-text("Continue")').first
-                await continue_btn.click()
-                await page.wait_for_timeout(2000)
-                task.add_log("✅ 已点击继续按钮", "success")
-            except:
-                await email_input.press('Enter')
-                await page.wait_for_timeout(2000)
-                task.add_log("✅ 已按Enter键", "success")
+            async with self._claim_login_form(form_lock):
+                await email_input.fill(email)
+                task.add_log("✅ 邮箱已输入", "success")
 
-            # 等待并输入密码
-            password_input = page.locator('input[type="password"]').first
-            await password_input.wait_for(state='visible', timeout=10000)
-            await password_input.fill(password)
-            task.add_log("✅ 密码已输入", "success")
+                # 继续到密码
+                try:
+                    continue_btn = page.locator('button[type="submit"], button:has-text("Continue")').first
+                    await continue_btn.click()
+                    await page.wait_for_timeout(2000)
+                    task.add_log("✅ 已点击继续按钮", "success")
+                except PlaywrightError:
+                    await email_input.press('Enter')
+                    await page.wait_for_timeout(2000)
+                    task.add_log("✅ 已按Enter键", "success")
 
-            # 提交密码
-            try:
-                submit_btn = page.locator('button[type="submit"], button:has-text("Sign In")').first
-                await submit_btn.click()
-                task.add_log("✅ 已点击登录按钮", "success")
-            except:
-                await password_input.press('Enter')
-                task.add_log("✅ 已按Enter键提交", "success")
+                # 等待并输入密码
+                password_input = page.locator('input[type="password"]').first
+                await password_input.wait_for(state='visible', timeout=10000)
+                await password_input.fill(password)
+                task.add_log("✅ 密码已输入", "success")
 
-            # 等待登录完成
-            await page.wait_for_load_state('domcontentloaded', timeout=15000)
+                # 提交密码
+                prior_url = page.url
+                try:
+                    submit_btn = page.locator('button[type="submit"], button:has-text("Sign In")').first
+                    await submit_btn.click()
+                    task.add_log("✅ 已点击登录按钮", "success")
+                except PlaywrightError:
+                    await password_input.press('Enter')
+                    task.add_log("✅ 已按Enter键提交", "success")
 
-            # 等待页面稳定
-            await page.wait_for_timeout(2000)
+                # 🚀 等待页面跳转或出现错误提示，取代固定等待
+                await self._wait_for_url_change_or_error(page, prior_url, page.locator(_LOGIN_ERROR_SELECTOR).first)
 
             task.add_log("✅ 直接登录流程完成", "success")
             return True
 
-        except Exception as e:
+        except PlaywrightError as e:
             task.add_log(f"直接登录失败: {e}", "warning")
             return False
 
@@ -1672,27 +2110,16 @@ class AutomationService:
         """尝试点击登录链接 - 基于apple_automator.py"""
         task.add_log("🔍 查找登录链接...", "info")
 
-        signin_selectors = [
-            'a:has-text("Sign In")',
-            'a:has-text("Sign in")',
-            'a:has-text("登录")',
-            'button:has-text("Sign In")',
-            'button:has-text("Sign in")',
-            '[data-testid*="signin"]',
-            '[data-autom*="signin"]'
-        ]
+        # 🚀 登录链接规则由apple选择器引擎按优先级一次查找；页面上没有可见链接时直接返回
+        try:
+            if await page.locator('apple=signinLink').count() == 0:
+                return False
+        except PlaywrightError:
+            return False
 
-        for selector in signin_selectors:
-            try:
-                element = page.locator(selector).first
-                if await element.count() > 0:
-                    await element.wait_for(state='visible', timeout=3000)
-                    if await element.is_visible():
-                        await element.click()
-                        task.add_log(f"✅ 已点击登录链接: {selector}", "success")
-                        return True
-            except:
-                continue
+        if await self._click_apple_target(page, 'signinLink', "登录链接", task, timeout=3000):
+            task.add_log("✅ 已点击登录链接", "success")
+            return True
 
         return False
 
@@ -1703,28 +2130,11 @@ class AutomationService:
         # 等待页面稳定
         await page.wait_for_timeout(1000)  # 减少等待时间
 
-        # 查找Continue按钮
-        continue_selectors = [
-            'button:has-text("Continue to Shipping Address")',
-            'button:has-text("Continue")',
-            'button[type="submit"]',
-            '[data-testid*="continue"]',
-            '[data-autom*="continue"]'
-        ]
-
-        for selector in continue_selectors:
-            try:
-                element = page.locator(selector).first
-                if await element.count() > 0:
-                    await element.wait_for(state='visible', timeout=5000)
-                    if await element.is_visible() and await element.is_enabled():
-                        await element.scroll_into_view_if_needed()
-                        await element.click()
-                        task.add_log(f"✅ 已点击Continue按钮: {selector}", "success")
-                        await page.wait_for_timeout(3000)
-                        return
-            except:
-                continue
+        # 🚀 查找Continue按钮 - apple选择器引擎按优先级一次查找
+        if await self._click_apple_target(page, 'shippingContinue', "Continue按钮", task, timeout=5000, no_wait_after=True):
+            task.add_log("✅ 已点击Continue按钮", "success")
+            await page.wait_for_timeout(3000)
+            return
 
         task.add_log("⚠️ 未找到Continue按钮，可能已在正确页面", "warning")
 
@@ -1732,37 +2142,12 @@ class AutomationService:
         """填写电话号码 - 基于apple_automator.py的完整实现"""
         task.add_log(f"📞 开始填写电话号码: {phone_number}", "info")
 
-        # 等待页面稳定
-        await page.wait_for_timeout(2000)
-
-        # 尝试多种电话号码输入框选择器（基于apple_automator.py）
-        phone_selectors = [
-            'input[name="mobilePhone"]',
-            'input[name="phoneNumber"]',
-            'input[name="phone"]',
-            'input[placeholder*="phone"]',
-            'input[placeholder*="Phone"]',
-            'input[placeholder*="mobile"]',
-            'input[placeholder*="Mobile"]',
-            'input[type="tel"]',
-            '#mobilePhone',
-            '#phoneNumber',
-            '#phone',
-            '[data-autom*="phone"]',
-            '[data-autom*="mobile"]'
-        ]
-
-        phone_input = None
-        for selector in phone_selectors:
-            try:
-                task.add_log(f"尝试电话号码选择器: {selector}", "info")
-                temp_input = page.locator(selector).first
-                await temp_input.wait_for(state='visible', timeout=3000)
-                phone_input = temp_input
-                task.add_log(f"✅ 找到电话号码输入框: {selector}", "success")
-                break
-            except:
-                continue
+        # 🚀 电话号码输入框选择器合并为一个并集，一次等待第一个可见元素
+        phone_input = page.locator(f'{_PHONE_INPUT_SELECTOR} >> visible=true').first
+        if await self._wait_for_selector_mo(page, _PHONE_INPUT_SELECTOR, 3000):
+            task.add_log("✅ 找到电话号码输入框", "success")
+        else:
+            phone_input = None
 
         if phone_input is None:
             task.add_log("⚠️ 未找到电话号码输入框，可能不需要填写", "warning")
@@ -1770,28 +2155,16 @@ class AutomationService:
 
         # SOTA方法：智能填写电话号码（基于apple_automator.py）
         try:
-            # 检查元素类型和可编辑性
-            tag_name = await phone_input.evaluate('el => el.tagName.toLowerCase()')
+            # 🚀 元素类型和可编辑性一次evaluate取回（元素已确认可见）
+            meta = await phone_input.evaluate(_JS_ELEMENT_EDIT_META)
+            tag_name = meta['tag']
             is_input = tag_name in ['input', 'textarea']
-            is_contenteditable = await phone_input.evaluate('el => el.contentEditable === "true"')
 
-            if not is_input and not is_contenteditable:
+            if not is_input and not meta['editable']:
                 task.add_log(f"❌ 电话号码元素不可编辑: tagName={tag_name}", "error")
                 raise Exception(f"电话号码输入框不是可编辑元素: {tag_name}")
 
-            # 确保元素可交互
-            await phone_input.wait_for(state='attached', timeout=5000)
-            await phone_input.scroll_into_view_if_needed()
-
-            # 清空并填写
-            if is_input:
-                await phone_input.clear()
-                await phone_input.fill(phone_number)
-            else:
-                # 对于contenteditable元素
-                await phone_input.click()
-                await phone_input.evaluate('el => el.textContent = ""')
-                await phone_input.type(phone_number)
+            await self._set_value(phone_input, phone_number, is_input)
 
             task.add_log("✅ 电话号码填写完成", "success")
 
@@ -1803,14 +2176,7 @@ class AutomationService:
 
             if input_value.strip() != phone_number:
                 task.add_log(f"⚠️ 电话号码验证失败，重试... 期望: {phone_number}, 实际: {input_value}", "warning")
-                if is_input:
-                    await phone_input.clear()
-                    await page.wait_for_timeout(500)
-                    await phone_input.fill(phone_number)
-                else:
-                    await phone_input.click()
-                    await phone_input.evaluate('el => el.textContent = ""')
-                    await phone_input.type(phone_number)
+                await self._set_value(phone_input, phone_number, is_input)
 
         except Exception as e:
             task.add_log(f"❌ 填写电话号码失败: {e}", "error")
@@ -1823,8 +2189,8 @@ class AutomationService:
         """填写电话号码后点击Continue按钮 - 基于apple_automator.py"""
         task.add_log("📞 填写电话号码完成，点击Continue按钮...", "info")
 
-        # 等待页面稳定
-        await page.wait_for_timeout(2000)
+        # 🚀 等待Continue按钮出现，不再固定等待
+        await self._wait_for_selector_mo(page, 'button', 5000, texts=('continue',))
 
         # 尝试多种Continue按钮选择策略（基于apple_automator.py）
         continue_strategies = [
@@ -1844,14 +2210,19 @@ class AutomationService:
             lambda: page.locator('form button:has-text("Continue")').first,
         ]
 
+        # 🚀 并发count所有策略，只对存在元素的策略等待可见，不再逐个等满5秒
+        locators = [strategy() for strategy in continue_strategies]
+        counts = await asyncio.gather(*(loc.count() for loc in locators), return_exceptions=True)
+
         continue_success = False
-        for i, strategy in enumerate(continue_strategies, 1):
+        for i, (continue_button, count) in enumerate(zip(locators, counts), 1):
+            if not isinstance(count, int) or count == 0:
+                continue
             try:
                 task.add_log(f"尝试Continue按钮选择策略 {i}", "info")
-                continue_button = strategy()
                 await continue_button.wait_for(state='visible', timeout=5000)
-                await continue_button.scroll_into_view_if_needed()
-                await continue_button.click()
+                # 🚀 click自带滚动，后续由_wait_for_dom_settled等待页面响应
+                await continue_button.click(no_wait_after=True)
                 task.add_log(f"✅ 成功点击Continue按钮 (策略{i})", "success")
                 continue_success = True
                 break
@@ -1863,14 +2234,67 @@ class AutomationService:
             task.add_log("❌ 填写电话号码后无法找到Continue按钮", "error")
             raise Exception("填写电话号码后无法找到Continue按钮")
 
-        # 等待页面响应
-        await page.wait_for_load_state('domcontentloaded', timeout=15000)
+        # 🚀 等待地址确认卡片出现或跳转到付款页面
+        await self._wait_for_dom_settled(page, _ADDRESS_CARD_SELECTOR, 15000, url_pattern=_PAYMENT_URL_RE)
         task.add_log("✅ 成功点击Continue按钮，等待页面响应...", "success")
 
+    async def _wait_for_selector_mo(self, target, selector: str, timeout: int, texts=()) -> bool:
+        """在页面或Frame内用MutationObserver等待可见元素（可按文本过滤），出现返回True，超时或页面跳转返回False"""
+        try:
+            return await target.evaluate(_JS_WAIT_FOR_VISIBLE, [selector, list(texts), timeout])
+        except PlaywrightError:
+            return False
+
+    async def _wait_for_dom_settled(self, page: Page, next_selector: str, timeout: int, url_pattern=None) -> bool:
+        """等待下一个元素可见，同时等待DOM加载完成（或URL匹配url_pattern），任一完成即返回True，都超时返回False"""
+        if url_pattern is not None:
+            page_wait = page.wait_for_url(url_pattern, wait_until='commit', timeout=timeout)
+        else:
+            page_wait = page.wait_for_load_state('domcontentloaded', timeout=timeout)
+        return await self._first_success(
+            page.wait_for_selector(next_selector, state='visible', timeout=timeout), page_wait
+        )
+
+    async def _wait_for_url_change_or_error(self, page: Page, prior_url: str, error_locator, timeout: int = 15000) -> bool:
+        """提交表单后等待页面URL变化、错误提示出现或登录接口返回错误，任一发生返回True，都超时返回False"""
+        return await self._first_success(
+            page.wait_for_url(lambda url: url != prior_url, wait_until='commit', timeout=timeout),
+            error_locator.wait_for(state='visible', timeout=timeout),
+            page.wait_for_event('response', predicate=_is_auth_error_response, timeout=timeout),
+        )
+
+    async def _wait_for_payment_page(self, page: Page, prior_url: str, timeout: int = 15000) -> bool:
+        """点击Continue后等待跳转到付款页面（URL变化且匹配付款关键词）或卡号输入框出现"""
+        return await self._first_success(
+            page.wait_for_url(lambda url: url != prior_url and _PAYMENT_URL_RE.search(url) is not None,
+                              wait_until='commit', timeout=timeout),
+            page.wait_for_selector(_CARD_FIELD_SELECTOR, state='visible', timeout=timeout),
+        )
+
+    @staticmethod
+    async def _first_success(*aws) -> bool:
+        """同时等待多个Playwright等待操作，任一成功即取消其余并返回True，全部失败返回False"""
+        waits = {asyncio.ensure_future(aw) for aw in aws}
+        try:
+            while waits:
+                done, waits = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+                if any(t.exception() is None for t in done):
+                    return True
+            return False
+        finally:
+            for t in waits:
+                t.cancel()
+
     async def _handle_address_confirmation_and_continue(self, page: Page, task: Task):
         """处理地址确认卡片并继续到付款页面 - 基于apple_automator.py"""
         task.add_log("🏠 检查地址确认卡片并继续...", "info")
 
+        # 🚀 URL已经是付款页面时无需再检查地址卡片和Continue按钮
+        url = page.url.lower()
+        if any(i in url for i in _PAYMENT_INDICATORS) and not any(e in url for e in _SHIPPING_EXCLUSIONS):
+            task.add_log("✅ 已经在付款页面，跳过地址确认", "success")
+            return
+
         # 等待页面稳定
         await page.wait_for_timeout(2000)
 
@@ -1884,41 +2308,14 @@ class AutomationService:
         """处理地址确认卡片，点击Use Existing Address - 基于apple_automator.py"""
         task.add_log("🔍 检查是否出现地址确认卡片...", "info")
 
-        # 等待一下让卡片有时间出现
-        await page.wait_for_timeout(2000)
-
-        # 尝试多种"Use Existing Address"按钮选择策略（移除无效的策略）
-        use_existing_strategies = [
-            # 策略1: 通过包含文本的按钮（最有效的策略）
-            lambda: page.locator('button:has-text("Use Existing Address")'),
-            # 策略2: 通过包含Existing的按钮
-            lambda: page.locator('button:has-text("Use Existing")'),
-            # 策略3: 通过data-autom属性
-            lambda: page.locator('[data-autom*="use-existing"], [data-autom*="existing-address"]'),
-            # 策略4: 通过类名和文本组合
-            lambda: page.locator('button.form-button:has-text("Use Existing")'),
-            # 策略5: 通过对话框中的按钮
-            lambda: page.locator('.modal button:has-text("Use Existing"), .dialog button:has-text("Use Existing")'),
-            # 策略6: 通过卡片中的按钮
-            lambda: page.locator('.card button:has-text("Use Existing"), .address-card button:has-text("Use Existing")'),
-            # 策略7: 通过"Use this address!"按钮
-            lambda: page.locator('button:has-text("Use this address!")'),
-        ]
-
+        # 🚀 先一次count确认卡片按钮存在，不存在时直接跳过；存在时由apple选择器引擎按优先级点击
         address_confirmation_found = False
-        for i, strategy in enumerate(use_existing_strategies, 1):
-            try:
-                task.add_log(f"尝试Use Existing Address按钮选择策略 {i}", "info")
-                use_existing_button = strategy()
-                await use_existing_button.wait_for(state='visible', timeout=3000)
-                await use_existing_button.scroll_into_view_if_needed()
-                await use_existing_button.click()
-                task.add_log(f"✅ 成功点击'Use Existing Address'按钮 (策略{i})", "success")
-                address_confirmation_found = True
-                break
-            except Exception as e:
-                task.add_log(f"Use Existing Address按钮选择策略 {i} 失败: {e}", "warning")
-                continue
+        if await page.locator('apple=useExistingAddress').count() > 0:
+            address_confirmation_found = await self._click_apple_target(
+                page, 'useExistingAddress', "Use Existing Address按钮", task, timeout=3000, no_wait_after=True
+            )
+        if address_confirmation_found:
+            task.add_log("✅ 成功点击'Use Existing Address'按钮", "success")
 
         if not address_confirmation_found:
             task.add_log("ℹ️ 未发现地址确认卡片，继续执行...", "info")
@@ -1934,45 +2331,17 @@ class AutomationService:
         # 等待页面稳定
         await page.wait_for_timeout(2000)
 
-        current_url = page.url
-        page_title = await page.title()
-        task.add_log(f"当前页面URL: {current_url}", "info")
-        task.add_log(f"当前页面标题: {page_title}", "info")
-
-        # 检查是否已经在付款页面（更精确的判断）
-        payment_indicators = [
-            'payment',
-            'billing',
-            'card'
-        ]
-
-        # 排除仍在配送阶段的URL
-        shipping_exclusions = [
-            'shipping-init',
-            'shipping',
-            'address'
-        ]
-
-        is_payment_page = (
-            any(indicator in current_url.lower() or indicator in page_title.lower() for indicator in payment_indicators) and
-            not any(exclusion in current_url.lower() for exclusion in shipping_exclusions)
-        )
+        state = await self._get_checkout_page_state(page)
+        task.add_log(f"当前页面URL: {state['url']}", "info")
+        task.add_log(f"当前页面标题: {state['title']}", "info")
 
-        if is_payment_page:
+        # 检查是否已经在付款页面（URL/标题或可见的卡号输入框）
+        if state['isPayment']:
             task.add_log("✅ 已经在付款页面", "success")
             return
 
         # 检查是否还在配送地址页面，需要继续
-        shipping_indicators = [
-            'shipping',
-            'address',
-            'delivery'
-        ]
-
-        is_shipping_page = any(indicator in current_url.lower() or indicator in page_title.lower()
-                              for indicator in shipping_indicators)
-
-        if is_shipping_page:
+        if state['isShipping']:
             task.add_log("🚚 仍在配送地址页面，尝试继续到付款页面...", "info")
             await self._continue_to_payment(page, task)
         else:
@@ -1987,57 +2356,49 @@ class AutomationService:
                 # 尝试通用的Continue按钮
                 await self._try_generic_continue_button(page, task)
 
+    async def _get_checkout_page_state(self, page: Page) -> dict:
+        """一次evaluate返回当前URL、标题以及是否为付款/配送页面"""
+        return await page.evaluate(
+            _JS_CHECKOUT_PAGE_STATE, [_PAYMENT_INDICATORS, _SHIPPING_EXCLUSIONS, _SHIPPING_INDICATORS]
+        )
+
     async def _try_generic_continue_button(self, page: Page, task: Task):
         """尝试通用的Continue按钮 - 基于apple_automator.py"""
         task.add_log("🔄 尝试通用Continue按钮...", "info")
 
-        # 通用Continue按钮选择器
-        generic_continue_selectors = [
-            'button:has-text("Continue")',
-            'button:has-text("Next")',
-            'button[type="submit"]',
-            'input[type="submit"]',
-            '[data-autom*="continue"]',
-            '[data-autom*="next"]',
-            '.continue-button',
-            '.next-button'
-        ]
-
-        for selector in generic_continue_selectors:
-            try:
-                button = page.locator(selector).first
-                if await button.count() > 0:
-                    await button.scroll_into_view_if_needed()
-                    if await button.is_visible() and await button.is_enabled():
-                        await button.click()
-                        task.add_log(f"✅ 成功点击通用Continue按钮: {selector}", "success")
-                        await page.wait_for_timeout(3000)
-                        return
-            except Exception as e:
-                task.add_log(f"通用Continue按钮 {selector} 失败: {e}", "warning")
-                continue
+        # 🚀 通用Continue按钮规则由apple选择器引擎按优先级一次查找（只匹配可见可用的按钮）
+        button = page.locator('apple=genericContinue').first
+        try:
+            if await button.count() > 0:
+                await button.click(no_wait_after=True)
+                task.add_log("✅ 成功点击通用Continue按钮", "success")
+                await page.wait_for_timeout(3000)
+                return
+        except PlaywrightError as e:
+            task.add_log(f"通用Continue按钮点击失败: {e}", "warning")
 
         task.add_log("❌ 未找到可用的Continue按钮", "error")
         # 截图用于调试
-        await page.screenshot(path=f"no_continue_button_{task.id}.png")
+        self._dump_screenshot(page, f"no_continue_button_{task.id}.png")
 
     async def _continue_to_payment(self, page: Page, task: Task):
         """点击Continue to Payment按钮 - 直接使用有效的策略4"""
         task.add_log("🔄 点击Continue to Payment按钮...", "info")
 
         # 直接使用策略4（已验证有效）：通过data-autom属性
+        prior_url = page.url
         try:
             continue_button = page.locator('[data-autom*="continue"], [data-autom*="payment"]')
             await continue_button.wait_for(state='visible', timeout=5000)
-            await continue_button.scroll_into_view_if_needed()
-            await continue_button.click()
+            # 🚀 click自带滚动，后续由_wait_for_payment_page等待跳转
+            await continue_button.click(no_wait_after=True)
             task.add_log("✅ 成功点击'Continue to Payment'按钮", "success")
         except Exception as e:
             task.add_log(f"❌ 无法找到Continue to Payment按钮: {e}", "error")
             raise Exception("无法找到Continue to Payment按钮")
 
-        # 等待页面跳转
-        await page.wait_for_timeout(3000)
+        # 🚀 等待跳转到付款页面或出现卡号输入框，取代固定等待
+        await self._wait_for_payment_page(page, prior_url)
 
         # 验证是否真的进入了付款页面
         await self._verify_payment_page_entry(page, task)
@@ -2046,21 +2407,10 @@ class AutomationService:
         """验证是否成功进入付款页面 - 基于apple_automator.py"""
         task.add_log("🔍 验证是否成功进入付款页面...", "info")
 
-        # 验证是否真的进入了付款页面
-        await page.wait_for_timeout(3000)
-        current_url = page.url
-        page_title = await page.title()
-
-        # 更精确的付款页面判断
-        payment_indicators = ['payment', 'billing', 'card']
-        shipping_exclusions = ['shipping-init', 'shipping', 'address']
+        # 验证是否真的进入了付款页面（调用方已等待跳转）
+        state = await self._get_checkout_page_state(page)
 
-        is_payment_page = (
-            any(indicator in current_url.lower() or indicator in page_title.lower() for indicator in payment_indicators) and
-            not any(exclusion in current_url.lower() for exclusion in shipping_exclusions)
-        )
-
-        if is_payment_page:
+        if state['isPayment']:
             task.add_log("✅ 成功进入付款页面", "success")
             task.add_log("🎉 地址确认和页面跳转流程完成", "success")
 
@@ -2071,32 +2421,27 @@ class AutomationService:
             # 应用礼品卡
             await self.apply_gift_card(task)
         else:
-            task.add_log(f"⚠️ 仍未进入付款页面 - URL: {current_url}, 标题: {page_title}", "warning")
+            task.add_log(f"⚠️ 仍未进入付款页面 - URL: {state['url']}, 标题: {state['title']}", "warning")
             task.add_log("🔄 尝试继续到付款页面...", "info")
 
             # 尝试继续到付款页面
             try:
+                prior_url = page.url
                 await self._try_generic_continue_button(page, task)
                 # 再次验证
-                await page.wait_for_timeout(3000)
-                new_url = page.url
-                new_title = await page.title()
+                await self._wait_for_payment_page(page, prior_url)
+                state = await self._get_checkout_page_state(page)
 
-                new_is_payment_page = (
-                    any(indicator in new_url.lower() or indicator in new_title.lower() for indicator in payment_indicators) and
-                    not any(exclusion in new_url.lower() for exclusion in shipping_exclusions)
-                )
-
-                if new_is_payment_page:
+                if state['isPayment']:
                     task.add_log("✅ 成功进入付款页面", "success")
                     await self.apply_gift_card(task)
                 else:
-                    task.add_log(f"❌ 仍无法进入付款页面 - URL: {new_url}", "error")
+                    task.add_log(f"❌ 仍无法进入付款页面 - URL: {state['url']}", "error")
                     # 截图用于调试
-                    await page.screenshot(path=f"payment_verification_failed_{task.id}.png")
+                    self._dump_screenshot(page, f"payment_verification_failed_{task.id}.png")
             except Exception as e:
                 task.add_log(f"❌ 尝试进入付款页面失败: {e}", "error")
-                await page.screenshot(path=f"payment_verification_error_{task.id}.png")
+                self._dump_screenshot(page, f"payment_verification_error_{task.id}.png")
     
     async def apply_gift_card(self, task: Task) -> bool:
         """礼品卡应用流程 - 重定向到阶段4方法"""
@@ -2503,22 +2848,26 @@ class AutomationService:
 
             raise
 
+    async def _present_selectors(self, page: Page, selectors, timeout: int = 5000) -> list:
+        """并发count所有选择器，按原顺序返回有匹配元素的选择器；都没有时在并集上等待一次再count"""
+        for attempt in range(2):
+            counts = await asyncio.gather(*(page.locator(sel).count() for sel in selectors), return_exceptions=True)
+            present = [sel for sel, count in zip(selectors, counts) if isinstance(count, int) and count > 0]
+            if present or attempt:
+                return present
+            try:
+                await page.wait_for_selector(', '.join(selectors), state='attached', timeout=timeout)
+            except PlaywrightError:
+                return []
+        return []
+
     async def _click_continue_button(self, page: Page, task: Task):
         """点击继续按钮"""
         try:
             task.add_log("🔍 查找继续按钮...", "info")
 
             # 可能的继续按钮选择器
-            continue_selectors = [
-                'button[data-autom="continueButton"]',
-                'button:has-text("Continue")',
-                'button:has-text("Proceed")',
-                'button:has-text("Next")',
-                '.rs-continue-button',
-                '[data-autom="checkout-continue-button"]'
-            ]
-
-            for selector in continue_selectors:
+            for selector in await self._present_selectors(page, _CONTINUE_BUTTON_SELECTORS):
                 try:
                     button = await page.wait_for_selector(selector, timeout=5000)
                     if button:
@@ -2569,15 +2918,7 @@ class AutomationService:
             task.add_log("🔍 查找Terms & Conditions复选框...", "info")
 
             # 可能的复选框选择器
-            checkbox_selectors = [
-                'input[type="checkbox"][data-autom="terms-checkbox"]',
-                'input[type="checkbox"]:near(:text("Terms and Conditions"))',
-                'input[type="checkbox"]:near(:text("I have read, understand and agree"))',
-                '.rs-terms-checkbox input[type="checkbox"]',
-                '[data-autom="terms-and-conditions-checkbox"]'
-            ]
-
-            for selector in checkbox_selectors:
+            for selector in await self._present_selectors(page, _TERMS_CHECKBOX_SELECTORS):
                 try:
                     checkbox = await page.wait_for_selector(selector, timeout=5000)
                     if checkbox:
@@ -2605,15 +2946,7 @@ class AutomationService:
             task.add_log("🔍 查找Place your order按钮...", "info")
 
             # 可能的下单按钮选择器
-            order_button_selectors = [
-                'button:has-text("Place your order")',
-                'button[data-autom="place-order-button"]',
-                'button[data-autom="placeOrderButton"]',
-                '.rs-place-order-button',
-                'button:has-text("Place Order")'
-            ]
-
-            for selector in order_button_selectors:
+            for selector in await self._present_selectors(page, _PLACE_ORDER_SELECTORS):
                 try:
                     button = await page.wait_for_selector(selector, timeout=5000)
                     if button:
@@ -2761,13 +3094,13 @@ class AutomationService:
 
                 debug_file.write("\n4. task.config完整内容:\n")
                 try:
-                    debug_file.write(f"   {vars(task.config)}\n")
+                    debug_file.write(f"   {task.config!r}\n")
                 except Exception as e:
                     debug_file.write(f"   无法获取vars: {e}\n")
 
                 debug_file.write("\n5. task完整内容:\n")
                 try:
-                    debug_file.write(f"   {vars(task)}\n")
+                    debug_file.write(f"   {task!r}\n")
                 except Exception as e:
                     debug_file.write(f"   无法获取task vars: {e}\n")
 
@@ -2853,7 +3186,7 @@ class AutomationService:
                     else:
                         # 如果是意外的错误，截图调试但继续处理下一张
                         try:
-                            await page.screenshot(path=f"error_gift_card_{task.id}_card_{card_index}.png")
+                            self._dump_screenshot(page, f"error_gift_card_{task.id}_card_{card_index}.png")
                         except:
                             pass
                         task.add_log(f"⚠️ 第 {card_index} 张礼品卡应用失败，继续处理下一张", "warning")
@@ -2879,13 +3212,8 @@ class AutomationService:
             self._send_step_update(task, "applying_gift_card", "failed", message=f"礼品卡应用失败: {str(e)}")
             
             # 截图调试
-            try:
-                await page.screenshot(path=f"error_multi_gift_card_{task.id}.png")
-                page_content = await page.content()
-                with open(f"debug_multi_gift_card_{task.id}.html", 'w', encoding='utf-8') as f:
-                    f.write(page_content)
-            except:
-                pass
+            self._dump_screenshot(page, f"error_multi_gift_card_{task.id}.png")
+            self._dump_html(page, f"debug_multi_gift_card_{task.id}.html")
 
             # 即使失败也继续，让用户手动处理
             task.add_log("⚠️ 多张礼品卡应用失败，继续到最终步骤", "warning")
@@ -2955,28 +3283,12 @@ class AutomationService:
             current_url = current_page.url
             task.add_log(f"📍 当前页面URL: {current_url}", "info")
             
-            # 关闭旧的上下文和页面
-            old_context = self.contexts.get(task.id)
-            if old_context:
-                await old_context.close()
-            
             # 获取Playwright代理配置
             proxy_config = self.ip_service.get_proxy_config_for_playwright()
-            
-            # 获取任务特定的browser实例
-            task_browser = self.task_browsers.get(task.id)
-            if not task_browser:
-                raise Exception(f"任务 {task.id[:8]} 的browser实例不存在")
-
-            # 创建新的上下文（使用新代理）
-            new_context = await task_browser.new_context(
-                locale="en-GB",
-                proxy=proxy_config
-            )
+
+            # 关闭旧的上下文和页面，创建新的上下文（使用新代理）
+            new_context = await self._acquire_context(task, proxy=proxy_config, reuse=False)
             new_page = await new_context.new_page()
-            
-            # 更新存储的上下文和页面
-            self.contexts[task.id] = new_context
             self.pages[task.id] = new_page
             
             # 重新导航到当前URL
@@ -2996,70 +3308,34 @@ class AutomationService:
     async def _click_add_another_card(self, page: Page, task: Task):
         """点击"Add Another Card"或类似的按钮来添加下一张礼品卡"""
         try:
-            task.add_log("🔍 寻找'Add Another Card'选项...", "info")
-            
-            # 等待页面稳定
-            await page.wait_for_timeout(2000)
-            
-            # Apple网站上可能的"添加另一张卡"选项
-            add_card_selectors = [
-                # 最常见的Apple官网样式
-                'button:has-text("Add Another Card")',
-                'a:has-text("Add Another Card")',
-                'button:has-text("Add another card")',
-                'a:has-text("Add another card")',
-                
-                # 可能的变体
-                'button:has-text("Add Gift Card")',
-                'a:has-text("Add Gift Card")',
-                'button:has-text("Add another gift card")',
-                'a:has-text("Add another gift card")',
-                
-                # 通过data属性查找
-                '[data-autom*="add-gift-card"]',
-                '[data-autom*="add-another-card"]',
-                '[data-autom*="additional-gift-card"]',
-                
-                # 可能包含加号的按钮
-                'button:has-text("+")',
-                '[aria-label*="Add"]',
-                '[aria-label*="add"]',
-                
-                # 通用的添加按钮
-                'button:has-text("Add")',
-                'a:has-text("Add")',
-                
-                # 如果是链接形式的
-                'text="Enter another gift card number"',
-                'text="Add another gift card number"',
-                'text="Use another gift card"'
-            ]
+            task.add_log("🔍 寻找'Add Another Card'选项...", "info")
+            
+            # 等待页面稳定
+            await page.wait_for_timeout(2000)
             
-            for i, selector in enumerate(add_card_selectors, 1):
+            # 🚀 先尝试本会话上次成功的选择器，失败时清除缓存再完整查找
+            cache_key = (urlparse(page.url).hostname, 'add_another_card')
+            cached = self._selector_cache.get(cache_key)
+            if cached:
+                try:
+                    await page.locator(cached).first.click(timeout=2000)
+                    task.add_log("✅ 成功点击'Add Another Card'按钮 (缓存选择器)", "success")
+                    await page.wait_for_timeout(2000)
+                    return
+                except PlaywrightError:
+                    self._selector_cache.pop(cache_key, None)
+
+            # 🚀 并发count所有候选，只对存在元素的选择器按优先级尝试点击
+            counts = await asyncio.gather(*(page.locator(sel).count() for sel in _ADD_CARD_SELECTORS),
+                                          return_exceptions=True)
+            for i, (selector, count) in enumerate(zip(_ADD_CARD_SELECTORS, counts), 1):
+                if not isinstance(count, int) or count == 0:
+                    continue
                 try:
                     task.add_log(f"🔍 尝试Add Another Card选择器 {i}: {selector}", "info")
-                    element = page.locator(selector).first
-                    
-                    count = await element.count()
-                    if count == 0:
-                        continue
-                        
-                    # 检查元素是否可见
-                    is_visible = await element.is_visible()
-                    if not is_visible:
-                        task.add_log(f"  选择器 {i}: 元素存在但不可见", "warning")
-                        continue
-                    
-                    # 检查元素是否可点击
-                    is_enabled = await element.is_enabled()
-                    if not is_enabled:
-                        task.add_log(f"  选择器 {i}: 元素不可点击", "warning")
-                        continue
-                    
-                    # 滚动到元素位置并点击
-                    await element.scroll_into_view_if_needed()
-                    await page.wait_for_timeout(500)
-                    await element.click()
+                    # click自带可见/可用检查和滚动，不可点击时在短超时后换下一个选择器
+                    await page.locator(selector).first.click(timeout=2000)
+                    self._selector_cache[cache_key] = selector
                     
                     task.add_log(f"✅ 成功点击'Add Another Card'按钮 (选择器{i})", "success")
                     
@@ -3074,25 +3350,10 @@ class AutomationService:
             # 如果没有找到"Add Another Card"按钮，可能页面已经有输入框了
             task.add_log("⚠️ 未找到'Add Another Card'按钮，检查是否已有可用输入框", "warning")
             
-            # 检查是否已经有可用的礼品卡输入框
-            gift_card_input_selectors = [
-                'input[placeholder*="gift card"]',
-                'input[placeholder*="Gift Card"]',
-                'input[id*="giftCard"]',
-                'input[data-autom*="gift-card"]'
-            ]
-            
-            for selector in gift_card_input_selectors:
-                try:
-                    input_element = page.locator(selector).first
-                    if await input_element.count() > 0 and await input_element.is_visible():
-                        # 检查输入框是否为空（可以用于下一张卡）
-                        input_value = await input_element.input_value()
-                        if not input_value or input_value.strip() == '':
-                            task.add_log("✅ 找到空的礼品卡输入框，可以直接使用", "success")
-                            return
-                except:
-                    continue
+            # 检查是否已经有可用的（可见且为空的）礼品卡输入框
+            if await self._has_empty_gift_card_input(page):
+                task.add_log("✅ 找到空的礼品卡输入框，可以直接使用", "success")
+                return
             
             # 最后尝试：可能需要再次点击礼品卡链接
             task.add_log("🔄 尝试再次点击礼品卡链接来添加下一张卡", "info")
@@ -3109,120 +3370,43 @@ class AutomationService:
             task.add_log(f"❌ 点击'Add Another Card'失败: {e}", "error")
             # 不抛出异常，让流程继续
 
+    async def _has_empty_gift_card_input(self, page: Page) -> bool:
+        """并发检查各礼品卡输入框选择器，是否存在可见且为空的输入框"""
+        async def probe(selector):
+            input_element = page.locator(selector).first
+            if await input_element.count() == 0 or not await input_element.is_visible():
+                return False
+            return not (await input_element.input_value()).strip()
+
+        results = await asyncio.gather(*(probe(sel) for sel in _EMPTY_GIFT_CARD_INPUT_SELECTORS),
+                                       return_exceptions=True)
+        return any(r is True for r in results)
+
     async def _check_multiple_gift_cards_result(self, page: Page, task: Task):
         """检查多张礼品卡应用结果"""
         try:
             task.add_log("🔍 检查多张礼品卡应用结果...", "info")
 
-            # 检查成功消息
-            success_indicators = []
-            success_selectors = [
-                '.success',
-                '.alert-success',
-                '.notification-success',
-                '.message-success',
-                '.gift-card-success',
-                'text="Gift card applied"',
-                'text="Applied successfully"',
-                'text="礼品卡已应用"',
-                '[data-testid*="success"]'
-            ]
-
-            for selector in success_selectors:
-                try:
-                    elements = page.locator(selector)
-                    count = await elements.count()
-                    for i in range(count):
-                        element = elements.nth(i)
-                        if await element.is_visible():
-                            success_text = await element.text_content()
-                            if success_text and success_text.strip():
-                                success_indicators.append(success_text.strip())
-                except:
-                    continue
+            # 🚀 成功消息、错误消息、总价和已应用礼品卡四组检查在一次evaluate中完成
+            groups = await page.evaluate(_JS_GROUP_VISIBLE_TEXTS, _GIFT_CARD_RESULT_GROUPS)
+            success_indicators = groups['success']
+            error_indicators = groups['error']
+            totals = groups['total']
+            applied_cards = groups['applied']
 
             if success_indicators:
                 task.add_log(f"✅ 发现成功指示器: {', '.join(success_indicators)}", "success")
 
-            # 检查错误消息
-            error_indicators = []
-            error_selectors = [
-                '.error',
-                '.alert-error',
-                '.notification-error',
-                '.message-error',
-                '.gift-card-error',
-                'text="Invalid gift card"',
-                'text="Gift card not found"',
-                'text="礼品卡无效"',
-                '[data-testid*="error"]'
-            ]
-
-            for selector in error_selectors:
-                try:
-                    elements = page.locator(selector)
-                    count = await elements.count()
-                    for i in range(count):
-                        element = elements.nth(i)
-                        if await element.is_visible():
-                            error_text = await element.text_content()
-                            if error_text and error_text.strip():
-                                error_indicators.append(error_text.strip())
-                except:
-                    continue
-
             if error_indicators:
                 task.add_log(f"❌ 发现错误指示器: {', '.join(error_indicators)}", "error")
 
             # 检查页面上的总价变化（多张礼品卡可能导致多次价格调整）
-            total_prices = []
-            total_selectors = [
-                '.total-price',
-                '.order-total',
-                '.grand-total',
-                '[data-testid*="total"]',
-                '[data-testid*="price"]'
-            ]
-
-            for selector in total_selectors:
-                try:
-                    elements = page.locator(selector)
-                    count = await elements.count()
-                    for i in range(count):
-                        element = elements.nth(i)
-                        if await element.is_visible():
-                            total_text = await element.text_content()
-                            if total_text and ('$' in total_text or '￥' in total_text or '£' in total_text):
-                                total_prices.append(total_text.strip())
-                except:
-                    continue
-
+            total_prices = [t for t in totals if '$' in t or '￥' in t or '£' in t]
             if total_prices:
                 unique_prices = list(set(total_prices))
                 task.add_log(f"💰 当前订单价格信息: {', '.join(unique_prices)}", "info")
 
             # 检查已应用的礼品卡列表
-            applied_cards = []
-            applied_card_selectors = [
-                '.applied-gift-card',
-                '.gift-card-applied',
-                '[data-testid*="applied-gift-card"]',
-                '.payment-method[data-type="gift-card"]'
-            ]
-
-            for selector in applied_card_selectors:
-                try:
-                    elements = page.locator(selector)
-                    count = await elements.count()
-                    for i in range(count):
-                        element = elements.nth(i)
-                        if await element.is_visible():
-                            card_text = await element.text_content()
-                            if card_text and card_text.strip():
-                                applied_cards.append(card_text.strip())
-                except:
-                    continue
-
             if applied_cards:
                 task.add_log(f"🎁 检测到已应用的礼品卡: {len(applied_cards)} 张", "info")
                 for i, card_info in enumerate(applied_cards, 1):
@@ -3244,109 +3428,47 @@ class AutomationService:
             task.add_log(f"⚠️ 检查多张礼品卡应用结果时出错: {e}", "warning")
 
     async def _sota_click_gift_card_link(self, page: Page, task: Task):
+        # 滚动到页面底部触发礼品卡区域渲染，🚀 不再固定等待，由下面的可见等待决定时机
         await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-        await page.wait_for_timeout(1000)
-        await page.evaluate("window.scrollTo(0, document.body.scrollHeight * 0.5)")
-        await page.wait_for_timeout(1000)
-
-        # 基于实际测试结果的有效选择器
-        effective_selectors = [
-            # 最有效的选择器（实际测试成功）
-            'button[data-autom="enter-giftcard-number"]',  # 从错误日志中发现的实际按钮
-            '[data-autom*="gift"]',
-            # 备用选择器
-            'text="Enter your gift card number"',
-            'a:has-text("Enter your gift card number")',
-            'text="Do you have an Apple Gift Card?"',
-            # 更精确的选择器，避免匹配到Add to Bag等按钮
-            'button:has-text("Enter your gift card number")',
-            'a:has-text("Do you have an Apple Gift Card?")'
-        ]
 
-        link_found = False
-        for i, selector in enumerate(effective_selectors, 1):
-            try:
-                task.add_log(f"🔍 尝试选择器 {i}: {selector}", "info")
-                gift_card_link = page.locator(selector).first
-
-                count = await gift_card_link.count()
-                task.add_log(f"  找到 {count} 个匹配元素", "info")
-
-                if count > 0:
-                    await gift_card_link.wait_for(state='visible', timeout=3000)
-                    await gift_card_link.scroll_into_view_if_needed()
-                    await gift_card_link.click()
-                    task.add_log(f"✅ 成功点击礼品卡链接 (选择器{i})", "success")
-                    link_found = True
-                    break
-
-            except Exception as e:
-                task.add_log(f"  选择器 {i} 失败: {e}", "warning")
-                continue
+        # 🚀 基于实际测试结果的有效选择器由apple选择器引擎在页面内按优先级一次查找
+        link_found = await self._click_apple_target(page, 'giftCardLink', "礼品卡链接", task, timeout=5000)
+        if link_found:
+            task.add_log("✅ 成功点击礼品卡链接", "success")
 
         if not link_found:
             task.add_log("❌ 未找到礼品卡链接，开始详细调试...", "error")
 
             # 调试：搜索页面上所有包含gift的文本
-            try:
-                gift_elements = page.locator('*:has-text("gift"), *:has-text("Gift")')
-                count = await gift_elements.count()
-                task.add_log(f"📊 页面上共有 {count} 个包含'gift'的元素", "info")
-
-                for i in range(min(count, 5)):
-                    try:
-                        element = gift_elements.nth(i)
-                        text = await element.text_content()
-                        tag_name = await element.evaluate('el => el.tagName.toLowerCase()')
-                        task.add_log(f"  {i+1}. <{tag_name}>: {text[:50]}...", "info")
-                    except:
-                        pass
-            except:
-                pass
+            await self._debug_log_page_snapshot(page, task, gift_limit=5, control_limit=0)
 
             # 截图调试
-            await page.screenshot(path=f"no_gift_card_link_{task.id}.png")
+            self._dump_screenshot(page, f"no_gift_card_link_{task.id}.png")
             raise Exception("未找到礼品卡链接")
 
-        # 等待页面响应
-        await page.wait_for_timeout(2000)
+        # 🚀 等待礼品卡输入框出现，取代固定等待
+        await self._wait_for_selector_mo(page, _GIFT_CARD_INPUT_SELECTOR, 5000)
         task.add_log("✅ 礼品卡链接点击完成，等待输入框出现", "success")
 
     async def _sota_fill_gift_card_input(self, page: Page, task: Task, gift_card_number: str):
         """SOTA方法：填写礼品卡号码 - 严格基于apple_automator.py"""
         task.add_log(f"📝 SOTA方法：填写礼品卡号码 {gift_card_number[:4]}****", "info")
 
-        # 等待输入框出现（点击链接后）
-        await page.wait_for_timeout(3000)
-
-        # 基于实际测试结果的有效选择器
-        gift_card_selectors = [
-            # 最有效的选择器（从错误日志中发现）
-            'input[id="checkout.billing.billingOptions.selectedBillingOptions.giftCard.giftCardInput.giftCard"]',
-            'input[data-autom="gift-card-pin"]',
-            # 备用选择器
-            'input[id*="giftCard"]',
-            'input[id*="gift_card"]',
-            'input[type="text"][class*="form-textbox-input"]',
-            'input[type="text"]'  # 最宽泛的选择器
-        ]
+        # 🚀 等待礼品卡专用输入框出现（点击链接后），不再固定等待3秒；
+        # 超时后仍由选择器引擎回退到宽泛的文本输入框
+        await self._wait_for_selector_mo(page, _GIFT_CARD_INPUT_SELECTOR, 5000)
 
-        gift_card_input = None
-        for selector in gift_card_selectors:
-            try:
-                task.add_log(f"🔍 尝试输入框选择器: {selector}", "info")
-                temp_input = page.locator(selector).first
-                await temp_input.wait_for(state='visible', timeout=3000)
-                gift_card_input = temp_input
-                task.add_log(f"✅ 找到礼品卡输入框: {selector}", "success")
-                break
-            except Exception as e:
-                task.add_log(f"选择器 {selector} 失败: {e}", "warning")
-                continue
+        # 基于实际测试结果的有效选择器由apple选择器引擎按优先级一次查找
+        gift_card_input = page.locator('apple=giftCardInput').first
+        try:
+            await gift_card_input.wait_for(state='visible', timeout=3000)
+            task.add_log("✅ 找到礼品卡输入框", "success")
+        except PlaywrightError:
+            gift_card_input = None
 
         if gift_card_input is None:
             task.add_log("❌ 未找到礼品卡输入框", "error")
-            await page.screenshot(path=f"no_gift_card_input_{task.id}.png")
+            self._dump_screenshot(page, f"no_gift_card_input_{task.id}.png")
             raise Exception("未找到礼品卡输入框")
 
         # 填写礼品卡号码（严格基于apple_automator.py）
@@ -3373,7 +3495,7 @@ class AutomationService:
 
         except Exception as e:
             task.add_log(f"❌ 填写礼品卡失败: {e}", "error")
-            await page.screenshot(path=f"error_fill_gift_card_{task.id}.png")
+            self._dump_screenshot(page, f"error_fill_gift_card_{task.id}.png")
             raise
 
     async def _check_gift_card_application_result(self, page: Page, task: Task):
@@ -3382,18 +3504,7 @@ class AutomationService:
 
         try:
             # 检查成功消息
-            success_selectors = [
-                '.success',
-                '.alert-success',
-                '.notification-success',
-                '.message-success',
-                '.gift-card-success',
-                'text="Gift card applied"',
-                'text="Applied successfully"',
-                'text="礼品卡已应用"'
-            ]
-
-            for selector in success_selectors:
+            for selector in _GIFT_CARD_SUCCESS_MESSAGE_SELECTORS:
                 try:
                     element = page.locator(selector).first
                     if await element.count() > 0 and await element.is_visible():
@@ -3404,18 +3515,7 @@ class AutomationService:
                     continue
 
             # 检查错误消息
-            error_selectors = [
-                '.error',
-                '.alert-error',
-                '.notification-error',
-                '.message-error',
-                '.gift-card-error',
-                'text="Invalid gift card"',
-                'text="Gift card not found"',
-                'text="礼品卡无效"'
-            ]
-
-            for selector in error_selectors:
+            for selector in _GIFT_CARD_ERROR_MESSAGE_SELECTORS:
                 try:
                     element = page.locator(selector).first
                     if await element.count() > 0 and await element.is_visible():
@@ -3427,14 +3527,7 @@ class AutomationService:
 
             # 检查页面上的总价变化
             try:
-                total_selectors = [
-                    '.total-price',
-                    '.order-total',
-                    '.grand-total',
-                    '[data-testid*="total"]'
-                ]
-
-                for selector in total_selectors:
+                for selector in _ORDER_TOTAL_PRICE_SELECTORS:
                     try:
                         total_element = page.locator(selector).first
                         if await total_element.count() > 0:
@@ -3458,7 +3551,6 @@ class AutomationService:
 
         # 等待页面基本加载
         await page.wait_for_load_state('domcontentloaded', timeout=30000)
-        await page.wait_for_timeout(5000)  # 增加等待时间，确保页面完全稳定
 
         # 检查页面是否在正确的结账流程中
         current_url = page.url
@@ -3474,22 +3566,13 @@ class AutomationService:
         if not is_checkout_page:
             task.add_log("⚠️ 当前页面可能不是结账页面，继续尝试...", "warning")
 
-        # 等待页面中的关键元素加载
-        key_elements = [
-            'form',  # 结账表单
-            'input',  # 输入框
-            'button'  # 按钮
-        ]
-
-        for element in key_elements:
-            try:
-                await page.wait_for_selector(element, timeout=10000)
-                task.add_log(f"✅ 关键元素已加载: {element}", "info")
-            except Exception as e:
-                task.add_log(f"等待元素 {element} 超时: {e}", "warning")
+        # 🚀 一次等待结账表单中的可见输入框或按钮，取代固定等待和逐个等待
+        try:
+            await page.wait_for_selector('form input, form button', state='visible', timeout=10000)
+            task.add_log("✅ 结账表单已加载", "info")
+        except PlaywrightError as e:
+            task.add_log(f"等待结账表单超时: {e}", "warning")
 
-        # 额外等待确保页面完全稳定
-        await page.wait_for_timeout(2000)
         task.add_log("✅ 结账页面已准备就绪", "success")
 
     async def _click_gift_card_link(self, page: Page, task: Task):
@@ -3502,39 +3585,11 @@ class AutomationService:
         # 首先滚动页面确保所有元素可见
         await self._scroll_to_find_gift_card_section(page, task)
 
-        # 严格按照apple_automator.py的礼品卡触发策略
-        gift_card_strategies = [
-            # 策略1: 通过具体文本匹配（Apple官网常见的礼品卡文本）
-            lambda: page.locator('text="Do you have an Apple Gift Card?"').first,
-            lambda: page.locator('text="Apply an Apple Gift Card"').first,
-            lambda: page.locator('text="Enter your gift card number"').first,  # 关键！这是最重要的链接
-            lambda: page.locator('text="Add gift card"').first,
-            lambda: page.locator('text="Use gift card"').first,
-            lambda: page.locator('text="Gift card"').first,
-
-            # 策略2: 通过角色和文本查找（更精确的选择器）
-            lambda: page.locator('button:has-text("Do you have an Apple Gift Card?")').first,
-            lambda: page.locator('button:has-text("Enter your gift card number")').first,
-            lambda: page.locator('a:has-text("Do you have an Apple Gift Card?")').first,
-            lambda: page.locator('a:has-text("Apply an Apple Gift Card")').first,
-            lambda: page.locator('a:has-text("Enter your gift card number")').first,  # 重要的a标签
-
-            # 策略3: 通过data属性查找
-            lambda: page.locator('[data-autom*="gift"]').first,
-            lambda: page.locator('[data-autom*="giftcard"]').first,
-            lambda: page.locator('[data-analytics*="gift"]').first,
-
-            # 策略4: 通过类名查找
-            lambda: page.locator('.gift-card').first,
-            lambda: page.locator('.giftcard').first,
-            lambda: page.locator('.apple-gift-card').first,
-        ]
-
         link_found = False
-        for i, strategy in enumerate(gift_card_strategies, 1):
+        for i, selector in enumerate(_GIFT_CARD_LINK_SELECTORS, 1):
             try:
                 task.add_log(f"🔍 尝试礼品卡链接策略 {i}...", "info")
-                gift_card_link = strategy()
+                gift_card_link = page.locator(selector).first
 
                 # 检查元素是否存在
                 count = await gift_card_link.count()
@@ -3565,21 +3620,12 @@ class AutomationService:
         if not link_found:
             task.add_log("❌ 所有礼品卡链接策略都失败了！开始详细调试...", "error")
 
-            # 调试1: 截图当前页面
-            await page.screenshot(path=f"debug_no_gift_card_link_{task.id}.png")
-            task.add_log(f"📸 已保存调试截图: debug_no_gift_card_link_{task.id}.png", "info")
-
-            # 调试2: 保存页面HTML
-            page_content = await page.content()
-            with open(f"debug_no_gift_card_link_{task.id}.html", 'w', encoding='utf-8') as f:
-                f.write(page_content)
-            task.add_log(f"📄 已保存页面HTML: debug_no_gift_card_link_{task.id}.html", "info")
-
-            # 调试3: 检查页面上是否有任何包含"gift"的文本
-            await self._debug_search_gift_text(page, task)
+            # 调试1/2: 截图并保存页面HTML（仅调试模式）
+            self._dump_screenshot(page, f"debug_no_gift_card_link_{task.id}.png")
+            self._dump_html(page, f"debug_no_gift_card_link_{task.id}.html")
 
-            # 调试4: 检查页面上所有的链接和按钮
-            await self._debug_print_all_links_and_buttons(page, task)
+            # 调试3/4: 检查页面上包含"gift"的文本以及所有的链接和按钮
+            await self._debug_log_page_snapshot(page, task)
 
             # 尝试备用方法：直接查找礼品卡输入框
             task.add_log("🔄 尝试备用方法：直接查找礼品卡输入框...", "warning")
@@ -3594,64 +3640,29 @@ class AutomationService:
         await page.wait_for_timeout(2000)
         task.add_log("✅ 礼品卡链接点击完成，等待输入框出现", "success")
 
-    async def _debug_search_gift_text(self, page: Page, task: Task):
-        """调试：搜索页面上所有包含gift的文本"""
-        try:
-            task.add_log("🔍 调试：搜索页面上所有包含'gift'的文本...", "info")
-
-            # 搜索所有包含gift的元素
-            gift_elements = page.locator('*:has-text("gift"), *:has-text("Gift"), *:has-text("GIFT")')
-            count = await gift_elements.count()
-            task.add_log(f"📊 找到 {count} 个包含'gift'的元素", "info")
-
-            for i in range(min(count, 10)):  # 最多显示10个
-                try:
-                    element = gift_elements.nth(i)
-                    text = await element.text_content()
-                    tag_name = await element.evaluate('el => el.tagName.toLowerCase()')
-                    task.add_log(f"  {i+1}. <{tag_name}>: {text[:100]}...", "info")
-                except Exception as e:
-                    task.add_log(f"  {i+1}. 获取元素信息失败: {e}", "warning")
-
-        except Exception as e:
-            task.add_log(f"调试搜索gift文本失败: {e}", "warning")
-
-    async def _debug_print_all_links_and_buttons(self, page: Page, task: Task):
-        """调试：打印页面上所有的链接和按钮"""
+    async def _debug_log_page_snapshot(self, page: Page, task: Task, gift_limit: int = 10, control_limit: int = 20):
+        """调试：记录页面上包含gift的元素以及链接和按钮（一次evaluate取回）"""
         try:
-            task.add_log("🔍 调试：检查页面上所有的链接和按钮...", "info")
+            task.add_log("🔍 调试：搜索页面上包含'gift'的文本和所有的链接、按钮...", "info")
+            snapshot = await page.evaluate(_JS_DEBUG_SNAPSHOT, {'giftLimit': gift_limit, 'controlLimit': control_limit})
 
-            # 检查所有链接
-            links = page.locator('a')
-            link_count = await links.count()
-            task.add_log(f"📊 找到 {link_count} 个链接", "info")
-
-            for i in range(min(link_count, 20)):  # 最多显示20个
-                try:
-                    link = links.nth(i)
-                    text = await link.text_content()
-                    href = await link.get_attribute('href')
-                    if text and text.strip():
-                        task.add_log(f"  链接 {i+1}: '{text.strip()[:50]}' -> {href}", "info")
-                except Exception as e:
-                    task.add_log(f"  链接 {i+1}: 获取信息失败: {e}", "warning")
+            task.add_log(f"📊 找到 {snapshot['giftCount']} 个包含'gift'的元素", "info")
+            for i, gift in enumerate(snapshot['gifts'], 1):
+                task.add_log(f"  {i}. <{gift['tag']}>: {gift['text']}...", "info")
 
-            # 检查所有按钮
-            buttons = page.locator('button')
-            button_count = await buttons.count()
-            task.add_log(f"📊 找到 {button_count} 个按钮", "info")
+            if control_limit:
+                task.add_log(f"📊 找到 {snapshot['linkCount']} 个链接", "info")
+                for i, link in enumerate(snapshot['links'], 1):
+                    if link['text']:
+                        task.add_log(f"  链接 {i}: '{link['text']}' -> {link['href']}", "info")
 
-            for i in range(min(button_count, 20)):  # 最多显示20个
-                try:
-                    button = buttons.nth(i)
-                    text = await button.text_content()
-                    if text and text.strip():
-                        task.add_log(f"  按钮 {i+1}: '{text.strip()[:50]}'", "info")
-                except Exception as e:
-                    task.add_log(f"  按钮 {i+1}: 获取信息失败: {e}", "warning")
+                task.add_log(f"📊 找到 {snapshot['buttonCount']} 个按钮", "info")
+                for i, text in enumerate(snapshot['buttons'], 1):
+                    if text:
+                        task.add_log(f"  按钮 {i}: '{text}'", "info")
 
         except Exception as e:
-            task.add_log(f"调试打印链接和按钮失败: {e}", "warning")
+            task.add_log(f"调试页面快照失败: {e}", "warning")
 
     async def _scroll_to_find_gift_card_section(self, page: Page, task: Task):
         """滚动页面寻找礼品卡相关区域 - 基于apple_automator.py"""
@@ -3749,33 +3760,21 @@ class AutomationService:
         if gift_card_input is None:
             task.add_log("❌ 未找到礼品卡输入框，可能页面结构已变化", "error")
             # 截图用于调试
-            await page.screenshot(path=f"no_gift_card_input_{gift_card_number[:4]}.png")
+            self._dump_screenshot(page, f"no_gift_card_input_{gift_card_number[:4]}.png")
             raise Exception("未找到礼品卡输入框")
 
         # 填写礼品卡号码（严格基于apple_automator.py的方法）
         try:
-            # 检查元素类型和可编辑性
-            tag_name = await gift_card_input.evaluate('el => el.tagName.toLowerCase()')
+            # 🚀 元素类型和可编辑性一次evaluate取回（元素已确认可见）
+            meta = await gift_card_input.evaluate(_JS_ELEMENT_EDIT_META)
+            tag_name = meta['tag']
             is_input = tag_name in ['input', 'textarea']
-            is_contenteditable = await gift_card_input.evaluate('el => el.contentEditable === "true"')
 
-            if not is_input and not is_contenteditable:
+            if not is_input and not meta['editable']:
                 task.add_log(f"❌ 礼品卡元素不可编辑: tagName={tag_name}", "error")
                 raise Exception(f"礼品卡输入框不是可编辑元素: {tag_name}")
 
-            # 确保元素可交互
-            await gift_card_input.wait_for(state='attached', timeout=5000)
-            await gift_card_input.scroll_into_view_if_needed()
-
-            # 清空并填写
-            if is_input:
-                await gift_card_input.clear()
-                await gift_card_input.fill(gift_card_number)
-            else:
-                # 对于contenteditable元素
-                await gift_card_input.click()
-                await gift_card_input.evaluate('el => el.textContent = ""')
-                await gift_card_input.type(gift_card_number)
+            await self._set_value(gift_card_input, gift_card_number, is_input)
 
             task.add_log("✅ 礼品卡号码填写完成", "success")
 
@@ -3787,25 +3786,16 @@ class AutomationService:
 
             if input_value.strip() != gift_card_number:
                 task.add_log(f"⚠️ 礼品卡验证失败，重试... 期望: {gift_card_number}, 实际: {input_value}", "warning")
-                if is_input:
-                    await gift_card_input.clear()
-                    await page.wait_for_timeout(500)
-                    await gift_card_input.fill(gift_card_number)
-                else:
-                    await gift_card_input.click()
-                    await gift_card_input.evaluate('el => el.textContent = ""')
-                    await gift_card_input.type(gift_card_number)
+                await self._set_value(gift_card_input, gift_card_number, is_input)
 
             task.add_log("✅ 礼品卡号码填写和验证完成", "success")
 
         except Exception as e:
             task.add_log(f"❌ 填写礼品卡失败: {e}", "error")
             # 截图用于调试
-            await page.screenshot(path=f"error_gift_card_{task.id}.png")
+            self._dump_screenshot(page, f"error_gift_card_{task.id}.png")
             # 保存页面HTML用于分析
-            page_content = await page.content()
-            with open(f"debug_gift_card_page_{task.id}.html", 'w', encoding='utf-8') as f:
-                f.write(page_content)
+            self._dump_html(page, f"debug_gift_card_page_{task.id}.html")
             raise
 
     async def _try_direct_apple_gift_card_input(self, page: Page, task: Task, gift_card_number: str):
@@ -3992,12 +3982,12 @@ class AutomationService:
                         except Exception as e:
                             task.add_log(f"select+fill方法失败: {e}", "warning")
 
-                    # 方法3: 键盘输入
+                    # 方法3: 键盘输入（insert_text一次插入整串文本，不逐字符发送按键）
                     if not fill_success:
                         try:
                             await input_element.click()
                             await page.keyboard.press('Control+a')  # 全选
-                            await page.keyboard.type(gift_card_number)
+                            await page.keyboard.insert_text(gift_card_number)
                             fill_success = True
                             task.add_log("使用键盘输入方法", "info")
                         except Exception as e:
@@ -4480,61 +4470,26 @@ class AutomationService:
         try:
             task.add_log("🛒 正在将商品添加到购物袋...", "info")
 
-            # Add to Bag按钮选择器（按优先级排序）
-            add_to_bag_selectors = [
-                'button[data-autom*="add-to-cart"]:not([data-autom*="apple-pay"])',
-                'button[data-autom*="addToCart"]:not([data-autom*="apple-pay"])',
-                '[data-autom="add-to-cart"]:not([data-autom*="apple-pay"])',
-                'button:has-text("Add to Bag"):not(:has-text("Apple Pay"))',
-                'button:has-text("Add to Cart"):not(:has-text("Apple Pay"))',
-                '[data-autom*="add-to-bag"]',
-                'button[aria-label*="Add to Bag"]',
-                'button[aria-label*="Add to Cart"]'
-            ]
-
-            for selector in add_to_bag_selectors:
-                try:
-                    task.add_log(f"尝试Add to Bag选择器: {selector}", "info")
-
-                    element = page.locator(selector).first
-
-                    # 等待元素可见
-                    await element.wait_for(state='visible', timeout=20000)
-
-                    # 验证这不是Apple Pay按钮
-                    element_text = await element.text_content()
-                    if element_text and ("apple pay" in element_text.lower() or "check out" in element_text.lower()):
-                        task.add_log(f"跳过Apple Pay/Check Out按钮: {element_text}", "warning")
-                        continue
-
-                    # 滚动到元素位置
-                    await element.scroll_into_view_if_needed()
-                    await page.wait_for_timeout(1000)
-
-                    # 点击按钮
-                    await element.click()
-
-                    # 验证点击是否成功
-                    await page.wait_for_timeout(2000)
-
-                    task.add_log(f"✅ 成功点击Add to Bag: {selector}", "success")
-                    task.add_log("✅ 商品已成功添加到购物袋", "success")
+            # 🚀 apple选择器引擎在页面内按优先级查找第一个可见可用的按钮，跳过Apple Pay/Check Out按钮
+            if not await self._click_apple_target(page, 'addToBag', "Add to Bag", task, timeout=20000):
+                task.add_log("❌ 所有Add to Bag选择器都失败", "error")
+                return False
 
-                    # 点击Check Out按钮进入checkout流程
-                    checkout_success = await self._click_checkout_button(page, task)
-                    if not checkout_success:
-                        task.add_log("❌ 点击Check Out按钮失败", "error")
-                        return False
+            # 验证点击是否成功（等待购物袋确认元素出现）
+            try:
+                await page.wait_for_selector(_BAG_CONFIRMATION_SELECTOR, timeout=5000)
+            except Exception:
+                await page.wait_for_timeout(2000)
 
-                    return True
+            task.add_log("✅ 商品已成功添加到购物袋", "success")
 
-                except Exception as e:
-                    task.add_log(f"选择器 {selector} 失败: {e}", "warning")
-                    continue
+            # 点击Check Out按钮进入checkout流程
+            checkout_success = await self._click_checkout_button(page, task)
+            if not checkout_success:
+                task.add_log("❌ 点击Check Out按钮失败", "error")
+                return False
 
-            # 如果所有选择器都失败
-            task.add_log("❌ 所有Add to Bag选择器都失败", "error")
-            return False
+            return True
 
         except Exception as e:
             task.add_log(f"❌ 点击Add to Bag按钮失败: {e}", "error")
@@ -4545,63 +4500,27 @@ class AutomationService:
         try:
             task.add_log("🛒 点击Check Out按钮进入checkout流程...", "info")
 
-            # Check Out按钮选择器（按优先级排序）
-            checkout_selectors = [
-                'button[data-autom*="checkout"]:not([data-autom*="apple-pay"])',
-                'button:has-text("Check Out"):not(:has-text("Apple Pay"))',
-                'button:has-text("Checkout"):not(:has-text("Apple Pay"))',
-                'a[data-autom*="checkout"]:not([data-autom*="apple-pay"])',
-                'a:has-text("Check Out"):not(:has-text("Apple Pay"))',
-                'a:has-text("Checkout"):not(:has-text("Apple Pay"))',
-                '[data-autom="checkout-button"]',
-                'button[aria-label*="Check Out"]',
-                'button[aria-label*="Checkout"]'
-            ]
-
-            for selector in checkout_selectors:
-                try:
-                    task.add_log(f"尝试Check Out选择器: {selector}", "info")
-
-                    element = page.locator(selector).first
-
-                    # 等待元素可见
-                    await element.wait_for(state='visible', timeout=15000)
-
-                    # 验证这不是Apple Pay按钮
-                    element_text = await element.text_content()
-                    if element_text and "apple pay" in element_text.lower():
-                        task.add_log(f"跳过Apple Pay按钮: {element_text}", "warning")
-                        continue
-
-                    # 滚动到元素位置
-                    await element.scroll_into_view_if_needed()
-                    await page.wait_for_timeout(1000)
-
-                    # 点击按钮
-                    await element.click()
-
-                    # 等待页面跳转到checkout页面
-                    await page.wait_for_timeout(3000)
+            # 🚀 apple选择器引擎在页面内按优先级查找第一个可见可用的按钮，跳过Apple Pay按钮
+            if not await self._click_apple_target(page, 'checkout', "Check Out", task, timeout=15000):
+                task.add_log("❌ 所有Check Out选择器都失败", "error")
+                return False
 
-                    # 验证是否成功进入checkout流程（包括登录页面）
-                    current_url = page.url
-                    if ("checkout" in current_url.lower() or
-                        "billing" in current_url.lower() or
-                        "signin" in current_url.lower() or
-                        "login" in current_url.lower()):
-                        task.add_log(f"✅ 成功点击Check Out按钮: {selector}", "success")
-                        task.add_log(f"✅ 已进入checkout流程: {current_url}", "success")
-                        return True
-                    else:
-                        task.add_log(f"⚠️ 点击后未进入checkout流程，当前URL: {current_url}", "warning")
-                        continue
+            # 等待页面跳转到checkout页面（包括登录页面）
+            try:
+                await page.wait_for_url(_CHECKOUT_URL_RE, wait_until='commit', timeout=10000)
+            except Exception:
+                pass
 
-                except Exception as e:
-                    task.add_log(f"选择器 {selector} 失败: {e}", "warning")
-                    continue
+            # 验证是否成功进入checkout流程（包括登录页面）
+            current_url = page.url
+            if ("checkout" in current_url.lower() or
+                "billing" in current_url.lower() or
+                "signin" in current_url.lower() or
+                "login" in current_url.lower()):
+                task.add_log(f"✅ 已进入checkout流程: {current_url}", "success")
+                return True
 
-            # 如果所有选择器都失败
-            task.add_log("❌ 所有Check Out选择器都失败", "error")
+            task.add_log(f"⚠️ 点击后未进入checkout流程，当前URL: {current_url}", "warning")
             return False
 
         except Exception as e:
@@ -4748,62 +4667,206 @@ class AutomationService:
 
     async def cleanup_task(self, task_id: str, force_close: bool = False):
         """清理任务资源 - 可选择是否强制关闭浏览器"""
+        self._flush_ws_messages(task_id)
+
         if not force_close:
             # 默认情况下不关闭浏览器，让用户手动检查
             logger.info(f"保持任务 {task_id} 的浏览器打开状态")
             return
 
-        if task_id in self.pages:
+        # 只关闭任务的上下文，共享浏览器由shutdown统一关闭
+        await self._release_context(task_id)
+        self.task_browsers.pop(task_id, None)
+
+    async def _acquire_context(self, task: Task, proxy: Optional[dict] = None, reuse: bool = True) -> BrowserContext:
+        """获取任务的浏览器上下文：可复用时清除会话状态后复用，否则关闭旧上下文并新建"""
+        task_browser = self.task_browsers.get(task.id)
+        if not task_browser:
+            raise Exception(f"任务 {task.id[:8]} 的browser实例不存在")
+
+        context = self.contexts.get(task.id)
+        if context is not None:
+            if reuse and context.browser is task_browser and task_browser.is_connected():
+                # 🚀 复用上下文，避免重复创建的开销
+                await context.clear_cookies()
+                await context.clear_permissions()
+                await self._restore_auth_state(context, task)
+                return context
+            await self._release_context(task.id)
+
+        # 🚀 不使用代理时优先取预热的上下文，并在后台补充
+        context = self._take_pooled_context(task_browser) if proxy is None else None
+        if context is None:
+            options = dict(_CONTEXT_OPTIONS)
+            if proxy is not None:
+                options['proxy'] = proxy
+            context = await task_browser.new_context(**options)
+        self._schedule_context_pool_refill()
+        await self._install_resource_blocking(context, task)
+        context.on('response', lambda response: self._on_auth_response(task.id, response))
+        await self._restore_auth_state(context, task)
+        self.contexts[task.id] = context
+        return context
+
+    def _dump_screenshot(self, page: Page, path: str):
+        """调试模式下在后台保存截图"""
+        if DEBUG_DUMP:
+            self._spawn_debug_dump(self._save_screenshot(page, path))
+
+    def _dump_html(self, page: Page, path: str):
+        """调试模式下在后台保存页面HTML"""
+        if DEBUG_DUMP:
+            self._spawn_debug_dump(self._save_html(page, path))
+
+    def _spawn_debug_dump(self, coro):
+        """在后台执行调试转储任务"""
+        dump = asyncio.get_running_loop().create_task(coro)
+        self._debug_dump_tasks.add(dump)
+        dump.add_done_callback(self._debug_dump_tasks.discard)
+
+    async def _save_screenshot(self, page: Page, path: str):
+        """保存视口JPEG截图（比PNG编码快），失败只记录日志"""
+        path = os.path.splitext(path)[0] + '.jpg'
+        try:
+            await page.screenshot(path=path, full_page=False, type='jpeg', quality=60)
+        except Exception as e:
+            logger.debug("保存截图失败 %s: %s", path, e)
+
+    async def _save_html(self, page: Page, path: str):
+        """保存结账内容容器的HTML，文件写入放到线程池，失败只记录日志"""
+        try:
+            content = await page.evaluate(_JS_DEBUG_DUMP_CONTAINER_HTML)
+            await asyncio.to_thread(_write_text_file, path, content)
+        except Exception as e:
+            logger.debug("保存页面HTML失败 %s: %s", path, e)
+
+    def _on_auth_response(self, task_id: str, response):
+        """记录登录接口的错误状态码，登录后直接读取，无需再探测页面"""
+        if _is_auth_error_response(response):
+            self._login_error_codes[task_id] = response.status
+
+    async def _restore_auth_state(self, context: BrowserContext, task: Task):
+        """恢复账号未过期的登录cookie（预热上下文无法在创建时传入storage_state）；只恢复cookie，不恢复localStorage"""
+        account_config = task.config.account_config
+        if not account_config or not account_config.email:
+            return
+        path = _auth_state_path(account_config.email)
+        try:
+            if time.time() - os.path.getmtime(path) > AUTH_STATE_MAX_AGE:
+                return
+            with open(path, encoding='utf-8') as f:
+                cookies = json.load(f).get('cookies') or []
+            if cookies:
+                await context.add_cookies(cookies)
+                task.add_log("🔑 已恢复账号登录状态", "info")
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"恢复登录状态失败: {e}")
+
+    async def _save_auth_state(self, page: Page, task: Task):
+        """登录成功后保存账号的登录状态"""
+        path = _auth_state_path(task.config.account_config.email)
+        try:
+            os.makedirs(AUTH_STATE_DIR, mode=0o700, exist_ok=True)
+            await page.context.storage_state(path=path)
+            os.chmod(path, 0o600)
+        except Exception as e:
+            logger.warning(f"保存登录状态失败: {e}")
+
+    def _take_pooled_context(self, browser: Browser) -> Optional[BrowserContext]:
+        """取出一个属于该browser的预热上下文，没有则返回None"""
+        while self._context_pool:
+            context = self._context_pool.pop()
+            if context.browser is browser:
+                return context
+        return None
+
+    def _schedule_context_pool_refill(self):
+        """在后台补充预热上下文，直到达到CONTEXT_POOL_SIZE"""
+        if self.browser is None or not self.browser.is_connected():
+            return
+        missing = CONTEXT_POOL_SIZE - len(self._context_pool) - len(self._pool_warmers)
+        for _ in range(missing):
+            warmer = asyncio.get_running_loop().create_task(self._warm_context(self.browser))
+            self._pool_warmers.add(warmer)
+            warmer.add_done_callback(self._pool_warmers.discard)
+
+    async def _warm_context(self, browser: Browser):
+        """创建一个预热上下文放入池中"""
+        try:
+            context = await browser.new_context(**_CONTEXT_OPTIONS)
+        except Exception as e:
+            logger.warning(f"预热浏览器上下文失败: {e}")
+            return
+        self._context_pool.append(context)
+
+    async def _install_resource_blocking(self, context: BrowserContext, task: Task):
+        """在上下文上拦截图片/字体/媒体及统计域名请求，任务配置可覆盖资源类型（空列表不拦截）"""
+        configured = task.config.blocked_resource_types
+        if configured is None:
+            blocked_types = DEFAULT_BLOCKED_RESOURCE_TYPES
+        else:
+            blocked_types = frozenset(configured)
+            if not blocked_types:
+                return
+
+        async def handle_route(route):
+            request = route.request
+            if request.resource_type in blocked_types or _ANALYTICS_HOST_RE.match(request.url):
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await context.route("**/*", handle_route)
+
+    async def _release_context(self, task_id: str):
+        """关闭并移除任务的页面和浏览器上下文"""
+        self._login_error_codes.pop(task_id, None)
+        page = self.pages.pop(task_id, None)
+        if page is not None:
             try:
-                await self.pages[task_id].close()
-                del self.pages[task_id]
+                await page.close()
                 logger.info(f"已关闭任务 {task_id} 的页面")
             except Exception as e:
                 logger.warning(f"关闭页面失败: {e}")
 
-        if task_id in self.contexts:
+        context = self.contexts.pop(task_id, None)
+        if context is not None:
             try:
-                await self.contexts[task_id].close()
-                del self.contexts[task_id]
+                await context.close()
                 logger.info(f"已关闭任务 {task_id} 的浏览器上下文")
             except Exception as e:
                 logger.warning(f"关闭浏览器上下文失败: {e}")
 
-        # 清理任务特定的browser和playwright实例
-        if task_id in self.task_browsers:
-            try:
-                await self.task_browsers[task_id].close()
-                del self.task_browsers[task_id]
-            except Exception as e:
-                logger.warning(f"关闭任务 {task_id[:8]} browser失败: {e}")
-
-        if task_id in self.task_playwrights:
-            try:
-                await self.task_playwrights[task_id].stop()
-                del self.task_playwrights[task_id]
-            except Exception as e:
-                logger.warning(f"停止任务 {task_id[:8]} playwright失败: {e}")
-
     async def cleanup_all(self):
         """清理所有资源"""
         for task_id in list(self.contexts.keys()):
-            await self.cleanup_task(task_id)
+            await self.cleanup_task(task_id, force_close=True)
+        await self.shutdown()
+
+    async def shutdown(self):
+        """关闭共享的browser和playwright实例（进程退出时调用一次）"""
+        for task_id in list(self.contexts.keys()):
+            await self._release_context(task_id)
+        self.task_browsers.clear()
+        for warmer in list(self._pool_warmers):
+            warmer.cancel()
+        self._context_pool.clear()  # 预热上下文随browser一起关闭
 
-        # 清理所有任务的browser实例
-        for task_id, browser in list(self.task_browsers.items()):
+        if self.browser is not None:
             try:
-                await browser.close()
-                del self.task_browsers[task_id]
+                await self.browser.close()
             except Exception as e:
-                logger.warning(f"关闭任务 {task_id[:8]} browser失败: {e}")
+                logger.warning(f"关闭共享browser失败: {e}")
+            self.browser = None
 
-        # 清理所有任务的playwright实例
-        for task_id, playwright in list(self.task_playwrights.items()):
+        if self.playwright is not None:
             try:
-                await playwright.stop()
-                del self.task_playwrights[task_id]
+                await self.playwright.stop()
             except Exception as e:
-                logger.warning(f"停止任务 {task_id[:8]} playwright失败: {e}")
+                logger.warning(f"停止playwright失败: {e}")
+            self.playwright = None
 
     # ==================== 基于apple_automator.py的选择方法 ====================
 
@@ -5769,10 +5832,11 @@ class AutomationService:
         try:
             from models.database import DatabaseManager
 
-            db_manager = DatabaseManager()
+            # 🚀 同步SQLite调用放到线程池，避免阻塞共享的自动化事件循环
+            db_manager = await asyncio.to_thread(DatabaseManager)
 
             # 检查礼品卡是否已存在
-            existing_card = db_manager.get_gift_card_by_number(gift_card_number)
+            existing_card = await asyncio.to_thread(db_manager.get_gift_card_by_number, gift_card_number)
 
             if existing_card:
                 # 礼品卡已存在，更新状态
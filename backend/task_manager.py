@@ -58,10 +58,10 @@ class TaskManager:
             # 从数据库恢复所有任务
             from models.database import DatabaseManager
             db_manager = DatabaseManager()
-            db_tasks = db_manager.get_all_tasks()
             restored_count = 0
 
-            for db_task in db_tasks:
+            # 逐行读取，避免同时持有全部行和全部字典
+            for db_task in db_manager.iter_tasks():
                 try:
                     # 重建Task对象
                     task = Task.from_dict(db_task)
@@ -98,13 +98,26 @@ class TaskManager:
         except Exception as e:
             logger.error(f"❌ 任务持久化失败: {task.id} - {e}")
 
+    def _persist_task_progress(self, task: Task):
+        """只持久化任务的状态/步骤/进度，任务行不存在时回退到完整保存"""
+        try:
+            from models.database import DatabaseManager
+            db_manager = DatabaseManager()
+            status = getattr(task.status, 'value', task.status)
+            current_step = getattr(task.current_step, 'value', task.current_step)
+            if not db_manager.save_task_progress(task.id, status, current_step, task.progress):
+                db_manager.save_task(task.to_dict())
+            logger.debug(f"💾 任务进度已持久化: {task.id}")
+        except Exception as e:
+            logger.error(f"❌ 任务进度持久化失败: {task.id} - {e}")
+
     def _update_task_status(self, task: Task, status: TaskStatus, persist: bool = True):
         """更新任务状态并可选择性持久化"""
         old_status = task.status
         task.status = status
 
         if persist:
-            self._persist_task(task)
+            self._persist_task_progress(task)
 
         logger.debug(f"🔄 任务状态更新: {task.id} {old_status} -> {status}")
 
@@ -115,7 +128,7 @@ class TaskManager:
     def create_task(self, task_config) -> Task:
         """创建新任务"""
         task = Task(
-            id=None,  # 自动生成UUID
+            id=None,  # 自动生成随机ID
             config=task_config
         )
         
@@ -501,38 +514,16 @@ class TaskManager:
         try:
             if self.automation_service:
                 # 🚀 优化的异步资源清理
-                import asyncio
                 import threading
-                import signal
-                import sys
 
                 def cleanup_in_thread():
                     """在新线程中运行异步清理"""
                     try:
-                        # 创建新的事件循环，避免与主线程冲突
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-
-                        # 设置信号处理器，避免事件循环错误
-                        if sys.platform != 'win32':
-                            # 在Unix系统上禁用信号处理器
-                            for sig in [signal.SIGINT, signal.SIGTERM]:
-                                try:
-                                    signal.signal(sig, signal.SIG_DFL)
-                                except (ValueError, OSError):
-                                    pass  # 忽略信号设置错误
-
-                        # 强制关闭浏览器资源
-                        loop.run_until_complete(
+                        # 强制关闭浏览器资源（在自动化服务的事件循环中执行，页面和上下文绑定该循环）
+                        self.automation_service.run_sync(
                             self.automation_service.cleanup_task(task_id, force_close=True)
                         )
 
-                        # 安全关闭事件循环
-                        try:
-                            loop.close()
-                        except Exception:
-                            pass  # 忽略关闭错误
-
                         logger.info(f"✅ 任务 {task_id} 的浏览器资源已清理")
                     except Exception as e:
                         logger.error(f"❌ 清理任务 {task_id} 的浏览器资源失败: {str(e)}")
@@ -678,7 +669,7 @@ class TaskManager:
             task.started_at = None
             task.completed_at = None
             task.error_message = None
-            task.logs = []
+            task.logs.clear()
             
             # 清除礼品卡错误和余额错误
             if hasattr(task, 'gift_card_errors'):
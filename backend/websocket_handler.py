@@ -2,12 +2,38 @@ from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask import request
 import logging
 import asyncio
+import dataclasses
+import json
+import os
 import time
 from datetime import datetime
 from models.task import TaskStatus
 
 logger = logging.getLogger(__name__)
 
+# 🚀 礼品卡调试日志文件只在设置GIFT_CARD_DEBUG环境变量时写入
+GIFT_CARD_DEBUG = bool(os.environ.get('GIFT_CARD_DEBUG'))
+GIFT_CARD_DEBUG_LOG = "websocket_gift_card_debug.log"
+
+
+def _write_gift_card_debug(task, data):
+    """把任务创建的礼品卡调试信息作为一行JSON写入调试日志"""
+    config = dataclasses.asdict(task.config)
+    # 密码不写入调试日志
+    config.pop('apple_password', None)
+    if isinstance(config.get('account_config'), dict):
+        config['account_config'].pop('password', None)
+    payload = {
+        "task_id": task.id,
+        "ts": datetime.now().isoformat(),
+        "data_keys": list(data.keys()),
+        "config": config,
+        "task_keys": [field.name for field in dataclasses.fields(task)],
+    }
+    with open(GIFT_CARD_DEBUG_LOG, 'a', encoding='utf-8') as debug_file:
+        debug_file.write(json.dumps(payload, ensure_ascii=False, default=str) + "\n")
+
+
 class WebSocketHandler:
     def __init__(self, socketio: SocketIO, task_manager):
         self.socketio = socketio
@@ -57,16 +83,6 @@ class WebSocketHandler:
             try:
                 from models.task import TaskConfig, ProductConfig, AccountConfig
 
-                # 创建专门的礼品卡调试日志
-                from datetime import datetime
-                debug_log_path = f"websocket_gift_card_debug.log"
-                with open(debug_log_path, 'a', encoding='utf-8') as debug_file:
-                    debug_file.write(f"\n=== WebSocket 礼品卡调试 {datetime.now()} ===\n")
-                    debug_file.write(f"1. 接收到的原始数据:\n")
-                    debug_file.write(f"   gift_card_config: {data.get('gift_card_config')}\n")
-                    debug_file.write(f"   gift_cards: {data.get('gift_cards')}\n")
-                    debug_file.write(f"   所有数据键: {list(data.keys())}\n\n")
-
                 # 解析产品配置
                 product_config = ProductConfig(
                     model=data['product_config']['model'],
@@ -116,13 +132,6 @@ class WebSocketHandler:
                 for i, card in enumerate(gift_cards):
                     logger.info(f"   卡片{i+1}: {card.number[:4]}**** (状态: {card.expected_status})")
 
-                # 写入礼品卡处理结果到调试日志
-                with open(debug_log_path, 'a', encoding='utf-8') as debug_file:
-                    debug_file.write(f"2. 礼品卡处理结果:\n")
-                    debug_file.write(f"   gift_cards数量: {len(gift_cards)}\n")
-                    debug_file.write(f"   gift_card_code: {gift_card_code}\n")
-                    debug_file.write(f"   gift_cards详情: {[f'{card.number[:4]}****({card.expected_status})' for card in gift_cards]}\n\n")
-
                 task_config = TaskConfig(
                     name=data['name'],
                     url=data['url'],
@@ -132,25 +141,17 @@ class WebSocketHandler:
                     priority=data.get('priority', 1),
                     gift_cards=gift_cards,
                     gift_card_code=gift_card_code,
-                    use_proxy=data.get('use_proxy', False)
+                    use_proxy=data.get('use_proxy', False),
+                    blocked_resource_types=data.get('blocked_resource_types'),
+                    verify_cart=data.get('verify_cart', False)
                 )
-
-                # 写入TaskConfig创建结果到调试日志
-                with open(debug_log_path, 'a', encoding='utf-8') as debug_file:
-                    debug_file.write(f"3. TaskConfig创建结果:\n")
-                    debug_file.write(f"   task_config.gift_cards: {task_config.gift_cards}\n")
-                    debug_file.write(f"   task_config.gift_card_code: {task_config.gift_card_code}\n")
-                    debug_file.write(f"   TaskConfig完整内容: {vars(task_config)}\n")
-                    debug_file.write(f"=== WebSocket 调试结束 ===\n\n")
                 
                 # 创建任务
                 task = self.task_manager.create_task(task_config)
 
-                # 记录创建的任务ID到调试日志
-                with open(debug_log_path, 'a', encoding='utf-8') as debug_file:
-                    debug_file.write(f"4. 创建的任务ID: {task.id}\n")
-                    debug_file.write(f"   任务状态: {task.status}\n")
-                    debug_file.write(f"   任务config是否相同: {task.config is task_config}\n")
+                # 🚀 调试模式下一次性写入结构化JSON，不再逐段拼接
+                if GIFT_CARD_DEBUG:
+                    _write_gift_card_debug(task, data)
                 
                 # 通知所有客户端
                 self.broadcast('task_created', task.to_dict())
@@ -293,9 +294,10 @@ class WebSocketHandler:
         else:
             self.socketio.emit(event, data)
     
-    def send_step_update(self, task_id: str, step: str, status: str, progress: float, message: str = ""):
-        """发送详细的步骤更新"""
-        data = {
+    @staticmethod
+    def step_update_payload(task_id: str, step: str, status: str, progress: float, message: str = "") -> dict:
+        """构造 step_update 消息体"""
+        return {
             'task_id': task_id,
             'step': step,
             'status': status,  # 'started', 'progress', 'completed', 'failed'
@@ -303,17 +305,28 @@ class WebSocketHandler:
             'message': message,
             'timestamp': datetime.now().isoformat()
         }
-        self.broadcast('step_update', data)
-    
-    def send_task_log(self, task_id: str, level: str, message: str):
-        """发送任务日志"""
-        data = {
+
+    @staticmethod
+    def task_log_payload(task_id: str, level: str, message: str) -> dict:
+        """构造 task_log 消息体"""
+        return {
             'task_id': task_id,
             'level': level,
             'message': message,
             'timestamp': datetime.now().isoformat()
         }
-        self.broadcast('task_log', data)
+
+    def send_step_update(self, task_id: str, step: str, status: str, progress: float, message: str = ""):
+        """发送详细的步骤更新"""
+        self.broadcast('step_update', self.step_update_payload(task_id, step, status, progress, message))
+    
+    def send_task_log(self, task_id: str, level: str, message: str):
+        """发送任务日志"""
+        self.broadcast('task_log', self.task_log_payload(task_id, level, message))
+
+    def send_batch(self, task_id: str, messages: list):
+        """🚀 一帧发送多条消息：[{'event': 事件名, 'data': 消息体}, ...]，前端按事件名逐条分发"""
+        self.broadcast('task_batch', messages)
 
     def send_task_event(self, event_name: str, task_id: str, data: dict = None):
         """发送任务相关事件"""
@@ -366,18 +379,13 @@ class WebSocketHandler:
                     return
 
                 # 🚀 异步调用自动化服务继续执行
-                import asyncio
                 import threading
                 
                 def continue_automation():
                     try:
-                        # 创建新的事件循环
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        
-                        # 调用自动化服务继续执行
+                        # 调用自动化服务继续执行（在自动化服务的事件循环中，页面绑定该循环）
                         automation_service = self.task_manager.automation_service
-                        result = loop.run_until_complete(
+                        result = automation_service.run_sync(
                             automation_service.continue_with_gift_card_input(task, gift_card_numbers)
                         )
                         
@@ -394,8 +402,6 @@ class WebSocketHandler:
                                 'message': '礼品卡处理失败，请查看日志'
                             })
                         
-                        loop.close()
-                        
                     except Exception as e:
                         logger.error(f"❌ 继续自动化执行异常: {str(e)}")
                         self.socketio.emit('gift_card_submit_error', {
@@ -99,6 +99,13 @@ class WebSocketService {
       })
     })
 
+    // 🚀 批量消息：逐条交给对应事件的处理器
+    this.socket.on('task_batch', (messages) => {
+      for (const { event, data } of messages) {
+        this.socket.listeners(event).forEach((handler) => handler(data))
+      }
+    })
+
     // 🚀 交互式提示事件
     this.socket.on('prompt_required', (data) => {
       console.log('💬 收到交互式提示:', data)